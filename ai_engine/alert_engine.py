@@ -12,31 +12,37 @@ from __future__ import annotations
 
 import os
 import time
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional
+
+from session_registry import get_session_registry
 
 
 class AlertEngine:
     def __init__(self) -> None:
         self._cooldown_s_default = float(os.getenv("ALERT_COOLDOWN_SEC", "10"))
         self._occlusion_cooldown_s = float(os.getenv("OCCLUSION_ALERT_COOLDOWN", "3"))
-        # (trip_id, alert_key) -> last_emitted_ts (monotonic)
-        self._last_emitted: Dict[Tuple[str, str], float] = {}
+        # trip_id -> {alert_key: last_emitted_ts (monotonic)}
+        self._last_emitted: Dict[str, Dict[str, float]] = {}
 
     def _can_emit(self, trip_id: str, alert_key: str) -> bool:
         now = time.monotonic()
-        key = (trip_id, alert_key)
-        last = self._last_emitted.get(key)
+        emitted = self._last_emitted.setdefault(trip_id, {})
+        last = emitted.get(alert_key)
         cooldown_s = self._cooldown_s_default
         if alert_key in {"camera_blocked", "mouth_occluded"}:
             cooldown_s = self._occlusion_cooldown_s
         if last is None:
-            self._last_emitted[key] = now
+            emitted[alert_key] = now
             return True
         if (now - last) >= cooldown_s:
-            self._last_emitted[key] = now
+            emitted[alert_key] = now
             return True
         return False
 
+    def release_trip(self, trip_id: str) -> None:
+        """Forget a trip's alert cooldowns."""
+        self._last_emitted.pop(trip_id, None)
+
     def get_warnings(
         self,
         *,
@@ -97,6 +103,13 @@ _alert_engine_singleton: Optional[AlertEngine] = None
 def get_alert_engine() -> AlertEngine:
     global _alert_engine_singleton
     if _alert_engine_singleton is None:
-        _alert_engine_singleton = AlertEngine()
+        engine = AlertEngine()
+        get_session_registry().register_owner(
+            "alert_cooldowns",
+            scope="trip",
+            release=engine.release_trip,
+            lookup=engine._last_emitted.get,
+        )
+        _alert_engine_singleton = engine
     return _alert_engine_singleton
 
@@ -8,7 +8,6 @@ import tempfile
 import urllib.request
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List, Tuple, Optional
-from urllib.error import HTTPError, URLError
 from urllib.request import Request, urlopen
 
 import cv2
@@ -17,6 +16,9 @@ import numpy as np
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 
+# Per-frame derived views (RGB/gray/mp.Image/crops) shared by all engines
+from frame_context import FrameContext
+
 # Import landmark extraction engine (MediaPipe FaceMesh)
 from landmark_engine import get_landmark_engine
 
@@ -41,6 +43,29 @@ from alert_engine import get_alert_engine
 # Driver registration (enrollment)
 from driver_registry_service import decode_base64_image_to_bgr, get_driver_registry_service
 
+# Bounded background executor for slow analytics
+from task_pool import BoundedExecutor
+
+# Pooled, batched, retrying backend persistence client
+from persistence_client import get_persistence_client
+
+# Cached backend active-trip registry
+from trip_registry import get_active_trip_registry
+
+# Per-stage latency histograms + Prometheus exposition
+from metrics import observe_stage, register_gauge, render_prometheus, summary as metrics_summary, timed
+
+# One eviction policy (LRU + idle TTL) and teardown hook for all per-session state
+from session_registry import get_session_registry
+
+# Queue-backed structured logging (no synchronous stdout writes on the fast loop)
+import logging
+from structured_log import FRAME_LOG_SAMPLE_N, Sampler, get_logger, log_event, stats as logging_stats
+
+_log = get_logger("app")
+_frame_log = get_logger("frame")
+_frame_log_sampler = Sampler(FRAME_LOG_SAMPLE_N)
+
 # Try to import MediaPipe for hand detection
 try:
     from mediapipe.tasks import python
@@ -50,10 +75,22 @@ try:
 except ImportError:
     MEDIAPIPE_AVAILABLE = False
     mp_image = None  # type: ignore[assignment]
-    print("MediaPipe not available. Hand gesture detection disabled.")
+    _log.warning("MediaPipe not available. Hand gesture detection disabled.")
+
+# Optional WebSocket support for the per-vehicle streaming endpoint.
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+    WEBSOCKET_AVAILABLE = True
+except ImportError:
+    Sock = None  # type: ignore[assignment]
+    ConnectionClosed = Exception  # type: ignore[assignment,misc]
+    WEBSOCKET_AVAILABLE = False
+    _log.warning("flask-sock not available. /analyze_stream WebSocket endpoint disabled.")
 
 app = Flask(__name__)
 CORS(app)
+sock = Sock(app) if WEBSOCKET_AVAILABLE else None
 
 BACKEND_BASE_URL = os.getenv("BACKEND_BASE_URL", "http://localhost:5000")
 DEFAULT_AI_SOURCE = "ai_engine"
@@ -66,7 +103,11 @@ DRIVER_NOT_VISIBLE_AFTER_S = float(os.getenv("DRIVER_NOT_VISIBLE_AFTER_S", "3.0"
 
 _trip_driver_cache: Dict[str, Dict[str, Any]] = {}
 _trip_driver_cache_lock = threading.Lock()
+_trip_driver_resolved = threading.Condition(_trip_driver_cache_lock)
 _trip_driver_cache_ttl_s = float(os.getenv("TRIP_DRIVER_CACHE_TTL", "600"))
+# Failed/empty lookups are retried after this, doubling per failure up to the max.
+_trip_driver_retry_s = float(os.getenv("TRIP_DRIVER_RETRY_S", "5"))
+_trip_driver_retry_max_s = float(os.getenv("TRIP_DRIVER_RETRY_MAX_S", "300"))
 
 # Face metrics are produced by MediaPipe FaceMesh in landmark_engine.py
 
@@ -83,18 +124,27 @@ EYE_AR_THRESH = 0.20  # Below this indicates drowsiness (FaceMesh EAR range: 0.0
 MOUTH_AR_THRESH = 0.08  # Above this indicates yawning (FaceMesh MAR range: 0.0-0.4, typically 0.03-0.10)
 HEAD_TURN_THRESH = 20  # Degrees from center
 
-# Driver personalization: Cache for thresholds (to avoid backend calls every frame)
-driver_thresholds_cache = {}  # {driver_id: {ear_drowsiness, mar_yawning, head_turn, cached_at}}
-THRESHOLD_CACHE_TTL = 300  # 5 minutes
-
 # Slow analytics loop configuration (runs asynchronously and periodically).
 SLOW_ANALYTICS_INTERVAL_S = float(os.getenv("SLOW_ANALYTICS_INTERVAL_S", "5.0"))
+# Longest side of the frame fed to MediaPipe Pose (crossed-arms SOS).
+POSE_INPUT_MAX_SIDE = int(os.getenv("POSE_INPUT_MAX_SIDE", "640"))
 # Identity verification is session-level and should run less frequently than frame loop.
 IDENTITY_VERIFY_INTERVAL_S = float(os.getenv("IDENTITY_VERIFY_INTERVAL_S", "12.0"))
 
 # Per-session cached analytics state; updated by background worker.
 _analytics_state: Dict[str, Dict[str, Any]] = {}
 _analytics_lock = threading.Lock()
+
+# CPU-bound slow analytics (pose/ONNX) runs on a bounded pool instead of a thread
+# per job; runs are coalesced per session (latest frame wins). Backend persistence
+# goes through `persistence_client` (its own threads, batching and retries).
+_analytics_executor = BoundedExecutor(
+    "slow-analytics",
+    workers=int(os.getenv("SLOW_ANALYTICS_WORKERS", "2")),
+    max_queue=int(os.getenv("SLOW_ANALYTICS_MAX_QUEUE", "32")),
+)
+# Trip -> driver lookups run off the request thread (one job per trip at a time).
+_driver_resolve_executor = BoundedExecutor("trip-driver", workers=1, max_queue=64)
 _episode_state: Dict[str, Dict[str, Dict[str, Any]]] = {}
 _episode_lock = threading.Lock()
 _episode_event_types = tuple(
@@ -103,6 +153,21 @@ _episode_event_types = tuple(
 _episode_persist_min_s = float(os.getenv("EPISODE_PERSIST_MIN_SECONDS", "0.8"))
 _compute_risk_persist_events = str(os.getenv("COMPUTE_RISK_PERSIST_EVENTS", "0")).lower() in {"1", "true", "yes"}
 
+# Streams and batches bind driver + thresholds once; they may wait this long for a first lookup.
+BIND_SESSION_WAIT_S = float(os.getenv("BIND_SESSION_WAIT_S", "2.0"))
+
+# Upper bound on frames accepted by one /analyze_frames request.
+ANALYZE_FRAMES_MAX_BATCH = int(os.getenv("ANALYZE_FRAMES_MAX_BATCH", "64"))
+
+# Content types accepted as a raw encoded frame body by /analyze_frame.
+_BINARY_FRAME_MIMETYPES = frozenset(
+    {"image/jpeg", "image/jpg", "image/png", "image/webp", "application/octet-stream"}
+)
+# Metadata kept as strings (besides any `*_id` key); everything else is typed.
+_FRAME_STRING_FIELDS = frozenset(
+    {"trip_id", "driver_id", "frame_id", "video_id", "input_type", "calibration_phase", "event_key"}
+)
+
 
 def _empty_emotion_placeholder() -> Dict[str, Any]:
     """Placeholder for future lightweight emotion model integration."""
@@ -113,6 +178,7 @@ def _analytics_state_defaults() -> Dict[str, Any]:
     return {
         "last_run_ts": 0.0,
         "running": False,
+        "queued": False,
         "updated_at": None,
         "identity_session": {
             "locked": False,
@@ -161,11 +227,51 @@ def _get_cached_analytics_state(session_key: str) -> Dict[str, Any]:
         return dict(st)
 
 
-def _get_driver_id_from_trip(trip_id: str) -> str:
-    """Resolve driver_id for a trip.
+def _cache_trip_driver(trip_id: str, driver_id: str) -> None:
+    with _trip_driver_cache_lock:
+        _trip_driver_cache[trip_id] = {"driver_id": driver_id, "cached_at": time.time(), "failures": 0, "retry_at": 0.0}
+        _trip_driver_resolved.notify_all()
+
+
+def _resolve_trip_driver(trip_id: str) -> None:
+    """Background lookup of a trip's driver: registry snapshot first, then `/trips/<trip_id>`."""
+    driver_id = ""
+    try:
+        registry = get_active_trip_registry()
+        if registry.is_active(trip_id):
+            driver_id = registry.driver_for(trip_id) or ""
+        if not driver_id:
+            endpoint = f"{BACKEND_BASE_URL.rstrip('/')}/trips/{trip_id}"
+            with urlopen(Request(endpoint, method="GET"), timeout=2) as response:
+                if getattr(response, "status", 200) == 200:
+                    data = json.loads(response.read().decode("utf-8")) or {}
+                    driver_id = str((data.get("trip") or data).get("driver_id") or "").strip()
+    except Exception:
+        pass
+
+    if driver_id:
+        _cache_trip_driver(trip_id, driver_id)
+        return
 
-    Uses backend `/trips/<trip_id>` when available and caches the result.
-    Falls back to using trip_id (legacy behavior).
+    # Negative cache: back off instead of retrying on every frame.
+    with _trip_driver_cache_lock:
+        entry = _trip_driver_cache.setdefault(trip_id, {"driver_id": None, "cached_at": 0.0, "failures": 0})
+        entry["failures"] = int(entry.get("failures", 0)) + 1
+        delay = min(_trip_driver_retry_max_s, _trip_driver_retry_s * (2 ** (entry["failures"] - 1)))
+        entry["retry_at"] = time.time() + delay
+        entry["resolving"] = False
+        _trip_driver_resolved.notify_all()
+
+
+def _get_driver_id_from_trip(trip_id: str, *, wait_s: float = 0.0) -> str:
+    """Resolve driver_id for a trip without blocking.
+
+    Serves the cached driver (even past its TTL, refreshing it in the
+    background) or, until the first lookup succeeds, falls back to using
+    trip_id (legacy behavior). Lookups run on a background worker; failed or
+    driverless lookups are negatively cached with exponential backoff.
+    `wait_s` > 0 waits up to that long for a pending first lookup (callers that
+    bind a driver once, e.g. streams and batches).
     """
     tid = str(trip_id or "").strip()
     if not tid:
@@ -173,26 +279,28 @@ def _get_driver_id_from_trip(trip_id: str) -> str:
 
     now = time.time()
     with _trip_driver_cache_lock:
-        cached = _trip_driver_cache.get(tid)
-        if cached and (now - float(cached.get("cached_at", 0.0))) < _trip_driver_cache_ttl_s:
-            driver_id = str(cached.get("driver_id") or "").strip()
-            if driver_id:
-                return driver_id
-
-    try:
-        endpoint = f"{BACKEND_BASE_URL.rstrip('/')}/trips/{tid}"
-        with urlopen(Request(endpoint, method="GET"), timeout=2) as response:
-            if getattr(response, "status", 200) == 200:
-                data = json.loads(response.read().decode("utf-8")) or {}
-                driver_id = str((data.get("trip") or data).get("driver_id") or "").strip()
-                if driver_id:
-                    with _trip_driver_cache_lock:
-                        _trip_driver_cache[tid] = {"driver_id": driver_id, "cached_at": now}
-                    return driver_id
-    except Exception:
-        pass
+        entry = _trip_driver_cache.get(tid)
+        if entry is None:
+            entry = {"driver_id": None, "cached_at": 0.0, "failures": 0, "retry_at": 0.0}
+            _trip_driver_cache[tid] = entry
+        driver_id = str(entry.get("driver_id") or "").strip()
+        fresh = bool(driver_id) and (now - float(entry.get("cached_at", 0.0))) < _trip_driver_cache_ttl_s
+        schedule = (not fresh) and (not entry.get("resolving")) and now >= float(entry.get("retry_at", 0.0))
+        if schedule:
+            entry["resolving"] = True
+
+    if schedule and not _driver_resolve_executor.submit(_resolve_trip_driver, key=tid, trip_id=tid):
+        with _trip_driver_cache_lock:
+            entry["resolving"] = False
+
+    if not driver_id and wait_s > 0:
+        with _trip_driver_cache_lock:
+            _trip_driver_resolved.wait_for(
+                lambda: not _trip_driver_cache.get(tid, {}).get("resolving"), timeout=float(wait_s)
+            )
+            driver_id = str(_trip_driver_cache.get(tid, {}).get("driver_id") or "").strip()
 
-    return tid
+    return driver_id or tid
 
 
 def _bbox_iou_xywh(a: Dict[str, Any], b: Dict[str, Any]) -> float:
@@ -472,50 +580,6 @@ def _reset_episode_state(session_key: str) -> None:
         _episode_state.pop(session_key, None)
 
 
-def _get_cached_thresholds(driver_id: str) -> Dict[str, float]:
-    """Get cached thresholds for driver."""
-    if driver_id in driver_thresholds_cache:
-        cached = driver_thresholds_cache[driver_id]
-        # Check if cache is still fresh
-        if time.time() - cached.get("cached_at", 0) < THRESHOLD_CACHE_TTL:
-            return {
-                "ear_drowsiness": cached.get("ear_drowsiness", EYE_AR_THRESH),
-                "mar_yawning": cached.get("mar_yawning", MOUTH_AR_THRESH),
-                "head_turn": cached.get("head_turn", HEAD_TURN_THRESH)
-            }
-    
-    # Try to fetch from backend if not cached or cache expired
-    try:
-        endpoint = f"{BACKEND_BASE_URL.rstrip('/')}/drivers/{driver_id}/thresholds"
-        with urlopen(Request(endpoint, method="GET"), timeout=2) as response:
-            if response.status == 200:
-                data = json.load(response)
-                thresholds = data.get("thresholds", {})
-                
-                # Cache the result
-                driver_thresholds_cache[driver_id] = {
-                    "ear_drowsiness": thresholds.get("ear_drowsiness", EYE_AR_THRESH),
-                    "mar_yawning": thresholds.get("mar_yawning", MOUTH_AR_THRESH),
-                    "head_turn": thresholds.get("head_turn", HEAD_TURN_THRESH),
-                    "cached_at": time.time()
-                }
-                
-                return driver_thresholds_cache[driver_id]
-    except Exception as e:
-        print(f"Warning: Could not fetch thresholds for {driver_id}: {e}")
-    
-    # Return defaults if backend unavailable
-    return {
-        "ear_drowsiness": EYE_AR_THRESH,
-        "mar_yawning": MOUTH_AR_THRESH,
-        "head_turn": HEAD_TURN_THRESH
-    }
-
-# MediaPipe Pose Landmarker (lazy initialization) for crossed-arms SOS gesture
-pose_landmarker = None
-pose_landmarker_init_attempted = False
-
-
 def _ensure_pose_landmarker_model_path() -> Optional[str]:
     """Resolve `pose_landmarker_full.task` (repo-local, cache, or download)."""
     local_path = os.path.join(os.path.dirname(__file__), "pose_landmarker_full.task")
@@ -529,11 +593,11 @@ def _ensure_pose_landmarker_model_path() -> Optional[str]:
             "https://storage.googleapis.com/mediapipe-models/pose_landmarker/"
             "pose_landmarker_full/float16/1/pose_landmarker_full.task"
         )
-        print(f"Downloading pose landmarker model to {cache_path}...")
+        _log.info("Downloading pose landmarker model to %s...", cache_path)
         urllib.request.urlretrieve(url, cache_path)
         return cache_path
     except Exception as e:
-        print(f"⚠ Could not download pose landmarker model: {e}")
+        _log.warning("Could not download pose landmarker model: %s", e)
         return None
 
 
@@ -548,7 +612,7 @@ def _get_pose_landmarker():
     try:
         model_path = _ensure_pose_landmarker_model_path()
         if not model_path:
-            print("⚠ MediaPipe Pose: model path unavailable (cross-arms SOS disabled)")
+            _log.warning("MediaPipe Pose: model path unavailable (cross-arms SOS disabled)")
             return None
         base_options = python.BaseOptions(model_asset_path=model_path)
         options = vision.PoseLandmarkerOptions(
@@ -560,10 +624,10 @@ def _get_pose_landmarker():
             min_tracking_confidence=0.45,
         )
         pose_landmarker = vision.PoseLandmarker.create_from_options(options)
-        print("✓ MediaPipe Pose initialized successfully")
+        _log.info("MediaPipe Pose initialized")
         return pose_landmarker
     except Exception as e:
-        print(f"⚠ Warning: Could not create PoseLandmarker: {e}")
+        _log.warning("Could not create PoseLandmarker: %s", e)
         return None
 
 
@@ -584,7 +648,7 @@ def _norm_dist(a, b) -> float:
         return 9e9
 
 
-def _detect_crossed_arms_info(image: np.ndarray) -> Dict[str, Any]:
+def _detect_crossed_arms_info(image: np.ndarray | FrameContext) -> Dict[str, Any]:
     """Detect crossed arms (X) using pose landmarks (wrist near opposite shoulder)."""
     landmarker = _get_pose_landmarker()
     if landmarker is None:
@@ -592,12 +656,15 @@ def _detect_crossed_arms_info(image: np.ndarray) -> Dict[str, Any]:
     if image is None or image.size == 0:
         return {"crossed": False, "error": None, "message": None}
 
-    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
     try:
         if mp_image is None:
             raise RuntimeError("mediapipe Image not available")
-        mp_img = mp_image.Image(image_format=mp_image.ImageFormat.SRGB, data=rgb)
-        results = landmarker.detect(mp_img)
+        # Pose runs on a downscaled pyramid level (landmarks are normalized, and the
+        # model input is much smaller than a webcam frame anyway).
+        frame = FrameContext.of(image)
+        mp_img = frame.mp_image(level=frame.level_for_max_side(POSE_INPUT_MAX_SIDE))
+        with timed("slow_pose"):
+            results = landmarker.detect(mp_img)
     except Exception as e:
         return {"crossed": False, "error": str(e), "message": "Pose detection error"}
 
@@ -639,7 +706,7 @@ def _euclidean_distance(p1: np.ndarray, p2: np.ndarray) -> float:
 
 
 def _detect_passenger_sos_gesture(
-    image: np.ndarray,
+    image: np.ndarray | FrameContext,
     trip_id: str,
     has_passengers: bool,
     palm_open_info: Optional[Dict[str, Any]] = None,
@@ -733,27 +800,125 @@ def _decode_image(image_data: str) -> Optional[np.ndarray]:
         if ',' in image_data:
             image_data = image_data.split(',')[1]
         
-        # Decode base64
-        img_bytes = base64.b64decode(image_data)
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        
-        # Decode image
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        return img
+        # One `decode` sample for base64 + image decode.
+        with timed("decode"):
+            img_bytes = base64.b64decode(image_data)
+            return _imdecode(img_bytes)
     except Exception as e:
-        print(f"Error decoding image: {e}")
+        _log.warning("Error decoding image: %s", e)
         return None
 
 
-def _process_frame_with_landmarks(image: np.ndarray) -> Dict[str, Any]:
+def _decode_image_bytes(img_bytes: bytes) -> Optional[np.ndarray]:
+    """Decode encoded image bytes (JPEG/PNG/WebP) without an intermediate copy."""
+    if not img_bytes:
+        return None
+    try:
+        with timed("decode"):
+            return _imdecode(img_bytes)
+    except Exception as e:
+        _log.warning("Error decoding image: %s", e)
+        return None
+
+
+def _imdecode(img_bytes: bytes) -> Optional[np.ndarray]:
+    if not img_bytes:
+        return None
+    # np.frombuffer wraps the request buffer; cv2.imdecode reads it in place.
+    nparr = np.frombuffer(img_bytes, np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+
+def _frame_metadata_from_pairs(items: Any) -> Dict[str, Any]:
+    """Best-effort typing for query-string / form metadata values.
+
+    Identifier fields (and any `*_id` key) stay strings, so a numeric driver id
+    is not turned into "123.0"; booleans and finite numbers (speed, flags) are
+    coerced. "nan"/"inf" count as missing so they never reach a JSON response.
+    """
+    out: Dict[str, Any] = {}
+    for key, value in items:
+        raw = str(value).strip()
+        lowered = raw.lower()
+        if key in _FRAME_STRING_FIELDS or key.endswith("_id"):
+            out[key] = raw or None
+        elif lowered in {"true", "false"}:
+            out[key] = lowered == "true"
+        elif lowered in {"null", "none", ""}:
+            out[key] = None
+        else:
+            try:
+                number = float(raw)
+            except ValueError:
+                out[key] = raw
+            else:
+                out[key] = number if np.isfinite(number) else None
+    return out
+
+
+def _parse_frame_request() -> Tuple[Dict[str, Any], Optional[np.ndarray], bool]:
+    """Parse an analyze request into (payload, decoded_image, binary_image_supplied).
+
+    Supported bodies:
+    - JSON: {"image": "<base64>", ...} (original contract; image is decoded later)
+    - Raw binary (`image/jpeg`, `image/png`, `image/webp`, `application/octet-stream`):
+      the body is the encoded frame, metadata comes from the query string
+      (e.g. `/analyze_frame?trip_id=...&speed=42`)
+    - `multipart/form-data`: an `image` (or `frame`) file part plus an optional
+      `metadata` JSON part; other form fields and query args are merged in
+    """
+    mimetype = str(request.mimetype or "").lower()
+
+    if mimetype in _BINARY_FRAME_MIMETYPES:
+        payload = _frame_metadata_from_pairs(request.args.items())
+        image = _decode_image_bytes(request.get_data(cache=False))
+        return payload, image, True
+
+    if mimetype == "multipart/form-data":
+        payload = _frame_metadata_from_pairs(request.args.items())
+        payload.update(_frame_metadata_from_pairs((k, v) for k, v in request.form.items() if k != "metadata"))
+
+        meta_raw = request.form.get("metadata")
+        meta_file = request.files.get("metadata")
+        if meta_raw is None and meta_file is not None:
+            meta_raw = meta_file.read().decode("utf-8", errors="replace")
+        if meta_raw:
+            try:
+                meta = json.loads(meta_raw)
+                if isinstance(meta, dict):
+                    payload.update(meta)
+            except ValueError:
+                pass
+
+        frame_file = request.files.get("image") or request.files.get("frame")
+        if frame_file is None:
+            return payload, None, False
+        return payload, _decode_image_bytes(frame_file.read()), True
+
+    return (request.get_json(silent=True) or {}), None, False
+
+
+def _process_frame_with_landmarks(
+    image: np.ndarray | FrameContext,
+    *,
+    session_key: Optional[str] = None,
+    frame_ts: Optional[float] = None,
+) -> Dict[str, Any]:
     """Extract face metrics from an image frame.
 
     All landmark/vision computation is delegated to `ai_engine.landmark_engine`.
     This wrapper exists to keep the rest of the API code stable.
+
+    With `session_key` (continuous per-trip stream) the session's tracking
+    landmarker is used; without it (calibration, one-off frames) IMAGE mode.
     """
     landmark_engine = get_landmark_engine()
-    return landmark_engine.process_frame(image)
+    with timed("landmarks"):
+        return landmark_engine.process_frame(
+            image,
+            session_key=session_key,
+            timestamp_ms=int(frame_ts * 1000.0) if frame_ts is not None else None,
+        )
 
 
 def _detect_from_landmark_metrics(metrics: Dict[str, Any], thresholds: Dict[str, float] = None) -> Dict[str, Any]:
@@ -874,13 +1039,16 @@ def _run_slow_analytics(
     *,
     session_key: str,
     trip_id: str,
-    image_bgr: np.ndarray,
+    frame: FrameContext,
     cv_metrics: Dict[str, Any],
 ) -> None:
     """Background analytics worker. Must never block fast loop."""
     now_ts = time.time()
     with _analytics_lock:
-        prev_state = dict(_analytics_state.get(session_key) or _analytics_state_defaults())
+        state = _analytics_state.setdefault(session_key, _analytics_state_defaults())
+        state["queued"] = False
+        state["running"] = True
+        prev_state = dict(state)
 
     identity_session = dict(prev_state.get("identity_session") or {})
     identity_payload = {
@@ -926,7 +1094,7 @@ def _run_slow_analytics(
         # Slow analytics task 2: passenger monitoring and SOS gesture.
         has_passengers = len(passenger_meta) > 0
         passenger_sos = _detect_passenger_sos_gesture(
-            image_bgr,
+            frame,
             trip_id,
             has_passengers=has_passengers,
             palm_open_info=None,
@@ -939,14 +1107,15 @@ def _run_slow_analytics(
             if pb is not None:
                 passenger_bboxes.append(pb)
 
-        emotion_payload = get_emotion_engine().analyze_periodic(
-            session_key=session_key,
-            image_bgr=image_bgr,
-            driver_bbox=_driver_bbox_from_faces_meta(faces_meta, cv_metrics),
-            passenger_bboxes=passenger_bboxes if has_passengers else [],
-            force=True,
-            is_trip_active=bool(trip_id),
-        )
+        with timed("slow_emotion"):
+            emotion_payload = get_emotion_engine().analyze_periodic(
+                session_key=session_key,
+                image_bgr=frame,
+                driver_bbox=_driver_bbox_from_faces_meta(faces_meta, cv_metrics),
+                passenger_bboxes=passenger_bboxes if has_passengers else [],
+                force=True,
+                is_trip_active=bool(trip_id),
+            )
     except Exception as e:
         passenger_sos = {
             "type": "sos_gesture",
@@ -982,7 +1151,9 @@ def _run_slow_analytics(
             "source": "emotion_placeholder",
         }
         with _analytics_lock:
-            state = _analytics_state.get(session_key) or _analytics_state_defaults()
+            state = _analytics_state.get(session_key)
+            if state is None:
+                return  # session released while this run was in flight
             state["running"] = False
             state["updated_at"] = now_iso
             state["identity_session"] = identity_session
@@ -1000,11 +1171,15 @@ def _schedule_slow_analytics(
     *,
     session_key: str,
     trip_id: str,
-    image_bgr: Optional[np.ndarray],
+    frame: Optional[FrameContext],
     cv_metrics: Dict[str, Any],
 ) -> None:
-    """Start periodic background analytics if due. Non-blocking by design."""
-    if image_bgr is None or getattr(image_bgr, "size", 0) == 0:
+    """Start periodic background analytics if due. Non-blocking by design.
+
+    The frame context is shared with the worker as-is: its arrays are read-only,
+    so no copy is needed and views already built by the fast loop are reused.
+    """
+    if frame is None or frame.size == 0:
         return
 
     now = time.time()
@@ -1016,45 +1191,66 @@ def _schedule_slow_analytics(
 
         if bool(state.get("running", False)):
             return
-        last_run_ts = float(state.get("last_run_ts", 0.0) or 0.0)
-        if (now - last_run_ts) < max(0.5, float(SLOW_ANALYTICS_INTERVAL_S)):
-            return
-
-        state["running"] = True
-        state["last_run_ts"] = now
-
-    worker = threading.Thread(
-        target=_run_slow_analytics,
-        kwargs={
-            "session_key": session_key,
-            "trip_id": trip_id,
-            "image_bgr": np.copy(image_bgr),
-            "cv_metrics": dict(cv_metrics or {}),
-        },
-        daemon=True,
-        name=f"slow-analytics-{session_key}",
+        if not bool(state.get("queued", False)):
+            last_run_ts = float(state.get("last_run_ts", 0.0) or 0.0)
+            if (now - last_run_ts) < max(0.5, float(SLOW_ANALYTICS_INTERVAL_S)):
+                return
+            state["queued"] = True
+            state["last_run_ts"] = now
+        # Already queued: resubmitting below replaces the waiting job's frame
+        # (latest frame wins) without changing its queue position.
+
+    accepted = _analytics_executor.submit(
+        _run_slow_analytics,
+        key=session_key,
+        session_key=session_key,
+        trip_id=trip_id,
+        frame=frame,
+        cv_metrics=dict(cv_metrics or {}),
     )
-    worker.start()
+    if not accepted:
+        # Pool saturated: skip this round; retried after the next interval.
+        with _analytics_lock:
+            state["queued"] = False
 
 
-def _compute_detection(payload: Dict[str, Any]) -> Dict[str, Any]:
+def _compute_detection(
+    payload: Dict[str, Any],
+    image: Optional[np.ndarray] = None,
+    *,
+    driver_id: Optional[str] = None,
+    thresholds: Optional[Dict[str, float]] = None,
+    frame_ts: Optional[float] = None,
+) -> Dict[str, Any]:
     """
     Compute detections from either:
-    1. Base64 image data (uses MediaPipe FaceMesh landmarks + personalized thresholds)
+    1. An already-decoded frame (`image`, from binary/multipart ingestion) or
+       base64 image data in the payload (uses MediaPipe FaceMesh landmarks + personalized thresholds)
     2. Pre-computed signal scores (legacy mode)
+
+    `driver_id` / `thresholds` skip per-frame resolution when the caller
+    supplies them (e.g. an explicit client driver id). Otherwise both are
+    resolved every frame from non-blocking caches, so a late driver lookup or a
+    threshold invalidation applies from the next frame. `frame_ts` is the
+    capture time (epoch seconds) used for temporal behavior logic; defaults to now.
+    The result carries the `session_key` all per-session state was keyed under.
     """
     # Check if image data is provided
     image_data = payload.get("image") or payload.get("frame")
     trip_id = payload.get("trip_id", "")
-    fallback_driver_id = _get_driver_id_from_trip(trip_id)
+    fallback_driver_id = driver_id or _get_driver_id_from_trip(trip_id)
     session_key = trip_id or f"driver:{fallback_driver_id}"
     
-    if image_data:
+    if image is not None or image_data:
         # Landmark-based detection with personalized thresholds
-        image = _decode_image(image_data)
+        if image is None:
+            image = _decode_image(image_data)
         if image is not None:
-            now_ts = time.time()
-            cv_metrics = _process_frame_with_landmarks(image)
+            now_ts = float(frame_ts) if frame_ts is not None else time.time()
+            # Every engine below reads derived views (RGB, gray, mp.Image, crops)
+            # from this context, so each is produced at most once per frame.
+            frame = FrameContext(image, frame_ts=now_ts)
+            cv_metrics = _process_frame_with_landmarks(frame, session_key=session_key, frame_ts=now_ts)
 
             # Session tick (for frame counters + started_at)
             session_mgr = get_driver_session_manager()
@@ -1069,7 +1265,7 @@ def _compute_detection(payload: Dict[str, Any]) -> Dict[str, Any]:
             _schedule_slow_analytics(
                 session_key=session_key,
                 trip_id=trip_id,
-                image_bgr=image,
+                frame=frame,
                 cv_metrics=cv_metrics,
             )
 
@@ -1101,12 +1297,14 @@ def _compute_detection(payload: Dict[str, Any]) -> Dict[str, Any]:
                     fixed_identity["attempted"] = True
                     try:
                         identity_service = get_face_recognition_service()
-                        embeddings = identity_service.extract_face_embeddings(image)
-                        target_bbox = _driver_bbox_from_faces_meta(cv_metrics.get("faces_meta", []) or [], cv_metrics)
-                        picked = _pick_embedding_for_target(embeddings=embeddings, target_bbox=target_bbox)
-                        if picked is not None:
-                            known = np.asarray(driver_encoding, dtype=np.float32).reshape(-1)
-                            similarity = _cosine_similarity(np.asarray(picked, dtype=np.float32), known)
+                        with timed("identity"):
+                            embeddings = identity_service.extract_face_embeddings(frame)
+                            target_bbox = _driver_bbox_from_faces_meta(cv_metrics.get("faces_meta", []) or [], cv_metrics)
+                            picked = _pick_embedding_for_target(embeddings=embeddings, target_bbox=target_bbox)
+                            if picked is not None:
+                                known = np.asarray(driver_encoding, dtype=np.float32).reshape(-1)
+                                similarity = _cosine_similarity(np.asarray(picked, dtype=np.float32), known)
+                        if similarity is not None:
                             fixed_identity["similarity"] = round(float(similarity), 4)
                             if float(similarity) >= float(IDENTITY_MATCH_TOLERANCE):
                                 fixed_identity["matched_this_frame"] = True
@@ -1133,18 +1331,21 @@ def _compute_detection(payload: Dict[str, Any]) -> Dict[str, Any]:
                 if similarity is not None:
                     fixed_identity["status"] = "MATCHED" if fixed_identity["matched_this_frame"] else "NOT_MATCHED"
 
-            # Load thresholds for the active driver (session-cached)
-            thresholds = session_mgr.get_thresholds(
-                session_key=session_key,
-                driver_id=active_driver_id,
-            )
+            # Load thresholds for the active driver (session-cached) unless bound by the caller.
+            if thresholds is None:
+                thresholds = session_mgr.get_thresholds(
+                    session_key=session_key,
+                    driver_id=active_driver_id,
+                )
 
             # Temporal behavior detection (stateful) keyed by ACTIVE driver id
-            behavior = get_behavior_engine().update(
-                driver_id=active_driver_id,
-                cv_metrics=cv_metrics,
-                thresholds=thresholds,
-            )
+            with timed("behavior"):
+                behavior = get_behavior_engine().update(
+                    driver_id=active_driver_id,
+                    cv_metrics=cv_metrics,
+                    thresholds=thresholds,
+                    ts=now_ts,
+                )
             detection_result = {
                 "detections": behavior.get("detections", []),
                 "metrics": cv_metrics,
@@ -1209,6 +1410,7 @@ def _compute_detection(payload: Dict[str, Any]) -> Dict[str, Any]:
             }
             
             detection_result["sos_gesture"] = passenger_sos_result
+            detection_result["session_key"] = session_key
             
             return detection_result
         else:
@@ -1225,7 +1427,8 @@ def _compute_detection(payload: Dict[str, Any]) -> Dict[str, Any]:
                     "palm_open": False,
                     "duration": 0.0
                 },
-                "message": "Failed to decode image"
+                "message": "Failed to decode image",
+                "session_key": session_key,
             }
     
     # Legacy mode: use pre-computed signal scores
@@ -1288,7 +1491,8 @@ def _compute_detection(payload: Dict[str, Any]) -> Dict[str, Any]:
             "palm_open": False,
             "duration": 0.0,
             "message": "Legacy mode: no image provided"
-        }
+        },
+        "session_key": session_key,
     }
 
 
@@ -1308,142 +1512,13 @@ def _compute_risk(payload: Dict[str, Any], detection_result: Dict[str, Any] | No
     detections = detection_result.get("detections", []) or []
     raw_scores = detection_result.get("raw_scores", None)
 
-    return get_risk_engine().compute(
-        trip_id=trip_id or "unknown_trip",
-        detections=detections,
-        raw_scores=raw_scores,
-        speed_kmh=speed,
-    )
-
-
-def _is_trip_active(trip_id: str) -> bool:
-    """
-    Check if a trip is currently active (backend source of truth).
-    On transport errors returns False so results route to /events instead of a stale trip doc.
-    """
-    if (not trip_id) or (str(trip_id).strip() == NO_ACTIVE_TRIP_ID):
-        return False
-    
-    try:
-        check_url = f"{BACKEND_BASE_URL.rstrip('/')}/is-active-trip/{trip_id}"
-        check_req = Request(check_url, method="GET")
-        with urlopen(check_req, timeout=5) as check_resp:
-            check_data = json.loads(check_resp.read().decode("utf-8"))
-            return check_data.get("is_active", False)
-    except Exception:
-        # If check fails, prefer background /events routing (avoids appending to completed trips).
-        return False
-
-
-def _post_result_to_backend(result_payload: Dict[str, Any]) -> Tuple[bool, str]:
-    """Post AI results to backend. Routes to /trips/{id}/ai-results if active trip, else to /events."""
-    trip_id = result_payload.get("trip_id")
-    if not trip_id:
-        # Background monitoring mode: persist into /events under a fixed sentinel.
-        trip_id = NO_ACTIVE_TRIP_ID
-        result_payload["trip_id"] = trip_id
-
-    try:
-        is_active = _is_trip_active(trip_id)
-    except Exception:
-        is_active = False
-
-    # Route to appropriate endpoint
-    if is_active:
-        endpoint = f"{BACKEND_BASE_URL.rstrip('/')}/trips/{trip_id}/ai-results"
-    else:
-        endpoint = f"{BACKEND_BASE_URL.rstrip('/')}/events"
-        # Never leak an inactive/stale trip_id into background events.
-        result_payload["trip_id"] = NO_ACTIVE_TRIP_ID
-        result_payload["is_sos"] = result_payload.get("sos_triggered", False)
-
-    def _post_to(url: str) -> Tuple[int, str]:
-        body = json.dumps(result_payload).encode("utf-8")
-        req = Request(
-            url,
-            data=body,
-            headers={"Content-Type": "application/json"},
-            method="POST",
+    with timed("risk"):
+        return get_risk_engine().compute(
+            trip_id=trip_id or "unknown_trip",
+            detections=detections,
+            raw_scores=raw_scores,
+            speed_kmh=speed,
         )
-        with urlopen(req, timeout=5) as response:
-            status = getattr(response, "status", 200)
-        return int(status), url
-
-    try:
-        status, _ = _post_to(endpoint)
-        if 200 <= status < 300:
-            return True, "sent"
-        return False, f"backend returned {status}"
-    except HTTPError as exc:
-        # Completed / inactive trip: store under global events instead of trip history.
-        if is_active and int(exc.code) == 409:
-            try:
-                fallback = dict(result_payload)
-                fallback["is_sos"] = fallback.get("sos_triggered", False)
-                body_fb = json.dumps(fallback).encode("utf-8")
-                fb_url = f"{BACKEND_BASE_URL.rstrip('/')}/events"
-                req_fb = Request(
-                    fb_url,
-                    data=body_fb,
-                    headers={"Content-Type": "application/json"},
-                    method="POST",
-                )
-                with urlopen(req_fb, timeout=5) as resp_fb:
-                    st = getattr(resp_fb, "status", 200)
-                if 200 <= int(st) < 300:
-                    return True, "sent (events; trip not active)"
-            except Exception:
-                pass
-        return False, f"backend returned {exc.code}"
-    except URLError as exc:
-        return False, str(exc)
-    except TimeoutError as exc:
-        return False, str(exc)
-
-
-def _post_sos_event_to_backend(sos_payload: Dict[str, Any]) -> Tuple[bool, str]:
-    """
-    Send SOS event to backend with dual-mode routing.
-    If trip is active: route to /trips/{trip_id}/sos
-    If trip is inactive: route to /events with is_sos=True flag
-    """
-    trip_id = sos_payload.get("trip_id")
-    if not trip_id:
-        trip_id = NO_ACTIVE_TRIP_ID
-        sos_payload["trip_id"] = trip_id
-
-    try:
-        # Check if trip is active
-        is_active = _is_trip_active(trip_id)
-
-        # Determine endpoint based on trip status
-        if is_active:
-            # Route to trip-specific SOS endpoint
-            endpoint = f"{BACKEND_BASE_URL.rstrip('/')}/trips/{trip_id}/sos"
-        else:
-            # Route to events collection with is_sos flag
-            endpoint = f"{BACKEND_BASE_URL.rstrip('/')}/events"
-            sos_payload["trip_id"] = NO_ACTIVE_TRIP_ID
-            sos_payload["is_sos"] = True
-
-        body = json.dumps(sos_payload).encode("utf-8")
-        req = Request(
-            endpoint,
-            data=body,
-            headers={"Content-Type": "application/json"},
-            method="POST",
-        )
-        with urlopen(req, timeout=5) as response:
-            status = getattr(response, "status", 200)
-        if 200 <= status < 300:
-            return True, "SOS sent"
-        return False, f"backend returned {status}"
-    except HTTPError as exc:
-        return False, f"backend returned {exc.code}"
-    except URLError as exc:
-        return False, str(exc)
-    except TimeoutError as exc:
-        return False, str(exc)
 
 
 def _post_backend_async(
@@ -1451,18 +1526,16 @@ def _post_backend_async(
     result_payloads: Optional[List[Dict[str, Any]]] = None,
     sos_event_payload: Optional[Dict[str, Any]] = None,
 ) -> None:
-    """Background backend persistence so /analyze_frame stays low-latency."""
-    for payload in (result_payloads or []):
-        try:
-            _post_result_to_backend(dict(payload))
-        except Exception as e:
-            print(f"[AsyncPost] result post failed: {e}")
+    """Queue backend persistence so /analyze_frame stays low-latency.
 
+    Delivery (batching per trip, keep-alive connections, retries) happens on the
+    persistence client's own threads; this only appends to its queue.
+    """
+    client = get_persistence_client()
     if sos_event_payload:
-        try:
-            _post_sos_event_to_backend(dict(sos_event_payload))
-        except Exception as e:
-            print(f"[AsyncPost] SOS post failed: {e}")
+        client.enqueue_sos(sos_event_payload)
+    if result_payloads:
+        client.enqueue(result_payloads)
 
 
 @app.get("/trips/<trip_id>/counters")
@@ -1487,9 +1560,46 @@ def reset_trip_counters_endpoint(trip_id: str) -> Any:
     }), 200
 
 
+@app.post("/trips/<trip_id>/start")
+def start_trip_endpoint(trip_id: str) -> Any:
+    """Pre-register a trip's driver (sent by the backend when a trip is created).
+
+    Seeds the trip -> driver cache and the active-trip registry so the trip's
+    first frames resolve the driver without waiting for a backend lookup.
+    """
+    payload = request.get_json(silent=True) or {}
+    driver_id = str(payload.get("driver_id") or "").strip()
+    if not driver_id:
+        return jsonify({"error": "driver_id is required"}), 400
+
+    _cache_trip_driver(trip_id, driver_id)
+    get_active_trip_registry().mark_active(trip_id, driver_id)
+    return jsonify({
+        "trip_id": trip_id,
+        "driver_id": driver_id,
+        "message": "Trip driver registered",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }), 200
+
+
+@app.post("/trips/<trip_id>/end")
+def end_trip_endpoint(trip_id: str) -> Any:
+    """Record that the backend ended a trip (sent by the backend on trip end).
+
+    Results for the trip route to /events from now on, without waiting for the
+    next active-trip snapshot. Session state is left to the session registry.
+    """
+    get_active_trip_registry().mark_inactive(trip_id)
+    return jsonify({
+        "trip_id": trip_id,
+        "message": "Trip marked inactive",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }), 200
+
+
 @app.post("/trips/<trip_id>/complete")
 def complete_trip_endpoint(trip_id: str) -> Any:
-    """Mark trip as complete and clear event counters."""
+    """Mark trip as complete and release all of its session state."""
     counters = get_risk_engine().get_trip_counters(trip_id)
     summary = {
         "trip_id": trip_id,
@@ -1497,24 +1607,12 @@ def complete_trip_endpoint(trip_id: str) -> Any:
         "trip_duration_frames": counters.get("total_frames_analyzed", 0),
         "completion_timestamp": datetime.now(timezone.utc).isoformat(),
     }
-    
-    # Clear counters for this trip
-    get_risk_engine().reset_trip(trip_id)
 
-    # Clear locked identity/session state for this trip
-    try:
-        get_driver_session_manager().reset_session(session_key=trip_id)
-    except Exception:
-        pass
-    
-    # Clear emotion engine session state
-    try:
-        get_emotion_engine().clear_session(trip_id)
-    except Exception:
-        pass
-    
-    _reset_episode_state(session_key=trip_id)
-    
+    # Counters, cooldowns, identity/emotion/episode/landmark state; driver-level
+    # state too once no other session uses the driver.
+    get_session_registry().end_session(trip_id)
+    get_active_trip_registry().invalidate(trip_id)
+
     return jsonify(summary), 200
 
 
@@ -1526,17 +1624,12 @@ def reset_trip_session_endpoint(trip_id: str) -> Any:
     the AI engine to re-fetch thresholds immediately (instead of waiting for TTL).
     """
     try:
+        # Also schedules a threshold refresh for the session's driver.
         get_driver_session_manager().reset_session(session_key=trip_id)
     except Exception:
         pass
-    
-    # Clear emotion engine session state
-    try:
-        get_emotion_engine().clear_session(trip_id)
-    except Exception:
-        pass
-    
-    _reset_episode_state(session_key=trip_id)
+
+    get_session_registry().reset_session(trip_id)
 
     # Also clear temporal state so detections don't carry over.
     try:
@@ -1553,9 +1646,106 @@ def reset_trip_session_endpoint(trip_id: str) -> Any:
     ), 200
 
 
+def _executor_gauge(field: str):
+    def collect():
+        for executor in (_analytics_executor, _driver_resolve_executor):
+            yield {"executor": executor.name}, float(executor.stats()[field])
+    return collect
+
+
+def _stats_gauge(get_stats, field: str):
+    def collect():
+        yield {}, float(get_stats()[field] or 0)
+    return collect
+
+
+register_gauge("ai_engine_executor_queue_length", "Jobs waiting in a background executor.", _executor_gauge("queue_length"))
+register_gauge("ai_engine_executor_running", "Jobs currently running in a background executor.", _executor_gauge("running"))
+register_gauge("ai_engine_executor_dropped", "Jobs dropped by a full background executor (cumulative).", _executor_gauge("dropped"))
+for _field in ("queue_length", "inflight", "sent", "retries", "dropped", "spooled"):
+    register_gauge(
+        f"ai_engine_backend_persistence_{_field}",
+        f"Backend persistence client `{_field}` (see /health).",
+        _stats_gauge(lambda: get_persistence_client().stats(), _field),
+    )
+for _field in ("checks", "hits", "fetches", "errors"):
+    register_gauge(
+        f"ai_engine_active_trip_registry_{_field}",
+        f"Active-trip registry `{_field}` (see /health).",
+        _stats_gauge(lambda: get_active_trip_registry().stats(), _field),
+    )
+for _field in ("sessions", "evicted_idle", "evicted_lru", "ended"):
+    register_gauge(
+        f"ai_engine_session_registry_{_field}",
+        f"Session registry `{_field}` (see /health).",
+        _stats_gauge(lambda: get_session_registry().stats(), _field),
+    )
+
+
+def _release_analytics_state(session_key: str) -> None:
+    with _analytics_lock:
+        _analytics_state.pop(session_key, None)
+
+
+def _release_trip_driver(trip_id: str) -> None:
+    with _trip_driver_cache_lock:
+        _trip_driver_cache.pop(trip_id, None)
+
+
+# Per-session state owned by this module; engines register theirs when created.
+_session_registry = get_session_registry()
+_session_registry.register_owner("slow_analytics", release=_release_analytics_state, lookup=_analytics_state.get)
+_session_registry.register_owner("episodes", release=_reset_episode_state, lookup=_episode_state.get)
+_session_registry.register_owner("frame_log_sampler", release=_frame_log_sampler.forget)
+_session_registry.register_owner(
+    "trip_driver", scope="trip", release=_release_trip_driver, lookup=_trip_driver_cache.get
+)
+
+
+@app.get("/sessions")
+def list_sessions() -> Any:
+    """Largest live sessions by approximate memory (`?limit=`, default 20)."""
+    try:
+        limit = max(1, min(500, int(request.args.get("limit", 20))))
+    except (TypeError, ValueError):
+        return jsonify({"error": "limit must be an integer"}), 400
+    registry = get_session_registry()
+    return jsonify({
+        "stats": registry.stats(),
+        "sessions": registry.largest(limit),
+    }), 200
+
+
+@app.get("/sessions/<path:session_key>")
+def get_session(session_key: str) -> Any:
+    """One live session: frames, idle time, trip/driver keys and bytes held per owner."""
+    info = get_session_registry().describe(session_key)
+    if info is None:
+        return jsonify({"error": "session not found", "session_key": session_key}), 404
+    return jsonify(info), 200
+
+
+@app.get("/metrics")
+def prometheus_metrics() -> Any:
+    """Prometheus text exposition: per-stage latency histograms (+ p50/p95/p99) and queue gauges."""
+    return app.response_class(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
 @app.get("/health")
 def health() -> Any:
-    return jsonify({"status": "ok", "service": "ai_engine", "detector": "mediapipe_facemesh"}), 200
+    return jsonify({
+        "status": "ok",
+        "service": "ai_engine",
+        "detector": "mediapipe_facemesh",
+        "executors": {
+            "slow_analytics": _analytics_executor.stats(),
+        },
+        "backend_persistence": get_persistence_client().stats(),
+        "active_trip_registry": get_active_trip_registry().stats(),
+        "latency": metrics_summary(),
+        "logging": logging_stats(),
+        "sessions": get_session_registry().stats(),
+    }), 200
 
 
 @app.post("/drivers/<driver_id>/calibration/start")
@@ -1658,6 +1848,8 @@ def complete_driver_calibration(driver_id: str) -> Any:
     engine = get_calibration_engine()
     try:
         result = engine.freeze_thresholds(driver_id=driver_id)
+        # Sessions pick up the frozen thresholds without waiting for the cache TTL.
+        get_driver_session_manager().invalidate_thresholds(driver_id=driver_id)
         return jsonify(result), 200
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
@@ -1694,28 +1886,34 @@ def register_driver() -> Any:
         return jsonify({"error": f"registration failed: {e}"}), 500
 
 
-@app.post("/analyze_frame")
-def analyze_frame() -> Any:
-    started_at = time.perf_counter()
-    payload = request.get_json(silent=True) or {}
+def _analyze_frame_result(
+    payload: Dict[str, Any],
+    image: Optional[np.ndarray] = None,
+    *,
+    started_at: Optional[float] = None,
+    driver_id: Optional[str] = None,
+    thresholds: Optional[Dict[str, float]] = None,
+    frame_ts: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Run the fast loop for one frame and return the `/analyze_frame` response body.
+
+    Shared by the HTTP, streaming and batch endpoints. `driver_id` and
+    `thresholds` override the per-frame lookups (see `_compute_detection`);
+    `frame_ts` replays a buffered frame at its capture time.
+    """
+    if started_at is None:
+        started_at = time.perf_counter()
     trip_id = payload.get("trip_id")
 
-    detection_result = _compute_detection(payload)
+    detection_result = _compute_detection(
+        payload,
+        image=image,
+        driver_id=driver_id,
+        thresholds=thresholds,
+        frame_ts=frame_ts,
+    )
     risk_result = _compute_risk(payload, detection_result)
-    
-    # Debug output for detection values
-    metrics = detection_result.get("metrics", {})
-    if metrics:
-        ear = metrics.get("ear", 0.0)
-        mar = metrics.get("mar", 0.0)
-        yaw = metrics.get("yaw_angle", 0.0)
-        personalization = detection_result.get("personalization", {})
-        thresholds = personalization.get("thresholds_used", {})
-        
-        print(f"[Frame] EAR={ear:.3f} (thresh={thresholds.get('ear_drowsiness', 0.20):.3f}) | "
-              f"MAR={mar:.3f} (thresh={thresholds.get('mar_yawning', 0.08):.3f}) | "
-              f"Yaw={yaw:.1f}° | Detections: {len(detection_result['detections'])}")
-    
+
     sos_gesture = detection_result.get("sos_gesture", {})
     # Keep fast loop independent from backend/network activity checks.
     trip_is_active = bool(trip_id)
@@ -1725,13 +1923,17 @@ def analyze_frame() -> Any:
 
     # Final fusion decision (driver risk + emotion support signal + SOS override).
     emotion_result = detection_result.get("emotion")
-    final_decision = get_final_decision_engine().decide(
-        risk_result=risk_result,
-        emotion_result=emotion_result,
-        sos_triggered=bool(sos_triggered),
-    )
+    with timed("decision"):
+        final_decision = get_final_decision_engine().decide(
+            risk_result=risk_result,
+            emotion_result=emotion_result,
+            sos_triggered=bool(sos_triggered),
+        )
 
-    ts = datetime.now(timezone.utc).isoformat()
+    if frame_ts is not None:
+        ts = datetime.fromtimestamp(float(frame_ts), tz=timezone.utc).isoformat()
+    else:
+        ts = datetime.now(timezone.utc).isoformat()
     recommended_score = final_decision.get("risk_score")
     risk_score_weighted = final_decision.get("risk_score_weighted")
     risk_level_weighted = final_decision.get("risk_level_weighted")
@@ -1739,12 +1941,13 @@ def analyze_frame() -> Any:
 
     # Compute user-facing warnings (with cooldown). Audio/UI is handled elsewhere.
     alert_engine = get_alert_engine()
-    warnings = alert_engine.get_warnings(
-        trip_id=str(trip_id or "unknown_trip"),
-        detections=detection_result.get("detections", []),
-        risk_level_weighted=str(risk_level_weighted or ""),
-        sos_triggered=bool(sos_triggered),
-    )
+    with timed("alerts"):
+        warnings = alert_engine.get_warnings(
+            trip_id=str(trip_id or "unknown_trip"),
+            detections=detection_result.get("detections", []),
+            risk_level_weighted=str(risk_level_weighted or ""),
+            sos_triggered=bool(sos_triggered),
+        )
 
     emo = (emotion_result or {}) if isinstance(emotion_result, dict) else {}
     driver_emotion_payload = {
@@ -1766,25 +1969,31 @@ def analyze_frame() -> Any:
         "passenger_emotions": detection_result.get("passenger_emotions", []),
         "warnings": warnings,
     }
-    active_driver_id = str((detection_result.get("personalization") or {}).get("driver_id") or _get_driver_id_from_trip(str(trip_id or "")))
-    session_key = str(trip_id or f"driver:{active_driver_id}")
-    episode_payloads = _build_episode_persistence_payloads(
-        session_key=session_key,
-        trip_id=str(trip_id or ""),
-        driver_id=active_driver_id,
-        detections=list(detection_result.get("detections", []) or []),
-        ts_iso=ts,
-        risk_result={
-            "risk_score_temporal": risk_result.get("risk_score_temporal"),
-            "risk_level_temporal": risk_result.get("risk_level_temporal"),
-            "risk_score_weighted": risk_score_weighted,
-            "risk_level_weighted": risk_level_weighted,
-            "risk_level": risk_level,
-            "reasons": risk_result.get("reasons", []),
-        },
-        driver_emotion_payload=driver_emotion_payload,
-        metadata=persist_metadata,
+    active_driver_id = str(
+        (detection_result.get("personalization") or {}).get("driver_id")
+        or driver_id
+        or _get_driver_id_from_trip(str(trip_id or ""))
     )
+    session_key = str(detection_result.get("session_key") or trip_id or f"driver:{active_driver_id}")
+    get_session_registry().touch(session_key, trip=str(trip_id or "unknown_trip"), driver=active_driver_id)
+    with timed("episodes"):
+        episode_payloads = _build_episode_persistence_payloads(
+            session_key=session_key,
+            trip_id=str(trip_id or ""),
+            driver_id=active_driver_id,
+            detections=list(detection_result.get("detections", []) or []),
+            ts_iso=ts,
+            risk_result={
+                "risk_score_temporal": risk_result.get("risk_score_temporal"),
+                "risk_level_temporal": risk_result.get("risk_level_temporal"),
+                "risk_score_weighted": risk_score_weighted,
+                "risk_level_weighted": risk_level_weighted,
+                "risk_level": risk_level,
+                "reasons": risk_result.get("reasons", []),
+            },
+            driver_emotion_payload=driver_emotion_payload,
+            metadata=persist_metadata,
+        )
 
     sos_event_payload = None
     if sos_triggered:
@@ -1811,20 +2020,29 @@ def analyze_frame() -> Any:
 
     # Fire-and-forget backend persistence (never block request thread).
     if episode_payloads or sos_event_payload:
-        threading.Thread(
-            target=_post_backend_async,
-            kwargs={
-                "result_payloads": episode_payloads,
-                "sos_event_payload": sos_event_payload,
-            },
-            daemon=True,
-            name=f"backend-post-{trip_id or 'unknown'}",
-        ).start()
+        _post_backend_async(result_payloads=episode_payloads, sos_event_payload=sos_event_payload)
 
     fast_loop_ms = (time.perf_counter() - started_at) * 1000.0
-    print(f"[AnalyzeFrame] fast_loop_ms={fast_loop_ms:.1f} detections={len(detection_result['detections'])} trip_id={trip_id}")
+    observe_stage("fast_loop", fast_loop_ms / 1000.0)
+    # Per-frame debug line: off by default (`LOG_LEVELS=frame=DEBUG`), then sampled per session.
+    if _frame_log.isEnabledFor(logging.DEBUG) and _frame_log_sampler.hit(session_key):
+        cv_metrics = detection_result.get("metrics", {}) or {}
+        thresholds_used = (detection_result.get("personalization") or {}).get("thresholds_used") or {}
+        log_event(
+            _frame_log,
+            logging.DEBUG,
+            "frame analyzed",
+            trip_id=trip_id,
+            fast_loop_ms=round(fast_loop_ms, 1),
+            ear=round(float(cv_metrics.get("ear", 0.0) or 0.0), 3),
+            ear_thresh=thresholds_used.get("ear_drowsiness"),
+            mar=round(float(cv_metrics.get("mar", 0.0) or 0.0), 3),
+            mar_thresh=thresholds_used.get("mar_yawning"),
+            yaw=round(float(cv_metrics.get("yaw_angle", 0.0) or 0.0), 1),
+            detections=len(detection_result["detections"]),
+        )
 
-    return jsonify({
+    return {
         "trip_id": trip_id,
         "trip_active": trip_is_active,
         "detections": detection_result["detections"],
@@ -1852,15 +2070,334 @@ def analyze_frame() -> Any:
             "sent": None,
             "message": "queued_async",
         },
+    }
+
+
+@app.post("/analyze_frame")
+def analyze_frame() -> Any:
+    started_at = time.perf_counter()
+    with timed("parse"):
+        payload, image, binary_frame = _parse_frame_request()
+    if binary_frame and image is None:
+        return jsonify({"error": "failed to decode image"}), 400
+    result = _analyze_frame_result(payload, image, started_at=started_at)
+    with timed("serialize"):
+        resp = jsonify(result)
+    return resp, 200
+
+
+def _parse_client_timestamp(value: Any) -> Optional[float]:
+    """Client frame timestamp -> epoch seconds.
+
+    Accepts epoch seconds, epoch milliseconds (values above 1e11) or ISO-8601
+    strings. Returns None when missing or unparseable.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        ts = float(value)
+    else:
+        text = str(value).strip()
+        try:
+            ts = float(text)
+        except ValueError:
+            try:
+                parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+            except ValueError:
+                return None
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return parsed.timestamp()
+    return ts / 1000.0 if ts > 1e11 else ts
+
+
+def _parse_frames_request() -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Parse an `/analyze_frames` request into (shared_payload, frame_entries).
+
+    Each entry is a per-frame metadata dict; binary frames are carried under the
+    private `_image_bytes` key, JSON frames keep their base64 `image` field.
+
+    Supported bodies:
+    - JSON: {"trip_id": ..., "speed": ..., "frames": [{"image": "<base64>", "timestamp": ...}, ...]}
+    - `multipart/form-data`: repeated `frames` (or `image`) file parts in capture
+      order plus an optional `metadata` JSON part with the shared fields and a
+      `frames` list of per-frame metadata aligned by index
+    """
+    mimetype = str(request.mimetype or "").lower()
+
+    if mimetype == "multipart/form-data":
+        payload = _frame_metadata_from_pairs(request.args.items())
+        payload.update(_frame_metadata_from_pairs((k, v) for k, v in request.form.items() if k != "metadata"))
+
+        meta_raw = request.form.get("metadata")
+        meta_file = request.files.get("metadata")
+        if meta_raw is None and meta_file is not None:
+            meta_raw = meta_file.read().decode("utf-8", errors="replace")
+        frame_meta: List[Any] = []
+        if meta_raw:
+            try:
+                meta = json.loads(meta_raw)
+                if isinstance(meta, dict):
+                    frame_meta = list(meta.pop("frames", None) or [])
+                    payload.update(meta)
+            except ValueError:
+                pass
+
+        files = request.files.getlist("frames") or request.files.getlist("image")
+        entries: List[Dict[str, Any]] = []
+        for idx, frame_file in enumerate(files):
+            entry = dict(frame_meta[idx]) if idx < len(frame_meta) and isinstance(frame_meta[idx], dict) else {}
+            entry["_image_bytes"] = frame_file.read()
+            entries.append(entry)
+        return payload, entries
+
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return {}, []
+    payload = dict(body)
+    frames = payload.pop("frames", None) or []
+    return payload, [dict(f) for f in frames if isinstance(f, dict)]
+
+
+def _fill_frame_times(frame_times: List[Optional[float]]) -> List[Optional[float]]:
+    """Give frames without a client timestamp one interpolated from their neighbours.
+
+    Frames before the first (after the last) timestamped frame take its
+    timestamp. A batch without any timestamp is left as is (server time).
+    """
+    known = [i for i, ts in enumerate(frame_times) if ts is not None]
+    if not known or len(known) == len(frame_times):
+        return frame_times
+    filled = np.interp(np.arange(len(frame_times)), known, [frame_times[i] for i in known])
+    return [float(ts) for ts in filled]
+
+
+@app.post("/analyze_frames")
+def analyze_frames() -> Any:
+    """Analyze an ordered batch of buffered frames for one trip.
+
+    Frames run back-to-back through the same fast loop as `/analyze_frame`, in
+    the order given, with each frame's client `timestamp` driving the temporal
+    behavior logic. Frames without one get a timestamp interpolated from their
+    neighbours, so the behavior clock never jumps to the server time mid-batch.
+    The driver lookup and thresholds are warmed once (waiting up to
+    `BIND_SESSION_WAIT_S`), then read per frame from the caches.
+    """
+    started_at = time.perf_counter()
+    payload, entries = _parse_frames_request()
+    if not entries:
+        return jsonify({"error": "frames is required"}), 400
+    if len(entries) > max(1, int(ANALYZE_FRAMES_MAX_BATCH)):
+        return jsonify({"error": f"too many frames (max {ANALYZE_FRAMES_MAX_BATCH})"}), 413
+
+    frame_times: List[Optional[float]] = []
+    last_ts: Optional[float] = None
+    for idx, entry in enumerate(entries):
+        frame_ts = _parse_client_timestamp(entry.get("timestamp", entry.get("ts")))
+        if frame_ts is not None and last_ts is not None and frame_ts < last_ts:
+            return jsonify({"error": f"frame timestamps must be non-decreasing (index {idx})"}), 400
+        if frame_ts is not None:
+            last_ts = frame_ts
+        frame_times.append(frame_ts)
+    frame_times = _fill_frame_times(frame_times)
+
+    trip_id = str(payload.get("trip_id") or "").strip()
+    explicit_driver_id = str(payload.get("driver_id") or "").strip() or None
+    _stream_bind_session({"trip_id": trip_id, "driver_id": explicit_driver_id})
+
+    results: List[Dict[str, Any]] = []
+    for idx, (entry, frame_ts) in enumerate(zip(entries, frame_times)):
+        frame_payload = dict(payload)
+        image_bytes = entry.pop("_image_bytes", None)
+        frame_payload.update({k: v for k, v in entry.items() if k not in {"timestamp", "ts"}})
+        frame_payload["trip_id"] = payload.get("trip_id")
+
+        image: Optional[np.ndarray] = None
+        if image_bytes is not None:
+            image = _decode_image_bytes(image_bytes)
+            if image is None:
+                results.append({"index": idx, "frame_id": entry.get("frame_id"), "error": "failed to decode image"})
+                continue
+        elif frame_payload.get("image") or frame_payload.get("frame"):
+            image = _decode_image(frame_payload.get("image") or frame_payload.get("frame"))
+            if image is None:
+                results.append({"index": idx, "frame_id": entry.get("frame_id"), "error": "failed to decode image"})
+                continue
+
+        result = _analyze_frame_result(
+            frame_payload,
+            image,
+            driver_id=explicit_driver_id,
+            frame_ts=frame_ts,
+        )
+        result["index"] = idx
+        result["frame_id"] = frame_payload.get("frame_id")
+        result["timestamp"] = frame_ts
+        results.append(result)
+
+    return jsonify({
+        "trip_id": payload.get("trip_id"),
+        "count": len(results),
+        "failed": sum(1 for r in results if "error" in r),
+        "results": results,
+        "processing_ms": round((time.perf_counter() - started_at) * 1000.0, 2),
     }), 200
 
 
+_MISSING = object()
+
+
+def _result_delta(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Top-level keys of `current` whose values differ from `previous`."""
+    if previous is None:
+        return dict(current)
+    return {k: v for k, v in current.items() if previous.get(k, _MISSING) != v}
+
+
+def _stream_bind_session(meta: Dict[str, Any]) -> Dict[str, Any]:
+    """Warm the driver lookup and thresholds for a stream or batch and describe the session.
+
+    Waits up to `BIND_SESSION_WAIT_S` for the first lookups so the first frames
+    already see the real driver; frames still resolve both per frame (from the
+    caches), so the values here are only the state at bind time.
+    """
+    trip_id = str(meta.get("trip_id") or "").strip()
+    driver_id = str(meta.get("driver_id") or "").strip() or _get_driver_id_from_trip(trip_id, wait_s=BIND_SESSION_WAIT_S)
+    session_key = trip_id or f"driver:{driver_id}"
+    thresholds = get_driver_session_manager().get_thresholds(
+        session_key=session_key, driver_id=driver_id, wait_s=BIND_SESSION_WAIT_S
+    )
+    return {
+        "trip_id": trip_id or None,
+        "driver_id": driver_id,
+        "session_key": session_key,
+        "thresholds": dict(thresholds),
+    }
+
+
+def _stream_next_frame(ws: Any, first: Any) -> Tuple[Any, List[Any], int]:
+    """Drain queued messages so only the newest frame is analyzed.
+
+    Returns (frame_message, control_messages, dropped_frames). Text messages are
+    control/metadata updates and are always kept; older binary frames are dropped
+    (latest frame wins), which is how the server applies back-pressure.
+    """
+    frame = first if isinstance(first, (bytes, bytearray)) else None
+    controls: List[Any] = [] if frame is not None else [first]
+    dropped = 0
+    while True:
+        nxt = ws.receive(timeout=0)
+        if nxt is None:
+            break
+        if isinstance(nxt, (bytes, bytearray)):
+            if frame is not None:
+                dropped += 1
+            frame = nxt
+        else:
+            controls.append(nxt)
+    return frame, controls, dropped
+
+
+def _analyze_stream(ws: Any) -> None:
+    """Long-lived per-vehicle frame session over WebSocket.
+
+    Protocol:
+    - connect: `/analyze_stream?trip_id=<id>&speed=<kmh>` (query args are the initial metadata)
+    - client -> server binary message: one encoded frame (JPEG/PNG)
+    - client -> server text message: JSON metadata update, e.g. {"speed": 42};
+      {"type": "rebind"} re-sends the session info and a full result;
+      {"image": "<base64>"} is accepted as a frame for clients without binary support
+    - server -> client: {"type": "session", ...} once after binding (driver id and
+      thresholds at that time; frames re-read both from the caches, so a late driver
+      lookup or a calibration freeze applies to the next frame), then
+      {"type": "result", "seq": n, "full": bool, "dropped_frames": k, "data": {...}}
+      where `data` only carries top-level keys that changed since the previous result
+      (`full` is True for the first result and after a rebind)
+    """
+    meta: Dict[str, Any] = _frame_metadata_from_pairs(request.args.items())
+    bound = _stream_bind_session(meta)
+    ws.send(json.dumps({"type": "session", **bound}))
+
+    last_sent: Optional[Dict[str, Any]] = None
+    seq = 0
+    while True:
+        try:
+            message = ws.receive()
+        except ConnectionClosed:
+            break
+        if message is None:
+            continue
+
+        frame_bytes, controls, dropped = _stream_next_frame(ws, message)
+
+        image: Optional[np.ndarray] = None
+        json_frame: Optional[str] = None
+        for raw in controls:
+            try:
+                update = json.loads(raw)
+            except (TypeError, ValueError):
+                ws.send(json.dumps({"type": "error", "error": "invalid JSON message"}))
+                continue
+            if not isinstance(update, dict):
+                continue
+            if str(update.get("type") or "") == "rebind":
+                meta.update({k: v for k, v in update.items() if k != "type"})
+                bound = _stream_bind_session(meta)
+                last_sent = None
+                ws.send(json.dumps({"type": "session", **bound}))
+                continue
+            frame_field = update.pop("image", None) or update.pop("frame", None)
+            if frame_field:
+                json_frame = str(frame_field)
+            meta.update({k: v for k, v in update.items() if k != "type"})
+
+        if frame_bytes is not None:
+            image = _decode_image_bytes(bytes(frame_bytes))
+            if image is None:
+                ws.send(json.dumps({"type": "error", "error": "failed to decode image"}))
+                continue
+        elif json_frame is not None:
+            image = _decode_image(json_frame)
+            if image is None:
+                ws.send(json.dumps({"type": "error", "error": "failed to decode image"}))
+                continue
+        else:
+            continue
+
+        payload = dict(meta)
+        payload["trip_id"] = bound["trip_id"]
+        result = _analyze_frame_result(
+            payload,
+            image,
+            driver_id=str(meta.get("driver_id") or "").strip() or None,
+        )
+        seq += 1
+        ws.send(json.dumps({
+            "type": "result",
+            "seq": seq,
+            "full": last_sent is None,
+            "dropped_frames": dropped,
+            "data": _result_delta(last_sent, result),
+        }, default=str))
+        last_sent = result
+
+
+if sock is not None:
+    sock.route("/analyze_stream")(_analyze_stream)
+
+
 @app.post("/compute_risk")
 def compute_risk() -> Any:
     payload = request.get_json(silent=True) or {}
     trip_id = payload.get("trip_id")
 
     risk_result = _compute_risk(payload)
+    driver_id = _get_driver_id_from_trip(str(trip_id or ""))
+    get_session_registry().touch(
+        str(trip_id or f"driver:{driver_id}"), trip=str(trip_id or "unknown_trip"), driver=driver_id
+    )
     ts = datetime.now(timezone.utc).isoformat()
     recommended_score = risk_result.get("risk_score_weighted")
     if recommended_score is None:
@@ -1886,7 +2423,9 @@ def compute_risk() -> Any:
     }
 
     if _compute_risk_persist_events:
-        sent_to_backend, callback_message = _post_result_to_backend(result_payload)
+        # Same pooled, batched delivery as the fast loop; never blocks on the backend.
+        sent_to_backend = get_persistence_client().enqueue([result_payload]) > 0
+        callback_message = "queued" if sent_to_backend else "dropped (persistence queue full)"
     else:
         sent_to_backend, callback_message = (False, "disabled_for_dedupe")
 
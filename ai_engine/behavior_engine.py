@@ -26,6 +26,8 @@ from collections import deque
 from dataclasses import dataclass, field
 from typing import Any, Deque, Dict, List, Optional, Tuple
 
+from session_registry import ExpiryHeap, get_session_registry
+
 
 @dataclass
 class _Episode:
@@ -115,6 +117,7 @@ class BehaviorEngine:
 
         self._driver_ttl_s = float(driver_ttl_s)
         self._drivers: Dict[str, _DriverBehaviorState] = {}
+        self._driver_expiry = ExpiryHeap(self._driver_ttl_s, self._driver_last_seen)
 
         # Ignore short low-EAR dips as normal blinks.
         self._blink_ignore_s = float(os.getenv("BLINK_IGNORE_SECONDS", "0.5"))
@@ -163,7 +166,7 @@ class BehaviorEngine:
         self._default_roll_turn = float(os.getenv("DEFAULT_HEAD_ROLL_THRESH", "17"))
 
         # Track last end time for cooldown
-        self._last_end_ts: Dict[Tuple[str, str], float] = {}  # (driver_id, event_type) -> ts
+        self._last_end_ts: Dict[str, Dict[str, float]] = {}  # driver_id -> {event_type: ts}
 
     def update(
         self,
@@ -181,6 +184,7 @@ class BehaviorEngine:
         if state is None:
             state = _DriverBehaviorState()
             self._drivers[driver_id] = state
+            self._driver_expiry.schedule(driver_id, now)
         state.last_seen_ts = now
         if state.baseline_learning_start_ts is None:
             state.baseline_learning_start_ts = now
@@ -683,21 +687,29 @@ class BehaviorEngine:
         now = float(ts if ts is not None else time.time())
         self._reset_driver(driver_id, now)
 
+    def release_driver(self, driver_id: str) -> None:
+        """Drop a driver's temporal state and episode cooldowns (no driver session left)."""
+        self._drivers.pop(driver_id, None)
+        self._last_end_ts.pop(driver_id, None)
+
+    def driver_state(self, driver_id: str) -> List[Any]:
+        """Everything held for one driver (used for memory accounting)."""
+        return [self._drivers.get(driver_id), self._last_end_ts.get(driver_id)]
+
     def reset_all(self) -> None:
         """Clear all drivers' temporal state."""
         self._drivers.clear()
         self._last_end_ts.clear()
+        self._driver_expiry.clear()
+
+    def _driver_last_seen(self, driver_id: str) -> Optional[float]:
+        st = self._drivers.get(driver_id)
+        return st.last_seen_ts if st is not None else None
 
     def _expire_old_drivers(self, now: float) -> None:
-        if self._driver_ttl_s <= 0:
-            return
-        expired = [
-            driver_id
-            for driver_id, st in self._drivers.items()
-            if (now - st.last_seen_ts) > self._driver_ttl_s
-        ]
-        for driver_id in expired:
-            del self._drivers[driver_id]
+        for driver_id in self._driver_expiry.pop_expired(now):
+            self._drivers.pop(driver_id, None)
+            self._last_end_ts.pop(driver_id, None)
 
     def _reset_driver(self, driver_id: str, now: float) -> None:
         st = self._drivers.get(driver_id)
@@ -833,10 +845,11 @@ class BehaviorEngine:
         for d in detections:
             t = str(d.get("type", ""))
             if t in occlusion_types:
-                last = float(self._last_end_ts.get(("__occlusion__", t), 0.0) or 0.0)
+                occlusion_ends = self._last_end_ts.setdefault("__occlusion__", {})
+                last = float(occlusion_ends.get(t, 0.0) or 0.0)
                 if (now - last) < self._occlusion_alert_cooldown_s:
                     continue
-                self._last_end_ts[("__occlusion__", t)] = now
+                occlusion_ends[t] = now
             filtered.append(d)
 
         return sorted(filtered, key=lambda d: priority_rank.get(str(d.get("type", "")), 99))
@@ -907,7 +920,7 @@ class BehaviorEngine:
             return False
 
         cooldown = float(self._cooldown_s.get(event_type, 0.0) or 0.0)
-        last_end = float(self._last_end_ts.get((driver_id, event_type), 0.0) or 0.0)
+        last_end = float(self._last_end_ts.get(driver_id, {}).get(event_type, 0.0) or 0.0)
         if cooldown > 0 and (now - last_end) < cooldown:
             return False
 
@@ -975,7 +988,7 @@ class BehaviorEngine:
             return
         ep.active = False
         ep.last_ts = now
-        self._last_end_ts[(driver_id, event_type)] = now
+        self._last_end_ts.setdefault(driver_id, {})[event_type] = now
 
     @staticmethod
     def _episode_duration(ep: _Episode, now: float) -> float:
@@ -1031,5 +1044,12 @@ _behavior_engine_singleton: Optional[BehaviorEngine] = None
 def get_behavior_engine() -> BehaviorEngine:
     global _behavior_engine_singleton
     if _behavior_engine_singleton is None:
-        _behavior_engine_singleton = BehaviorEngine()
+        engine = BehaviorEngine()
+        get_session_registry().register_owner(
+            "behavior",
+            scope="driver",
+            release=engine.release_driver,
+            lookup=engine.driver_state,
+        )
+        _behavior_engine_singleton = engine
     return _behavior_engine_singleton
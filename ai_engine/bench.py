@@ -0,0 +1,588 @@
+"""ai_engine.bench
+
+Reproducible micro/macro benchmarks for the AI engine components.
+
+Measures latency (mean, p50/p95/p99, min/max) and throughput for:
+
+- `landmarks`          `LandmarkEngine.process_frame` (IMAGE mode, one-off frames)
+- `landmarks_stream`   `LandmarkEngine.process_frame` with a session (VIDEO/ROI mode)
+- `face_embeddings`    `FaceRecognitionService.extract_face_embeddings`
+- `emotion_predict`    `EmotionEngine.predict` on a face crop (ONNX)
+- `behavior_update`    `BehaviorEngine.update` over a metrics sequence
+- `risk_compute`       `RiskEngine.compute` over the matching detections
+- `analyze_frame_json` full `POST /analyze_frame` (base64 JSON) via the Flask test client
+- `analyze_frame_jpeg` full `POST /analyze_frame` (raw `image/jpeg` body)
+
+Inputs are either deterministic synthetic frames (default, seeded) or recorded
+frames (`--video` file or `--frames` directory of images), loaded into memory
+before timing so file decoding is not measured. Behavior/risk use landmark
+metrics from those frames when a face is found, else a synthetic metrics
+sequence that exercises blink, drowsiness, yawning and head-turn paths.
+
+Components whose models are unavailable (no network to download them, missing
+ONNX file) are reported as `"status": "skipped"` with the reason instead of
+failing the run.
+
+Results are one JSON document (commit, environment, parameters, per-component
+stats); `compare` diffs two of them and exits non-zero on regressions.
+
+Usage (from the repo root, or `python bench.py ...` from `ai_engine/`):
+  python -m ai_engine.bench run --output bench.json
+  python -m ai_engine.bench run --video dashcam.mp4 --iterations 300 --components landmarks,analyze_frame_jpeg
+  python -m ai_engine.bench compare baseline.json bench.json --max-regression 0.15
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+# Engine modules use flat imports (`from landmark_engine import ...`).
+_ENGINE_DIR = os.path.dirname(os.path.abspath(__file__))
+if _ENGINE_DIR not in sys.path:
+    sys.path.insert(0, _ENGINE_DIR)
+
+import argparse
+import base64
+import importlib.metadata
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+COMPONENTS: Tuple[str, ...] = (
+    "landmarks",
+    "landmarks_stream",
+    "face_embeddings",
+    "emotion_predict",
+    "behavior_update",
+    "risk_compute",
+    "analyze_frame_json",
+    "analyze_frame_jpeg",
+)
+
+BENCH_SEED = 1234
+BENCH_FPS = 15.0  # timestamp spacing for stateful engines (behavior, risk, stream landmarks)
+
+
+class Skip(Exception):
+    """Raised by a component setup when it cannot run in this environment."""
+
+
+# ---------------------------------------------------------------------------
+# Inputs
+# ---------------------------------------------------------------------------
+
+
+def synthetic_frames(count: int, *, width: int = 640, height: int = 480, seed: int = BENCH_SEED) -> List[np.ndarray]:
+    """Deterministic cabin-like frames: noisy background with a drawn face that drifts and blinks."""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(40, 90, size=(height, width, 3), dtype=np.uint8)
+    frames: List[np.ndarray] = []
+    for i in range(max(1, int(count))):
+        img = base.copy()
+        cx = int(width * 0.5 + (width * 0.05) * np.sin(i / 10.0))
+        cy = int(height * 0.45)
+        rx, ry = int(width * 0.11), int(height * 0.2)
+        cv2.ellipse(img, (cx, cy), (rx, ry), 0, 0, 360, (150, 180, 215), -1)
+        eye_h = 2 if (i % 30) < 3 else 8  # periodic blink
+        for dx in (-rx // 2, rx // 2):
+            cv2.ellipse(img, (cx + dx, cy - ry // 4), (rx // 5, eye_h), 0, 0, 360, (40, 40, 40), -1)
+        mouth_h = 4 + int(10 * max(0.0, np.sin(i / 25.0)))  # slow "yawn"
+        cv2.ellipse(img, (cx, cy + ry // 2), (rx // 3, mouth_h), 0, 0, 360, (60, 50, 120), -1)
+        frames.append(img)
+    return frames
+
+
+def load_video_frames(path: str, *, max_frames: int, stride: int = 1) -> List[np.ndarray]:
+    from offline import _iter_video_frames
+
+    return [frame for _, _, _, frame in _iter_video_frames(path, start_ts=0.0, stride=stride, max_frames=max_frames)]
+
+
+def load_image_frames(directory: str, *, max_frames: int) -> List[np.ndarray]:
+    names = sorted(
+        n for n in os.listdir(directory)
+        if n.lower().endswith((".jpg", ".jpeg", ".png", ".bmp", ".webp"))
+    )
+    frames: List[np.ndarray] = []
+    for name in names[: max(1, int(max_frames))]:
+        img = cv2.imread(os.path.join(directory, name), cv2.IMREAD_COLOR)
+        if img is not None:
+            frames.append(img)
+    if not frames:
+        raise ValueError(f"no readable images in {directory}")
+    return frames
+
+
+def synthetic_metrics_sequence(count: int, *, width: int = 640, height: int = 480) -> List[Dict[str, Any]]:
+    """Landmark-engine-shaped metrics with blinks, a drowsy stretch, yawns and head turns."""
+    seq: List[Dict[str, Any]] = []
+    for i in range(max(1, int(count))):
+        phase = i % 300
+        ear = 0.30
+        if i % 45 < 3:
+            ear = 0.12  # blink
+        if 120 <= phase < 160:
+            ear = 0.14  # eyes closed for ~2.7s at 15 fps
+        mar = 0.55 if 200 <= phase < 260 else 0.05
+        yaw = 35.0 if 270 <= phase < 300 else 3.0 * np.sin(i / 7.0)
+        seq.append({
+            "face_detected": True,
+            "landmarks_detected": True,
+            "ear": float(ear),
+            "mar": float(mar),
+            "yaw_angle": float(yaw),
+            "pitch_angle": float(2.0 * np.cos(i / 11.0)),
+            "roll_angle": 0.0,
+            "faces_detected": 1,
+            "face_bbox": {"x": width // 3, "y": height // 4, "w": width // 4, "h": height // 2},
+            "eye_boxes": [],
+            "all_face_boxes": [],
+            "image_width": width,
+            "image_height": height,
+            "face_presence_confidence": 0.95,
+            "driver_landmark_count": 468,
+            "driver_landmark_ratio": 1.0,
+            "face_area_ratio": 0.12,
+            "eye_distance_norm": 0.18,
+            "mouth_area_ratio": 0.02 + mar * 0.05,
+            "mouth_landmark_ratio": 1.0,
+            "mouth_center": [0.5, 0.62],
+        })
+    return seq
+
+
+# ---------------------------------------------------------------------------
+# Timing
+# ---------------------------------------------------------------------------
+
+
+def _latency_stats(samples_s: List[float], *, total_s: float, items_per_call: int = 1) -> Dict[str, Any]:
+    arr = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {
+        "status": "ok",
+        "iterations": int(arr.size),
+        "total_s": round(float(total_s), 4),
+        "throughput_per_s": round((arr.size * items_per_call) / total_s, 2) if total_s > 0 else None,
+        "latency_ms": {
+            "mean": round(float(arr.mean()), 4),
+            "p50": round(float(p50), 4),
+            "p95": round(float(p95), 4),
+            "p99": round(float(p99), 4),
+            "min": round(float(arr.min()), 4),
+            "max": round(float(arr.max()), 4),
+            "stdev": round(float(arr.std()), 4),
+        },
+    }
+
+
+def measure(fn: Callable[[int], Any], *, iterations: int, warmup: int) -> Dict[str, Any]:
+    """Call `fn(i)` `warmup` times untimed, then `iterations` times timed."""
+    for i in range(max(0, int(warmup))):
+        fn(i)
+    samples: List[float] = []
+    started = time.perf_counter()
+    for i in range(max(1, int(iterations))):
+        t0 = time.perf_counter()
+        fn(int(warmup) + i)
+        samples.append(time.perf_counter() - t0)
+    return _latency_stats(samples, total_s=time.perf_counter() - started)
+
+
+# ---------------------------------------------------------------------------
+# Components (each returns the per-iteration callable or raises Skip)
+# ---------------------------------------------------------------------------
+
+
+class BenchContext:
+    def __init__(self, frames: List[np.ndarray], *, metrics_seq: List[Dict[str, Any]]) -> None:
+        self.frames = frames
+        self.metrics_seq = metrics_seq
+        self.t0 = 1_700_000_000.0
+
+    def frame(self, i: int) -> np.ndarray:
+        return self.frames[i % len(self.frames)]
+
+    def ts(self, i: int) -> float:
+        return self.t0 + i / BENCH_FPS
+
+
+def _setup_landmarks(ctx: BenchContext) -> Callable[[int], Any]:
+    from landmark_engine import LandmarkEngine
+
+    engine = LandmarkEngine()
+    if not engine.initialized:
+        raise Skip("FaceLandmarker not initialized (model unavailable)")
+    return lambda i: engine.process_frame(ctx.frame(i))
+
+
+def _setup_landmarks_stream(ctx: BenchContext) -> Callable[[int], Any]:
+    from landmark_engine import LandmarkEngine
+
+    engine = LandmarkEngine()
+    if not engine.initialized:
+        raise Skip("FaceLandmarker not initialized (model unavailable)")
+    return lambda i: engine.process_frame(ctx.frame(i), session_key="bench", timestamp_ms=int(ctx.ts(i) * 1000.0))
+
+
+def _setup_face_embeddings(ctx: BenchContext) -> Callable[[int], Any]:
+    from face_recognition_service import FaceRecognitionService
+
+    service = FaceRecognitionService()
+    h, w = ctx.frame(0).shape[:2]
+    if not service.available or not service._ensure_initialized(w, h):
+        raise Skip("YuNet/SFace models unavailable")
+    return lambda i: service.extract_face_embeddings(ctx.frame(i))
+
+
+def _setup_emotion_predict(ctx: BenchContext) -> Callable[[int], Any]:
+    from emotion_engine import EmotionEngine
+
+    engine = EmotionEngine()
+    crops: List[np.ndarray] = []
+    for m, frame in zip(ctx.metrics_seq, ctx.frames):
+        bbox = m.get("face_bbox") or {}
+        x, y, w, h = (int(bbox.get(k, 0)) for k in ("x", "y", "w", "h"))
+        crop = frame[max(0, y): y + h, max(0, x): x + w]
+        if crop.size:
+            crops.append(np.ascontiguousarray(crop))
+    if not crops:
+        crops = [np.ascontiguousarray(f[f.shape[0] // 4: f.shape[0] * 3 // 4, f.shape[1] // 3: f.shape[1] * 2 // 3]) for f in ctx.frames]
+    try:
+        engine.predict(crops[0])
+    except Exception as e:
+        raise Skip(f"emotion model unavailable: {e}")
+    return lambda i: engine.predict(crops[i % len(crops)])
+
+
+def _setup_behavior_update(ctx: BenchContext) -> Callable[[int], Any]:
+    from behavior_engine import BehaviorEngine
+
+    engine = BehaviorEngine()
+    thresholds = {"ear_drowsiness": 0.20, "mar_yawning": 0.08, "head_turn": 20.0}
+    seq = ctx.metrics_seq
+    # update() may annotate the dict; hand it a copy so every pass sees the same input.
+    return lambda i: engine.update(driver_id="bench_driver", cv_metrics=dict(seq[i % len(seq)]), thresholds=thresholds, ts=ctx.ts(i))
+
+
+def _setup_risk_compute(ctx: BenchContext) -> Callable[[int], Any]:
+    from behavior_engine import BehaviorEngine
+    from risk_engine import RiskEngine
+
+    # Detections come from a separate (untimed) behavior pass over the same sequence.
+    behavior = BehaviorEngine()
+    thresholds = {"ear_drowsiness": 0.20, "mar_yawning": 0.08, "head_turn": 20.0}
+    steps: List[Tuple[List[Dict[str, Any]], Dict[str, Any]]] = []
+    for i, m in enumerate(ctx.metrics_seq):
+        out = behavior.update(driver_id="bench_driver", cv_metrics=dict(m), thresholds=thresholds, ts=ctx.ts(i))
+        steps.append((list(out.get("detections", []) or []), dict(out.get("raw_scores") or {})))
+
+    engine = RiskEngine()
+    return lambda i: engine.compute(
+        trip_id="bench_trip",
+        detections=steps[i % len(steps)][0],
+        raw_scores=steps[i % len(steps)][1],
+        speed_kmh=60.0,
+    )
+
+
+def _engine_app():
+    import app as engine_app
+
+    return engine_app
+
+
+def _setup_analyze_frame_json(ctx: BenchContext) -> Callable[[int], Any]:
+    client = _engine_app().app.test_client()
+    bodies = []
+    for frame in ctx.frames:
+        ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+        bodies.append({"image": base64.b64encode(buf.tobytes()).decode("ascii"), "input_type": "bench", "speed": 60})
+
+    def _call(i: int) -> None:
+        resp = client.post("/analyze_frame", json=bodies[i % len(bodies)])
+        if resp.status_code != 200:
+            raise RuntimeError(f"/analyze_frame returned {resp.status_code}")
+
+    return _call
+
+
+def _setup_analyze_frame_jpeg(ctx: BenchContext) -> Callable[[int], Any]:
+    client = _engine_app().app.test_client()
+    bodies = []
+    for frame in ctx.frames:
+        ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+        bodies.append(buf.tobytes())
+
+    def _call(i: int) -> None:
+        resp = client.post(
+            "/analyze_frame?input_type=bench&speed=60",
+            data=bodies[i % len(bodies)],
+            content_type="image/jpeg",
+        )
+        if resp.status_code != 200:
+            raise RuntimeError(f"/analyze_frame returned {resp.status_code}")
+
+    return _call
+
+
+_SETUPS: Dict[str, Callable[[BenchContext], Callable[[int], Any]]] = {
+    "landmarks": _setup_landmarks,
+    "landmarks_stream": _setup_landmarks_stream,
+    "face_embeddings": _setup_face_embeddings,
+    "emotion_predict": _setup_emotion_predict,
+    "behavior_update": _setup_behavior_update,
+    "risk_compute": _setup_risk_compute,
+    "analyze_frame_json": _setup_analyze_frame_json,
+    "analyze_frame_jpeg": _setup_analyze_frame_jpeg,
+}
+
+
+# ---------------------------------------------------------------------------
+# Run / compare
+# ---------------------------------------------------------------------------
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=_ENGINE_DIR,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+        sha = out.stdout.strip()
+        if not sha:
+            return None
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=_ENGINE_DIR, capture_output=True, text=True, timeout=5)
+        return sha + ("-dirty" if dirty.stdout.strip() else "")
+    except Exception:
+        return None
+
+
+def _environment() -> Dict[str, Any]:
+    versions: Dict[str, Optional[str]] = {"numpy": np.__version__, "opencv": cv2.__version__}
+    for dist in ("mediapipe", "onnxruntime", "flask"):
+        try:
+            versions[dist] = importlib.metadata.version(dist)
+        except importlib.metadata.PackageNotFoundError:
+            versions[dist] = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "opencv_threads": cv2.getNumThreads(),
+        "packages": versions,
+    }
+
+
+def _real_metrics_sequence(frames: List[np.ndarray]) -> Optional[List[Dict[str, Any]]]:
+    """Landmark metrics for recorded frames, or None when no face is found / no model."""
+    try:
+        from landmark_engine import LandmarkEngine
+
+        engine = LandmarkEngine()
+        if not engine.initialized:
+            return None
+        seq = [engine.process_frame(f) for f in frames]
+    except Exception:
+        return None
+    if not any(m.get("face_detected") for m in seq):
+        return None
+    return seq
+
+
+def run_benchmarks(
+    *,
+    components: List[str],
+    frames: List[np.ndarray],
+    source: str,
+    iterations: int,
+    warmup: int,
+    heavy_iterations: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Run the selected components and return the results document."""
+    h, w = frames[0].shape[:2]
+    metrics_seq = _real_metrics_sequence(frames) if source != "synthetic" else None
+    metrics_source = "landmarks" if metrics_seq is not None else "synthetic"
+    if metrics_seq is None:
+        metrics_seq = synthetic_metrics_sequence(max(len(frames), 300), width=w, height=h)
+    ctx = BenchContext(frames, metrics_seq=metrics_seq)
+
+    # Model-bound components are orders of magnitude slower than the pure-Python engines.
+    cheap = {"behavior_update", "risk_compute"}
+    results: Dict[str, Any] = {}
+    for name in components:
+        n = iterations if (name in cheap or heavy_iterations is None) else heavy_iterations
+        print(f"[bench] {name}: {n} iterations", file=sys.stderr)
+        try:
+            fn = _SETUPS[name](ctx)
+            results[name] = measure(fn, iterations=n, warmup=warmup)
+        except Skip as e:
+            results[name] = {"status": "skipped", "reason": str(e)}
+        except Exception as e:
+            results[name] = {"status": "error", "reason": f"{type(e).__name__}: {e}"}
+
+    doc: Dict[str, Any] = {
+        "schema": 1,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "environment": _environment(),
+        "params": {
+            "source": source,
+            "frames": len(frames),
+            "frame_size": [int(w), int(h)],
+            "metrics_source": metrics_source,
+            "iterations": iterations,
+            "heavy_iterations": heavy_iterations,
+            "warmup": warmup,
+            "seed": BENCH_SEED,
+        },
+        "results": results,
+    }
+    if any(name.startswith("analyze_frame") for name in components):
+        # Per-stage breakdown recorded by the service's own instrumentation.
+        from metrics import summary
+
+        doc["analyze_frame_stages"] = summary().get("ai_engine_stage_seconds", {})
+    return doc
+
+
+def compare_results(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    *,
+    max_regression: float,
+    stat: str = "p50",
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """Per-component latency change; `regressed` when current > baseline * (1 + max_regression)."""
+    rows: List[Dict[str, Any]] = []
+    any_regressed = False
+    base_results = baseline.get("results") or {}
+    for name, cur in (current.get("results") or {}).items():
+        base = base_results.get(name) or {}
+        if cur.get("status") != "ok" or base.get("status") != "ok":
+            rows.append({"component": name, "status": f"{base.get('status', 'missing')} -> {cur.get('status')}"})
+            continue
+        row: Dict[str, Any] = {"component": name, "status": "ok"}
+        regressed = False
+        for key in dict.fromkeys((stat, "p95")):
+            b = float(base["latency_ms"][key])
+            c = float(cur["latency_ms"][key])
+            change = (c - b) / b if b > 0 else 0.0
+            row[key] = {"baseline_ms": b, "current_ms": c, "change": round(change, 4)}
+            if key == stat and change > float(max_regression):
+                regressed = True
+        row["regressed"] = regressed
+        any_regressed = any_regressed or regressed
+        rows.append(row)
+    return rows, any_regressed
+
+
+def _load_frames(args: argparse.Namespace) -> Tuple[List[np.ndarray], str]:
+    if args.video:
+        return load_video_frames(args.video, max_frames=args.max_frames, stride=args.stride), f"video:{os.path.basename(args.video)}"
+    if args.frames:
+        return load_image_frames(args.frames, max_frames=args.max_frames), f"frames:{os.path.basename(os.path.normpath(args.frames))}"
+    width, height = (int(v) for v in str(args.size).lower().split("x"))
+    return synthetic_frames(args.max_frames, width=width, height=height), "synthetic"
+
+
+def _cmd_run(args: argparse.Namespace) -> int:
+    components = [c.strip() for c in str(args.components).split(",") if c.strip()] if args.components else list(COMPONENTS)
+    unknown = [c for c in components if c not in _SETUPS]
+    if unknown:
+        print(f"unknown component(s): {', '.join(unknown)} (choose from {', '.join(COMPONENTS)})", file=sys.stderr)
+        return 2
+
+    frames, source = _load_frames(args)
+    doc = run_benchmarks(
+        components=components,
+        frames=frames,
+        source=source,
+        iterations=args.iterations,
+        warmup=args.warmup,
+        heavy_iterations=args.heavy_iterations,
+    )
+    text = json.dumps(doc, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+    for name, res in doc["results"].items():
+        if res.get("status") == "ok":
+            lat = res["latency_ms"]
+            print(
+                f"{name:20s} p50={lat['p50']:9.3f}ms p95={lat['p95']:9.3f}ms p99={lat['p99']:9.3f}ms "
+                f"{res['throughput_per_s']:>10}/s",
+                file=sys.stderr,
+            )
+        else:
+            print(f"{name:20s} {res.get('status')}: {res.get('reason')}", file=sys.stderr)
+    return 1 if any(r.get("status") == "error" for r in doc["results"].values()) else 0
+
+
+def _cmd_compare(args: argparse.Namespace) -> int:
+    with open(args.baseline, "r", encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    with open(args.current, "r", encoding="utf-8") as fh:
+        current = json.load(fh)
+    rows, regressed = compare_results(baseline, current, max_regression=args.max_regression, stat=args.stat)
+    print(f"baseline {baseline.get('commit')}  ->  current {current.get('commit')}", file=sys.stderr)
+    for row in rows:
+        if row["status"] != "ok":
+            print(f"{row['component']:20s} {row['status']}", file=sys.stderr)
+            continue
+        s = row[args.stat]
+        flag = "  REGRESSION" if row["regressed"] else ""
+        print(
+            f"{row['component']:20s} {args.stat} {s['baseline_ms']:9.3f} -> {s['current_ms']:9.3f} ms "
+            f"({s['change'] * 100:+6.1f}%){flag}",
+            file=sys.stderr,
+        )
+    print(json.dumps({"regressed": regressed, "components": rows}, indent=2))
+    return 1 if regressed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m ai_engine.bench", description="AI engine component benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="Run benchmarks and write a JSON results document")
+    p.add_argument("--components", default=None, help=f"Comma-separated subset of: {', '.join(COMPONENTS)}")
+    p.add_argument("--video", default=None, help="Recorded video to take frames from")
+    p.add_argument("--frames", default=None, help="Directory of recorded frame images")
+    p.add_argument("--max-frames", type=int, default=60, help="Frames loaded into memory and cycled through (default 60)")
+    p.add_argument("--stride", type=int, default=1, help="Take every Nth video frame")
+    p.add_argument("--size", default="640x480", help="Synthetic frame size WxH (default 640x480)")
+    p.add_argument("--iterations", type=int, default=1000, help="Timed iterations per component (default 1000)")
+    p.add_argument("--heavy-iterations", type=int, default=200, help="Timed iterations for model-bound components (default 200)")
+    p.add_argument("--warmup", type=int, default=10, help="Untimed warm-up iterations (default 10)")
+    p.add_argument("--output", default=None, help="Write results JSON here instead of stdout")
+    p.set_defaults(func=_cmd_run)
+
+    p = sub.add_parser("compare", help="Compare two results documents; exit 1 on regression")
+    p.add_argument("baseline", help="Baseline results JSON")
+    p.add_argument("current", help="Current results JSON")
+    p.add_argument("--max-regression", type=float, default=0.15, help="Allowed relative slowdown (default 0.15 = 15%%)")
+    p.add_argument("--stat", choices=["p50", "p95", "p99", "mean"], default="p50", help="Latency statistic gated on (default p50)")
+    p.set_defaults(func=_cmd_compare)
+
+    args = parser.parse_args(argv)
+    return int(args.func(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
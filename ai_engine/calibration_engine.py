@@ -28,6 +28,8 @@ from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 
+from session_registry import ExpiryHeap
+
 try:
     from pymongo import MongoClient
 except Exception:  # pragma: no cover
@@ -108,6 +110,7 @@ class CalibrationEngine:
         )
 
         self._sessions: Dict[str, CalibrationSession] = {}
+        self._session_expiry = ExpiryHeap(self._session_ttl_s, self._session_last_seen)
 
     def start(self, *, driver_id: str, phase: CalibrationPhase = CalibrationPhase.NEUTRAL) -> CalibrationProgress:
         now = time.time()
@@ -119,6 +122,7 @@ class CalibrationEngine:
             last_seen_at=now,
         )
         self._sessions[driver_id] = session
+        self._session_expiry.schedule(driver_id, now)
         return self.get_progress(driver_id=driver_id)
 
     def reset(self, *, driver_id: str) -> CalibrationProgress:
@@ -398,19 +402,16 @@ class CalibrationEngine:
                 last_seen_at=now,
             )
             self._sessions[driver_id] = session
+            self._session_expiry.schedule(driver_id, now)
         return session
 
+    def _session_last_seen(self, driver_id: str) -> Optional[float]:
+        session = self._sessions.get(driver_id)
+        return session.last_seen_at if session is not None else None
+
     def _expire_old_sessions(self) -> None:
-        if self._session_ttl_s <= 0:
-            return
-        now = time.time()
-        expired = [
-            driver_id
-            for driver_id, session in self._sessions.items()
-            if (now - session.last_seen_at) > self._session_ttl_s
-        ]
-        for driver_id in expired:
-            del self._sessions[driver_id]
+        for driver_id in self._session_expiry.pop_expired(time.time()):
+            self._sessions.pop(driver_id, None)
 
     def _persist_to_mongo(
         self,
@@ -5,7 +5,10 @@ Session management for identity + personalization.
 Responsibilities:
 - Lock driver identity when a confident match occurs
 - Prevent identity switching mid-session
-- Load and cache thresholds for the active driver
+- Load and cache thresholds for the active driver (stale-while-revalidate:
+  callers always get the cached thresholds immediately; expired entries are
+  refreshed in the background with an ETag check, so unchanged thresholds cost
+  a 304)
 - Detect driver changes (e.g., when a lock is first established) so callers can reset state
 
 A "session" is keyed by `session_key` (typically `trip_id`).
@@ -15,11 +18,16 @@ from __future__ import annotations
 
 import json
 import os
+import threading
 import time
 from dataclasses import dataclass
 from typing import Any, Dict, Optional, Tuple
+from urllib.error import HTTPError
 from urllib.request import Request, urlopen
 
+from session_registry import ExpiryHeap, get_session_registry
+from task_pool import BoundedExecutor
+
 
 @dataclass
 class DriverSession:
@@ -68,6 +76,15 @@ class DriverSessionManager:
         }
 
         self._sessions: Dict[str, DriverSession] = {}
+        self._session_expiry = ExpiryHeap(self._session_ttl_s, self._session_last_seen)
+
+        # Per-driver threshold cache shared by all sessions:
+        # {driver_id: {thresholds, etag, loaded_at, retry_at, refreshing}}
+        self._threshold_retry_s = float(os.getenv("THRESHOLD_RETRY_S", "10"))
+        self._thresholds_by_driver: Dict[str, Dict[str, Any]] = {}
+        self._thresholds_lock = threading.Lock()
+        self._thresholds_loaded = threading.Condition(self._thresholds_lock)
+        self._refresh_executor = BoundedExecutor("threshold-refresh", workers=1, max_queue=64)
 
     def tick_frame(
         self,
@@ -90,6 +107,7 @@ class DriverSessionManager:
                 frame_counter=0,
             )
             self._sessions[session_key] = sess
+            self._session_expiry.schedule(session_key, ts)
 
         if not float(getattr(sess, "started_at", 0.0) or 0.0):
             sess.started_at = ts
@@ -118,6 +136,7 @@ class DriverSessionManager:
                 last_driver_seen_at=ts,
             )
             self._sessions[session_key] = sess
+            self._session_expiry.schedule(session_key, ts)
         if not float(getattr(sess, "started_at", 0.0) or 0.0):
             sess.started_at = ts
         sess.last_seen_at = ts
@@ -156,6 +175,7 @@ class DriverSessionManager:
         if sess is None:
             sess = DriverSession(session_key=key, active_driver_id=str(driver_id), last_seen_at=ts)
             self._sessions[key] = sess
+            self._session_expiry.schedule(key, ts)
 
         sess.last_seen_at = ts
         if sess.driver_encoding is not None:
@@ -198,6 +218,7 @@ class DriverSessionManager:
                 last_seen_at=ts,
             )
             self._sessions[session_key] = sess
+            self._session_expiry.schedule(session_key, ts)
 
         sess.last_seen_at = ts
 
@@ -230,26 +251,113 @@ class DriverSessionManager:
         session_key: str,
         driver_id: str,
         now: Optional[float] = None,
+        wait_s: float = 0.0,
     ) -> Dict[str, float]:
+        """Thresholds for `driver_id`, never blocking on the backend by default.
+
+        Returns the cached thresholds (even if expired; a background refresh is
+        scheduled) or, before the driver's first load completes, the defaults.
+        `wait_s` > 0 waits up to that long for a first load (stream/batch binding).
+        """
         ts = float(now if now is not None else time.time())
         sess = self._sessions.get(session_key)
         if sess is None:
             sess = DriverSession(session_key=session_key, active_driver_id=driver_id, last_seen_at=ts)
             self._sessions[session_key] = sess
+            self._session_expiry.schedule(session_key, ts)
 
         sess.last_seen_at = ts
 
-        if sess.thresholds and (ts - sess.thresholds_loaded_at) < self._thresholds_ttl_s:
-            return sess.thresholds
-
-        thresholds = self._fetch_thresholds_from_backend(driver_id)
-        sess.thresholds = thresholds
-        sess.thresholds_loaded_at = ts
+        driver_key = str(driver_id)
+        with self._thresholds_lock:
+            entry = self._thresholds_by_driver.get(driver_key)
+            if entry is None:
+                entry = {"thresholds": None, "etag": None, "loaded_at": 0.0, "retry_at": 0.0, "refreshing": False}
+                self._thresholds_by_driver[driver_key] = entry
+            mono = time.monotonic()
+            stale = (mono - float(entry["loaded_at"])) >= self._thresholds_ttl_s or entry["thresholds"] is None
+            schedule = stale and not entry["refreshing"] and mono >= float(entry["retry_at"])
+            if schedule:
+                entry["refreshing"] = True
+
+        if schedule and not self._refresh_executor.submit(self._refresh_thresholds, key=driver_key, driver_id=driver_key):
+            with self._thresholds_lock:
+                entry["refreshing"] = False
+
+        with self._thresholds_lock:
+            if entry["thresholds"] is None and wait_s > 0:
+                self._thresholds_loaded.wait_for(lambda: entry["thresholds"] is not None, timeout=float(wait_s))
+            thresholds = entry["thresholds"]
+
+        if thresholds is None:
+            return dict(self._default_thresholds)
+        if sess.thresholds is not thresholds:
+            sess.thresholds = thresholds
+            sess.thresholds_loaded_at = ts
         return thresholds
 
+    def invalidate_thresholds(self, *, driver_id: str) -> None:
+        """Refresh a driver's thresholds now (e.g. calibration was frozen).
+
+        Sessions keep the current values until the refresh lands.
+        """
+        driver_key = str(driver_id)
+        with self._thresholds_lock:
+            entry = self._thresholds_by_driver.get(driver_key)
+            if entry is None:
+                return
+            entry["loaded_at"] = 0.0
+            entry["retry_at"] = 0.0
+            entry["etag"] = None
+            if entry["refreshing"]:
+                return
+            entry["refreshing"] = True
+        if not self._refresh_executor.submit(self._refresh_thresholds, key=driver_key, driver_id=driver_key):
+            with self._thresholds_lock:
+                entry["refreshing"] = False
+
+    def _refresh_thresholds(self, *, driver_id: str) -> None:
+        with self._thresholds_lock:
+            entry = self._thresholds_by_driver.get(driver_id)
+            etag = entry.get("etag") if entry else None
+        try:
+            thresholds, new_etag, ok = self._fetch_thresholds_from_backend(driver_id, etag=etag)
+        except Exception:
+            thresholds, new_etag, ok = None, None, False
+
+        with self._thresholds_lock:
+            entry = self._thresholds_by_driver.get(driver_id)
+            if entry is None:
+                return
+            mono = time.monotonic()
+            entry["refreshing"] = False
+            if ok:
+                if thresholds is not None:  # None = 304 Not Modified
+                    entry["thresholds"] = thresholds
+                    entry["etag"] = new_etag
+                entry["loaded_at"] = mono
+                entry["retry_at"] = 0.0
+            else:
+                # Backend unreachable: keep serving what we have; use defaults if nothing yet.
+                if entry["thresholds"] is None:
+                    entry["thresholds"] = dict(self._default_thresholds)
+                entry["retry_at"] = mono + self._threshold_retry_s
+            self._thresholds_loaded.notify_all()
+
     def reset_session(self, *, session_key: str) -> None:
-        if session_key in self._sessions:
-            del self._sessions[session_key]
+        sess = self._sessions.pop(session_key, None)
+        if sess is not None and sess.active_driver_id:
+            # Callers reset sessions to pick up changed thresholds immediately.
+            self.invalidate_thresholds(driver_id=sess.active_driver_id)
+
+    def release_session(self, session_key: str) -> None:
+        """Forget a session without touching the driver's thresholds (eviction / trip end)."""
+        self._sessions.pop(session_key, None)
+
+    def release_driver(self, driver_id: str) -> None:
+        """Drop a driver's cached thresholds (no session uses the driver any more)."""
+        with self._thresholds_lock:
+            self._thresholds_by_driver.pop(str(driver_id), None)
 
     def export_session(self, *, session_key: str) -> Optional[Dict[str, Any]]:
         sess = self._sessions.get(session_key)
@@ -264,29 +372,38 @@ class DriverSessionManager:
             "thresholds_loaded": bool(sess.thresholds is not None),
         }
 
-    def _fetch_thresholds_from_backend(self, driver_id: str) -> Dict[str, float]:
+    def _fetch_thresholds_from_backend(
+        self, driver_id: str, *, etag: Optional[str] = None
+    ) -> Tuple[Optional[Dict[str, float]], Optional[str], bool]:
+        """GET the driver's thresholds. Returns (thresholds, etag, ok); thresholds is None on 304."""
+        endpoint = f"{self._backend_base_url.rstrip('/')}/drivers/{driver_id}/thresholds"
+        headers = {"If-None-Match": etag} if etag else {}
         try:
-            endpoint = f"{self._backend_base_url.rstrip('/')}/drivers/{driver_id}/thresholds"
-            with urlopen(Request(endpoint, method="GET"), timeout=2) as response:
-                if getattr(response, "status", 200) == 200:
-                    data = json.load(response) or {}
-                    thresholds = data.get("thresholds", {}) or {}
-                    return {
-                        "ear_drowsiness": float(thresholds.get("ear_drowsiness", self._default_thresholds["ear_drowsiness"])),
-                        "mar_yawning": float(thresholds.get("mar_yawning", self._default_thresholds["mar_yawning"])),
-                        "head_turn": float(thresholds.get("head_turn", self._default_thresholds["head_turn"])),
-                    }
+            with urlopen(Request(endpoint, headers=headers, method="GET"), timeout=2) as response:
+                if getattr(response, "status", 200) != 200:
+                    return None, None, False
+                data = json.load(response) or {}
+                thresholds = data.get("thresholds", {}) or {}
+                return {
+                    "ear_drowsiness": float(thresholds.get("ear_drowsiness", self._default_thresholds["ear_drowsiness"])),
+                    "mar_yawning": float(thresholds.get("mar_yawning", self._default_thresholds["mar_yawning"])),
+                    "head_turn": float(thresholds.get("head_turn", self._default_thresholds["head_turn"])),
+                }, response.headers.get("ETag"), True
+        except HTTPError as exc:
+            if int(exc.code) == 304:
+                return None, etag, True
         except Exception:
             pass
 
-        return dict(self._default_thresholds)
+        return None, None, False
+
+    def _session_last_seen(self, session_key: str) -> Optional[float]:
+        sess = self._sessions.get(session_key)
+        return sess.last_seen_at if sess is not None else None
 
     def _expire_old(self, now: float) -> None:
-        if self._session_ttl_s <= 0:
-            return
-        expired = [k for k, s in self._sessions.items() if (now - s.last_seen_at) > self._session_ttl_s]
-        for k in expired:
-            del self._sessions[k]
+        for k in self._session_expiry.pop_expired(now):
+            self._sessions.pop(k, None)
 
 
 _driver_session_manager_singleton: Optional[DriverSessionManager] = None
@@ -295,5 +412,18 @@ _driver_session_manager_singleton: Optional[DriverSessionManager] = None
 def get_driver_session_manager() -> DriverSessionManager:
     global _driver_session_manager_singleton
     if _driver_session_manager_singleton is None:
-        _driver_session_manager_singleton = DriverSessionManager()
+        manager = DriverSessionManager()
+        registry = get_session_registry()
+        registry.register_owner(
+            "driver_session",
+            release=manager.release_session,
+            lookup=manager._sessions.get,
+        )
+        registry.register_owner(
+            "driver_thresholds",
+            scope="driver",
+            release=manager.release_driver,
+            lookup=manager._thresholds_by_driver.get,
+        )
+        _driver_session_manager_singleton = manager
     return _driver_session_manager_singleton
@@ -19,6 +19,7 @@ Layer 3: Three Output Channels
 
 from __future__ import annotations
 
+import logging
 import time
 from collections import Counter, deque
 from pathlib import Path
@@ -28,6 +29,14 @@ import cv2
 import numpy as np
 import onnxruntime as ort
 
+from frame_context import FrameContext
+from session_registry import get_session_registry
+from structured_log import FRAME_LOG_SAMPLE_N, Sampler, get_logger, log_event
+
+_log = get_logger("emotion")
+# Model debug traces (`debug` / `debug_viz`) are sampled like the per-frame log.
+_model_debug_sampler = Sampler(FRAME_LOG_SAMPLE_N)
+
 
 def default_emotion_result() -> Dict[str, Any]:
     return {
@@ -91,18 +100,13 @@ class EmotionEngine:
         self._input_name = self._session.get_inputs()[0].name
 
         if self.debug:
-            print("Input name:", self._session.get_inputs()[0].name)
-            print("Input shape:", self._session.get_inputs()[0].shape)
-            print("Output name:", self._session.get_outputs()[0].name)
-            print("Output shape:", self._session.get_outputs()[0].shape)
-
-            print("Model Inputs:")
-            for inp in self._session.get_inputs():
-                print(inp.name, inp.shape, inp.type)
-
-            print("\nModel Outputs:")
-            for out in self._session.get_outputs():
-                print(out.name, out.shape, out.type)
+            log_event(
+                _log,
+                logging.DEBUG,
+                "emotion model loaded",
+                inputs=[(i.name, i.shape, i.type) for i in self._session.get_inputs()],
+                outputs=[(o.name, o.shape, o.type) for o in self._session.get_outputs()],
+            )
 
     def predict(self, face_img: np.ndarray, debug_viz: bool = False) -> tuple[str, float]:
         if face_img is None or getattr(face_img, "size", 0) == 0:
@@ -113,12 +117,11 @@ class EmotionEngine:
         assert self._input_name is not None
 
         model_input_shape = self._session.get_inputs()[0].shape
-        if self.debug or debug_viz:
-            print("\n" + "="*60)
-            print("🔍 EMOTION MODEL DEBUG")
-            print("="*60)
-            print(f"Model expects input shape: {model_input_shape}")
-            print(f"Input name: {self._input_name}")
+        trace = (
+            (self.debug or debug_viz)
+            and _log.isEnabledFor(logging.DEBUG)
+            and _model_debug_sampler.hit("predict")
+        )
 
         target_h = 64
         target_w = 64
@@ -130,81 +133,64 @@ class EmotionEngine:
             if isinstance(w_raw, int) and w_raw > 0:
                 target_w = int(w_raw)
 
-        if self.debug or debug_viz:
-            print(f"Target shape: H={target_h}, W={target_w}")
-            print(f"Input face shape (before resize): {face_img.shape}")
-
+        input_shape = face_img.shape
         # Step 1: Resize to target dimensions
         face = cv2.resize(face_img, (target_w, target_h))
-        
-        if self.debug or debug_viz:
-            print(f"\n📸 Face resized to ({target_w}x{target_h})")
-            print(f"  Pixel range: [{face.min()}, {face.max()}]")
-            print(f"  Mean pixel value: {face.mean():.1f}")
 
         # Step 2: Convert to grayscale (CRITICAL - must match model expectations)
-        face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
-        
-        if self.debug or debug_viz:
-            print(f"\n✓ Converted to grayscale")
-            print(f"  Shape after grayscale: {face.shape}")
-            print(f"  Pixel range: [{face.min()}, {face.max()}]")
+        # Crops from a FrameContext are already grayscale.
+        if face.ndim == 3:
+            face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
 
         # Step 3: Convert to float32 but DO NOT normalize (model expects raw 0-255)
         face = face.astype(np.float32)
-        
-        if self.debug or debug_viz:
-            print(f"\n✓ Converted to float32 (no normalization)")
-            print(f"  Shape: {face.shape}")
-            print(f"  Min: {face.min():.1f}, Max: {face.max():.1f}, Mean: {face.mean():.1f}")
-            print(f"  ⚠️ NOTE: Keeping raw pixel values 0-255 (NOT normalized)")
 
         # Step 4: Add channel dimension [H, W] → [1, H, W]
         face = np.expand_dims(face, axis=0)
-        
-        if self.debug or debug_viz:
-            print(f"\n✓ Added channel dimension")
-            print(f"  Shape: {face.shape}")
 
         # Step 5: Add batch dimension [1, H, W] → [1, 1, H, W]
         face = np.expand_dims(face, axis=0)
-        
-        if self.debug or debug_viz:
-            print(f"\n✓ Added batch dimension")
-            print(f"  Final shape: {face.shape}")
-            print(f"  Expected shape: {model_input_shape}")
-            print(f"  Match: {face.shape == tuple(model_input_shape)}")
+
+        if trace:
+            log_event(
+                _log,
+                logging.DEBUG,
+                "emotion model input",
+                input_name=self._input_name,
+                model_input_shape=model_input_shape,
+                face_shape=input_shape,
+                tensor_shape=face.shape,
+                shape_match=face.shape == tuple(model_input_shape),
+                pixel_min=round(float(face.min()), 1),
+                pixel_max=round(float(face.max()), 1),
+                pixel_mean=round(float(face.mean()), 1),
+            )
 
         # Step 6: Run inference
-        if self.debug or debug_viz:
-            print(f"\n🚀 Running inference...")
-        
         outputs = self._session.run(None, {self._input_name: face})
-
-        # Step 7: Check raw output distribution
         logits = outputs[0][0]
-        if self.debug or debug_viz:
-            print(f"\n📊 Raw logits from model:")
-            print(f"  {logits}")
-            print(f"  Min: {logits.min():.4f}, Max: {logits.max():.4f}, Std: {np.std(logits):.4f}")
 
         # Convert logits to probabilities using stable softmax
         exp_scores = np.exp(logits - np.max(logits))
         probs = exp_scores / exp_scores.sum()
-        
-        if self.debug or debug_viz:
-            print(f"\n📈 Softmax probabilities:")
-            for idx, (emotion, prob) in enumerate(zip(self.emotions, probs)):
-                print(f"  {emotion:12}: {prob:.4f}")
 
         emotion_index = int(np.argmax(probs))
         emotion_label = self.emotions[emotion_index]
         confidence = float(probs[emotion_index])
-        
-        if self.debug or debug_viz:
-            print(f"\n✅ Result: {emotion_label} ({confidence:.1%})")
-            print("="*60 + "\n")
-        
+
+        if trace:
+            log_event(
+                _log,
+                logging.DEBUG,
+                "emotion model output",
+                logits_min=round(float(logits.min()), 4),
+                logits_max=round(float(logits.max()), 4),
+                logits_std=round(float(np.std(logits)), 4),
+                probs={e: round(float(p), 4) for e, p in zip(self.emotions, probs)},
+                emotion=emotion_label,
+                confidence=round(confidence, 3),
+            )
+
         return emotion_label, confidence
 
     def _due(self, session_key: str, now: float) -> bool:
@@ -218,7 +204,7 @@ class EmotionEngine:
     def _run_inference(
         self,
         *,
-        image_bgr: np.ndarray,
+        image_bgr: np.ndarray | FrameContext,
         driver_bbox: Optional[Dict[str, Any]],
         timestamp: float,
     ) -> Dict[str, Any]:
@@ -259,8 +245,7 @@ class EmotionEngine:
                 "timestamp": timestamp,
             }
         except Exception as e:
-            if self.debug:
-                print(f"Error in emotion inference: {e}")
+            _log.debug("Error in emotion inference: %s", e)
             return {
                 "emotion": "unknown",
                 "confidence": 0.0,
@@ -271,10 +256,14 @@ class EmotionEngine:
     def _crop_driver_face(
         self,
         *,
-        image_bgr: np.ndarray,
+        image_bgr: np.ndarray | FrameContext,
         driver_bbox: Dict[str, Any],
     ) -> np.ndarray:
         """Crop driver face into a square centered on bounding box with boundary clamping."""
+        if isinstance(image_bgr, FrameContext):
+            # Memoized grayscale square crop shared with any other consumer of the frame.
+            return image_bgr.face_crop(driver_bbox, square=True, gray=True)
+
         x = int(driver_bbox.get("x", 0))
         y = int(driver_bbox.get("y", 0))
         w = int(driver_bbox.get("w", 0))
@@ -452,9 +441,8 @@ class EmotionEngine:
         # 1. Trip is active
         # 2. Emotion changed from last stored value
         # Actual DB insertion logic would be implemented by the app layer.
-        # For now, log the intent if in debug mode.
-        if self.debug:
-            print(f"[{session_key}] DB STORE: emotion={emotion}, conf={confidence:.2f}, ts={timestamp}")
+        # For now, log the intent at debug level.
+        log_event(_log, logging.DEBUG, "emotion store", session_key=session_key, emotion=emotion, confidence=round(confidence, 2), ts=timestamp)
 
     def _output_stress_alert(
         self,
@@ -475,8 +463,7 @@ class EmotionEngine:
             )
         else:
             # Default: log the alert
-            if self.debug:
-                print(f"[{session_key}] STRESS ALERT: {emotion} (conf={confidence:.2f})")
+            log_event(_log, logging.INFO, "stress alert", session_key=session_key, emotion=emotion, confidence=round(confidence, 2))
 
     def get_current_emotion_state(
         self,
@@ -493,21 +480,29 @@ class EmotionEngine:
             },
         )
 
+    def _session_dicts(self) -> tuple:
+        return (
+            self._cache_by_session,
+            self._last_by_session,
+            self._emotion_timeline_by_session,
+            self._current_emotion_state_by_session,
+            self._last_db_emotion_by_session,
+            self._last_stress_emotion_by_session,
+            self._last_stress_alert_ts_by_session,
+            self._emotion_buffer_by_session,
+        )
+
+    def session_state(self, session_key: str) -> List[Any]:
+        """Everything held for one session (used for memory accounting)."""
+        return [d.get(session_key) for d in self._session_dicts()]
+
     def clear_session(self, session_key: str) -> None:
         """Clear all session state when trip ends or driver session ends.
         Prevents unbounded memory growth from session-keyed dictionaries.
         """
-        self._cache_by_session.pop(session_key, None)
-        self._last_by_session.pop(session_key, None)
-        self._emotion_timeline_by_session.pop(session_key, None)
-        self._current_emotion_state_by_session.pop(session_key, None)
-        self._last_db_emotion_by_session.pop(session_key, None)
-        self._last_stress_emotion_by_session.pop(session_key, None)
-        self._last_stress_alert_ts_by_session.pop(session_key, None)
-        self._emotion_buffer_by_session.pop(session_key, None)
-        
-        if self.debug:
-            print(f"[{session_key}] Emotion state cleared (session/trip ended)")
+        for d in self._session_dicts():
+            d.pop(session_key, None)
+        _log.debug("Emotion state cleared for %s (session/trip ended)", session_key)
 
     def _analyze_driver_placeholder(
         self,
@@ -542,7 +537,7 @@ class EmotionEngine:
         self,
         *,
         session_key: str,
-        image_bgr: np.ndarray,
+        image_bgr: np.ndarray | FrameContext,
         driver_bbox: Optional[Dict[str, Any]],
         passenger_bboxes: Optional[List[Dict[str, Any]]] = None,
         force: bool = False,
@@ -603,5 +598,11 @@ _emotion_engine_singleton: Optional[EmotionEngine] = None
 def get_emotion_engine() -> EmotionEngine:
     global _emotion_engine_singleton
     if _emotion_engine_singleton is None:
-        _emotion_engine_singleton = EmotionEngine(interval_s=5.0, debug=False)
+        engine = EmotionEngine(interval_s=5.0, debug=False)
+        get_session_registry().register_owner(
+            "emotion",
+            release=engine.clear_session,
+            lookup=engine.session_state,
+        )
+        _emotion_engine_singleton = engine
     return _emotion_engine_singleton
\ No newline at end of file
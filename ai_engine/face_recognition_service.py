@@ -24,6 +24,11 @@ from typing import Any, Dict, List, Optional, Tuple
 import cv2
 import numpy as np
 
+from frame_context import FrameContext
+from structured_log import get_logger
+
+_log = get_logger("identity")
+
 try:
     from pymongo import MongoClient
 except Exception:  # pragma: no cover
@@ -172,7 +177,7 @@ class FaceRecognitionService:
 
             return True
         except Exception as e:
-            print(f"⚠ FaceRecognitionService init failed: {e}")
+            _log.warning("FaceRecognitionService init failed: %s", e)
             self._detector = None
             self._recognizer = None
             return False
@@ -258,8 +263,11 @@ class FaceRecognitionService:
 
         return embeddings
 
-    def extract_face_embeddings(self, image_bgr: np.ndarray) -> List[Tuple[Dict[str, int], np.ndarray]]:
+    def extract_face_embeddings(self, image_bgr: np.ndarray | FrameContext) -> List[Tuple[Dict[str, int], np.ndarray]]:
         """Detect faces and return [(bbox_xywh, embedding), ...]."""
+        if isinstance(image_bgr, FrameContext):
+            # YuNet/SFace consume BGR directly: use the context's frame, no conversion.
+            image_bgr = image_bgr.bgr
         if image_bgr is None or getattr(image_bgr, "size", 0) == 0:
             return []
 
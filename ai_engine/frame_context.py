@@ -0,0 +1,186 @@
+"""ai_engine.frame_context
+
+Per-frame derived views shared by all engines.
+
+A `FrameContext` wraps one decoded BGR frame and lazily computes (then
+memoizes) the representations individual engines need:
+
+- RGB and grayscale conversions
+- `mediapipe.Image` wrappers (full frame, ROI crops, downscaled levels)
+- downscaled pyramid levels (`cv2.pyrDown`, each level half the previous)
+- face crops (BGR or gray, optionally squared around the box)
+
+Each representation is produced at most once per frame, no matter how many
+engines (landmarks, pose, identity, emotion) ask for it. The context exposes
+the source frame and every derived array through read-only views (the
+caller's own array stays writable), so a context can be handed to the
+slow-analytics worker without copying the frame.
+
+Engines accept either a plain ndarray or a `FrameContext`; use
+`FrameContext.of(image)` to normalize.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    import mediapipe as mp
+
+    MEDIAPIPE_AVAILABLE = True
+except ImportError:
+    MEDIAPIPE_AVAILABLE = False
+    mp = None  # type: ignore[assignment]
+
+
+Box = Tuple[int, int, int, int]  # (x0, y0, x1, y1), frame pixel coordinates
+
+
+def _readonly(arr: np.ndarray) -> np.ndarray:
+    """Read-only view of `arr`; the caller's own array stays writable."""
+    view = arr.view()
+    view.setflags(write=False)
+    return view
+
+
+class FrameContext:
+    """Lazily memoized views of a single BGR frame."""
+
+    def __init__(self, bgr: np.ndarray, *, frame_ts: Optional[float] = None) -> None:
+        if bgr is None or getattr(bgr, "size", 0) == 0:
+            raise ValueError("empty frame")
+        self.bgr: np.ndarray = _readonly(bgr)
+        self.frame_ts = frame_ts
+        self._views: Dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def of(cls, image: "np.ndarray | FrameContext") -> "FrameContext":
+        """Return `image` if it already is a context, else wrap it."""
+        if isinstance(image, FrameContext):
+            return image
+        return cls(image)
+
+    @property
+    def height(self) -> int:
+        return int(self.bgr.shape[0])
+
+    @property
+    def width(self) -> int:
+        return int(self.bgr.shape[1])
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return tuple(self.bgr.shape)
+
+    @property
+    def size(self) -> int:
+        return int(self.bgr.size)
+
+    def _memo(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        # The fast loop and the slow-analytics worker may share a context.
+        with self._lock:
+            if key in self._views:
+                return self._views[key]
+        value = build()
+        if isinstance(value, np.ndarray):
+            value = _readonly(value)
+        with self._lock:
+            return self._views.setdefault(key, value)
+
+    # -- pyramid ---------------------------------------------------------
+
+    def level(self, n: int = 0) -> np.ndarray:
+        """BGR pyramid level `n` (level 0 is the frame, each level halves it)."""
+        n = max(0, int(n))
+        if n == 0:
+            return self.bgr
+        return self._memo(("bgr", n), lambda: cv2.pyrDown(self.level(n - 1)))
+
+    def level_for_max_side(self, max_side: int) -> int:
+        """Smallest pyramid level whose longer side is <= `max_side`."""
+        n = 0
+        side = max(self.width, self.height)
+        while side > int(max_side) and side >= 64:
+            side = (side + 1) // 2
+            n += 1
+        return n
+
+    # -- color conversions -----------------------------------------------
+
+    def rgb(self, level: int = 0) -> np.ndarray:
+        return self._memo(("rgb", int(level)), lambda: cv2.cvtColor(self.level(level), cv2.COLOR_BGR2RGB))
+
+    def gray(self, level: int = 0) -> np.ndarray:
+        return self._memo(("gray", int(level)), lambda: cv2.cvtColor(self.level(level), cv2.COLOR_BGR2GRAY))
+
+    # -- mediapipe wrappers ----------------------------------------------
+
+    def mp_image(self, level: int = 0) -> Any:
+        """SRGB `mediapipe.Image` of the (optionally downscaled) frame."""
+        if not MEDIAPIPE_AVAILABLE:
+            raise RuntimeError("mediapipe Image not available")
+        return self._memo(
+            ("mp", int(level)),
+            lambda: mp.Image(image_format=mp.ImageFormat.SRGB, data=self.rgb(level)),
+        )
+
+    def mp_image_crop(self, box: Box) -> Any:
+        """SRGB `mediapipe.Image` of an ROI crop (pixels are copied once, contiguous)."""
+        if not MEDIAPIPE_AVAILABLE:
+            raise RuntimeError("mediapipe Image not available")
+        x0, y0, x1, y1 = (int(v) for v in box)
+        return self._memo(
+            ("mp_crop", x0, y0, x1, y1),
+            lambda: mp.Image(image_format=mp.ImageFormat.SRGB, data=self.rgb_crop((x0, y0, x1, y1))),
+        )
+
+    # -- crops -----------------------------------------------------------
+
+    def rgb_crop(self, box: Box) -> np.ndarray:
+        x0, y0, x1, y1 = (int(v) for v in box)
+        if ("rgb", 0) in self._views:
+            # Full-frame RGB already exists: slice it instead of converting again.
+            return self._memo(
+                ("rgb_crop", x0, y0, x1, y1),
+                lambda: np.ascontiguousarray(self.rgb()[y0:y1, x0:x1]),
+            )
+        return self._memo(
+            ("rgb_crop", x0, y0, x1, y1),
+            lambda: cv2.cvtColor(self.bgr[y0:y1, x0:x1], cv2.COLOR_BGR2RGB),
+        )
+
+    def face_crop(self, bbox: Dict[str, Any], *, square: bool = False, gray: bool = False) -> np.ndarray:
+        """Crop of an {x, y, w, h} face box, clamped to the frame.
+
+        `square=True` crops a square centered on the box (emotion model input).
+        Returned arrays are views/memoized results; do not modify them.
+        """
+        x = int(bbox.get("x", 0))
+        y = int(bbox.get("y", 0))
+        w = int(bbox.get("w", 0))
+        h = int(bbox.get("h", 0))
+        if square:
+            size = max(w, h)
+            x = int((x + w // 2) - size // 2)
+            y = int((y + h // 2) - size // 2)
+            w = h = size
+
+        x0 = max(0, min(x, self.width - 1))
+        y0 = max(0, min(y, self.height - 1))
+        x1 = min(x0 + max(0, w), self.width)
+        y1 = min(y0 + max(0, h), self.height)
+
+        if not gray:
+            return self._memo(("face", x0, y0, x1, y1), lambda: self.bgr[y0:y1, x0:x1])
+
+        def _build_gray() -> np.ndarray:
+            if ("gray", 0) in self._views:
+                return self.gray()[y0:y1, x0:x1]
+            return cv2.cvtColor(self.bgr[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+
+        return self._memo(("face_gray", x0, y0, x1, y1), _build_gray)
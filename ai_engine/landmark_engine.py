@@ -4,6 +4,11 @@ Vision-only face landmark extraction.
 
 - Uses MediaPipe FaceLandmarker (FaceMesh-style 468 landmarks)
 - Computes EAR (eye aspect ratio), MAR (mouth aspect ratio), and head pose (yaw/pitch/roll)
+- Continuous streams can use a per-session VIDEO-mode landmarker (tracking between
+  frames); one-off frames, and streams beyond `LANDMARK_MAX_SESSIONS`, use the shared
+  IMAGE-mode landmarker
+- Continuous streams can landmark only a crop around the last driver face (ROI mode),
+  with periodic full-frame passes to re-discover the driver and passengers
 - Exposes a small API for callers to get clean frame-level metrics
 
 This module intentionally contains *only* vision processing. Risk scoring, SOS logic,
@@ -14,12 +19,22 @@ from __future__ import annotations
 
 import os
 import tempfile
+import threading
+import time
 from dataclasses import dataclass
+from itertools import chain
+from operator import attrgetter
 from typing import Any, Dict, List, Optional, Tuple
 
 import cv2
 import numpy as np
 
+from frame_context import FrameContext
+from session_registry import ExpiryHeap, get_session_registry
+from structured_log import get_logger
+
+_log = get_logger("landmark")
+
 try:
     import mediapipe as mp
     from mediapipe.tasks import python
@@ -31,7 +46,76 @@ except ImportError:
     mp = None  # type: ignore[assignment]
     python = None  # type: ignore[assignment]
     vision = None  # type: ignore[assignment]
-    print("⚠ MediaPipe not installed. Install with: pip install mediapipe")
+    _log.warning("MediaPipe not installed. Install with: pip install mediapipe")
+
+
+# FaceMesh landmark indices used by the per-face metrics.
+_EYE_IDX = np.array(
+    [
+        [33, 160, 158, 133, 153, 144],  # left eye: p1..p6
+        [362, 385, 387, 263, 373, 380],  # right eye: p1..p6
+    ],
+    dtype=np.intp,
+)
+_MAR_IDX = np.array([13, 14, 61, 291], dtype=np.intp)  # inner upper/lower lip, mouth corners
+_MOUTH_IDX = np.array([61, 291, 78, 308, 13, 14, 0, 17, 82, 312, 87, 317, 95, 324, 88, 318], dtype=np.intp)
+_EYE_CORNER_IDX = np.array([33, 263], dtype=np.intp)
+# nose tip, chin, left eye outer, right eye outer, mouth corners (matches the PnP model points)
+_POSE_IDX = np.array([1, 152, 33, 263, 61, 291], dtype=np.intp)
+
+_HEAD_POSE_MODEL_POINTS = np.array(
+    [
+        (0.0, 0.0, 0.0),  # Nose tip
+        (0.0, -330.0, -65.0),  # Chin
+        (-225.0, 170.0, -135.0),  # Left eye outer corner
+        (225.0, 170.0, -135.0),  # Right eye outer corner
+        (-150.0, -150.0, -125.0),  # Left mouth corner
+        (150.0, -150.0, -125.0),  # Right mouth corner
+    ],
+    dtype=np.float64,
+)
+
+_landmark_xyz = attrgetter("x", "y", "z")
+
+
+def _landmarks_to_array(
+    face_landmarks: Any,
+    img_w: int,
+    img_h: int,
+    offset_x: float = 0.0,
+    offset_y: float = 0.0,
+) -> np.ndarray:
+    """NormalizedLandmark list -> contiguous (N, 3) float32 array.
+
+    x/y are scaled to pixels in place (plus the crop offset when landmarks were
+    produced on an ROI crop); z is kept as reported by MediaPipe.
+    Attribute reads and the fill happen in C (attrgetter + fromiter), so there is
+    no per-landmark Python loop and no intermediate lists.
+    """
+    n = len(face_landmarks)
+    flat = np.fromiter(
+        chain.from_iterable(map(_landmark_xyz, face_landmarks)),
+        dtype=np.float32,
+        count=n * 3,
+    )
+    pts = flat.reshape(n, 3)
+    pts[:, 0] *= float(img_w)
+    pts[:, 1] *= float(img_h)
+    if offset_x or offset_y:
+        pts[:, 0] += float(offset_x)
+        pts[:, 1] += float(offset_y)
+    return pts
+
+
+def _bbox_iou(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    """IoU of two {x, y, w, h} boxes."""
+    ax2, ay2 = float(a["x"]) + float(a["w"]), float(a["y"]) + float(a["h"])
+    bx2, by2 = float(b["x"]) + float(b["w"]), float(b["y"]) + float(b["h"])
+    iw = max(0.0, min(ax2, bx2) - max(float(a["x"]), float(b["x"])))
+    ih = max(0.0, min(ay2, by2) - max(float(a["y"]), float(b["y"])))
+    inter = iw * ih
+    union = float(a["w"]) * float(a["h"]) + float(b["w"]) * float(b["h"]) - inter
+    return float(inter / union) if union > 0.0 else 0.0
 
 
 @dataclass
@@ -39,8 +123,8 @@ class FaceMetrics:
     """Container for extracted face metrics."""
     face_id: int
     face_bbox: Dict[str, float]  # {x, y, w, h, confidence}
-    landmarks_3d: List[List[float]]  # 468 landmarks in 3D (x, y, z)
-    landmarks_2d: List[List[float]]  # 468 landmarks in 2D (x, y)
+    landmarks_3d: np.ndarray  # (N, 3) float32: normalized MediaPipe x, y (of the full frame), z
+    landmarks_2d: np.ndarray  # (N, 2) float32: x, y in pixels (what the metrics use)
     ear_left: float  # Eye Aspect Ratio (left eye)
     ear_right: float  # Eye Aspect Ratio (right eye)
     ear_avg: float  # Average EAR
@@ -68,31 +152,191 @@ class LandmarkEngine:
         """Initialize MediaPipe FaceLandmarker."""
         self.facemesh = None
         self.initialized = False
+        self._model_path: Optional[str] = None
+
+        # Per-session VIDEO-mode landmarkers: session_key -> {landmarker, lock, last_ts_ms, last_used}
+        self._video_sessions: Dict[str, Dict[str, Any]] = {}
+        self._video_lock = threading.Lock()
+        self._video_mode_enabled = str(os.getenv("LANDMARK_VIDEO_MODE", "1")).lower() in {"1", "true", "yes"}
+        self._video_idle_s = float(os.getenv("LANDMARK_SESSION_IDLE_S", "60"))
+        self._video_max_sessions = max(1, int(os.getenv("LANDMARK_MAX_SESSIONS", "16")))
+        self._video_expiry = ExpiryHeap(self._video_idle_s, self._video_last_seen)
+
+        # ROI mode: per-session crop around the last driver face (see `_roi_box_for_frame`).
+        self._roi_sessions: Dict[str, Dict[str, Any]] = {}
+        self._roi_enabled = str(os.getenv("LANDMARK_ROI_MODE", "1")).lower() in {"1", "true", "yes"}
+        self._roi_expand = max(1.2, float(os.getenv("LANDMARK_ROI_EXPAND", "2.2")))
+        self._roi_full_every_n = max(1, int(os.getenv("LANDMARK_ROI_FULL_EVERY_N", "15")))
+        self._roi_min_px = int(os.getenv("LANDMARK_ROI_MIN_PX", "160"))
+        self._roi_max_area_ratio = float(os.getenv("LANDMARK_ROI_MAX_AREA_RATIO", "0.6"))
 
         if not MEDIAPIPE_AVAILABLE:
-            print("⚠ MediaPipe not available")
+            _log.warning("MediaPipe not available")
             return
 
         try:
-            model_path = self._ensure_model_file()
-
-            base_options = python.BaseOptions(model_asset_path=model_path)
-            options = vision.FaceLandmarkerOptions(
-                base_options=base_options,
-                running_mode=vision.RunningMode.IMAGE,
-                num_faces=6,
-                min_face_detection_confidence=0.45,
-                min_face_presence_confidence=0.45,
-                min_tracking_confidence=0.45,
-            )
-            self.facemesh = vision.FaceLandmarker.create_from_options(options)
+            self._model_path = self._ensure_model_file()
+            self.facemesh = self._create_landmarker(vision.RunningMode.IMAGE)
             self.initialized = True
             self._expected_landmarks = int(os.getenv("FACE_LANDMARK_EXPECTED", "468"))
             self._min_landmark_ratio = float(os.getenv("FACE_LANDMARK_MIN_RATIO", "0.45"))
-            print("✓ MediaPipe FaceLandmarker initialized")
+            _log.info("MediaPipe FaceLandmarker initialized")
         except Exception as e:
-            print(f"⚠ Failed to initialize FaceLandmarker: {e}")
+            _log.warning("Failed to initialize FaceLandmarker: %s", e)
     
+    def _create_landmarker(self, running_mode: Any) -> Any:
+        base_options = python.BaseOptions(model_asset_path=self._model_path)
+        options = vision.FaceLandmarkerOptions(
+            base_options=base_options,
+            running_mode=running_mode,
+            num_faces=6,
+            min_face_detection_confidence=0.45,
+            min_face_presence_confidence=0.45,
+            min_tracking_confidence=0.45,
+        )
+        return vision.FaceLandmarker.create_from_options(options)
+
+    def _video_last_seen(self, session_key: str) -> Optional[float]:
+        entry = self._video_sessions.get(session_key)
+        return float(entry["last_used"]) if entry is not None else None
+
+    def _video_session(self, session_key: str, now: float) -> Optional[Dict[str, Any]]:
+        """Get/create the VIDEO-mode landmarker for a session, closing idle ones.
+
+        Returns None once `LANDMARK_MAX_SESSIONS` landmarkers are live: the
+        session is then served by the shared IMAGE-mode landmarker until a
+        slot frees up, instead of evicting another stream's landmarker (which
+        would reload the model on every frame under round-robin load).
+        """
+        with self._video_lock:
+            entry = self._video_sessions.get(session_key)
+            if entry is not None:
+                entry["last_used"] = now
+        self._close_idle_video_sessions(now)
+        if entry is not None:
+            return entry
+        if len(self._video_sessions) >= self._video_max_sessions:
+            return None
+
+        try:
+            landmarker = self._create_landmarker(vision.RunningMode.VIDEO)
+        except Exception as e:
+            _log.warning("Failed to create tracking FaceLandmarker for %s: %s", session_key, e)
+            return None
+
+        created = {"landmarker": landmarker, "lock": threading.Lock(), "last_ts_ms": -1, "last_used": now}
+        with self._video_lock:
+            entry = self._video_sessions.get(session_key)
+            if entry is None and len(self._video_sessions) < self._video_max_sessions:
+                entry = self._video_sessions[session_key] = created
+                created = None
+            if entry is not None:
+                entry["last_used"] = now
+        if created is not None:
+            # Lost a creation race (or the last slot) to another thread.
+            self._close_video_entries([created])
+        if entry is not None:
+            self._video_expiry.schedule(session_key, now)
+        return entry
+
+    def _close_idle_video_sessions(self, now: float) -> None:
+        expired = self._video_expiry.pop_expired(now)
+        if not expired:
+            return
+        with self._video_lock:
+            evicted = [self._video_sessions.pop(key) for key in expired if key in self._video_sessions]
+        self._close_video_entries(evicted)
+
+    @staticmethod
+    def _close_video_entries(entries: List[Dict[str, Any]]) -> None:
+        for entry in entries:
+            # Wait for an in-flight detect on this landmarker before closing it.
+            with entry["lock"]:
+                try:
+                    entry["landmarker"].close()
+                except Exception:
+                    pass
+
+    def release_session(self, session_key: str) -> None:
+        """Drop the tracking landmarker and ROI state of a session (trip complete / reset)."""
+        with self._video_lock:
+            entry = self._video_sessions.pop(str(session_key), None)
+            self._roi_sessions.pop(str(session_key), None)
+        if entry is not None:
+            self._close_video_entries([entry])
+
+    def session_state(self, session_key: str) -> Dict[str, Any]:
+        """ROI state of a session (used for memory accounting; landmarkers are native)."""
+        return {"roi": self._roi_sessions.get(str(session_key))}
+
+    def _roi_session(self, session_key: str) -> Dict[str, Any]:
+        # ROI state is released with the session (`release_session`, via the session registry).
+        now = time.time()
+        with self._video_lock:
+            state = self._roi_sessions.get(session_key)
+            if state is None:
+                state = {
+                    "driver_bbox": None,
+                    "crop": None,
+                    "frames_since_full": 0,
+                    "passenger_boxes": [],
+                    "last_used": now,
+                }
+                self._roi_sessions[session_key] = state
+            state["last_used"] = now
+            return state
+
+    def _roi_box_for_frame(self, state: Dict[str, Any], img_w: int, img_h: int) -> Optional[Tuple[int, int, int, int]]:
+        """Crop (x0, y0, x1, y1) for an ROI pass, or None when a full-frame pass is due.
+
+        The crop is kept fixed while the driver face stays in its central half so
+        the tracking landmarker sees a stable view; it is re-centered otherwise.
+        """
+        bbox = state.get("driver_bbox")
+        if not bbox or int(state.get("frames_since_full", 0)) >= self._roi_full_every_n:
+            return None
+        bw, bh = float(bbox["w"]), float(bbox["h"])
+        if bw <= 0.0 or bh <= 0.0:
+            return None
+        cx, cy = float(bbox["x"]) + bw / 2.0, float(bbox["y"]) + bh / 2.0
+        want_w = max(float(self._roi_min_px), bw * self._roi_expand)
+        want_h = max(float(self._roi_min_px), bh * self._roi_expand)
+
+        crop = state.get("crop")
+        if crop is not None:
+            x0, y0, x1, y1 = crop
+            cw, ch = float(x1 - x0), float(y1 - y0)
+            centered = (x0 + cw / 4.0) <= cx <= (x1 - cw / 4.0) and (y0 + ch / 4.0) <= cy <= (y1 - ch / 4.0)
+            sized = 0.75 <= (want_w / max(cw, 1.0)) <= 1.33
+            if centered and sized:
+                return crop
+
+        x0 = int(max(0.0, cx - want_w / 2.0))
+        y0 = int(max(0.0, cy - want_h / 2.0))
+        x1 = int(min(float(img_w), cx + want_w / 2.0))
+        y1 = int(min(float(img_h), cy + want_h / 2.0))
+        if x1 - x0 < 32 or y1 - y0 < 32:
+            return None
+        if (x1 - x0) * (y1 - y0) > self._roi_max_area_ratio * float(img_w * img_h):
+            # Crop would not be meaningfully smaller than the frame.
+            return None
+        state["crop"] = (x0, y0, x1, y1)
+        return state["crop"]
+
+    def _detect(self, mp_image: Any, session_key: Optional[str], timestamp_ms: Optional[int]) -> Any:
+        """Run detection in tracking mode for a session, else in IMAGE mode."""
+        if session_key and self._video_mode_enabled:
+            now = time.time()
+            entry = self._video_session(str(session_key), now)
+            if entry is not None:
+                with entry["lock"]:
+                    # VIDEO mode requires strictly increasing timestamps per landmarker.
+                    ts_ms = int(timestamp_ms if timestamp_ms is not None else now * 1000.0)
+                    ts_ms = max(ts_ms, int(entry["last_ts_ms"]) + 1)
+                    entry["last_ts_ms"] = ts_ms
+                    return entry["landmarker"].detect_for_video(mp_image, ts_ms)
+        return self.facemesh.detect(mp_image)
+
     def _ensure_model_file(self) -> str:
         """Return a usable `face_landmarker.task` path.
 
@@ -118,14 +362,27 @@ class LandmarkEngine:
             "https://storage.googleapis.com/mediapipe-models/face_landmarker/"
             "face_landmarker/float16/1/face_landmarker.task"
         )
-        print(f"Downloading face landmarker model to {model_path}...")
+        _log.info("Downloading face landmarker model to %s...", model_path)
         urllib.request.urlretrieve(model_url, model_path)
-        print("✓ Model downloaded")
+        _log.info("Model downloaded")
         return model_path
 
-    def process_frame(self, image: np.ndarray) -> Dict[str, Any]:
+    def process_frame(
+        self,
+        image: np.ndarray | FrameContext,
+        *,
+        session_key: Optional[str] = None,
+        timestamp_ms: Optional[int] = None,
+    ) -> Dict[str, Any]:
         """Return the primary-driver face metrics for a single frame.
 
+        Passing `session_key` (continuous stream) uses that session's tracking
+        landmarker; `timestamp_ms` is the frame capture time (defaults to now).
+        With ROI mode enabled, stream frames are landmarked on a crop around the
+        last driver face and a full-frame pass runs every
+        `LANDMARK_ROI_FULL_EVERY_N` frames or when the driver is lost.
+        `landmark_pass` in the output is "roi" or "full".
+
         Output shape is intentionally stable for callers (API + frontend overlays):
         {
           face_detected: bool,
@@ -169,7 +426,33 @@ class LandmarkEngine:
             }
 
         image_height, image_width = image.shape[:2]
-        face_metrics_list = self.extract_landmarks(image)
+
+        roi_state = self._roi_session(str(session_key)) if (session_key and self._roi_enabled) else None
+        roi_box = self._roi_box_for_frame(roi_state, image_width, image_height) if roi_state is not None else None
+        face_metrics_list: List[FaceMetrics] = []
+        if roi_box is not None:
+            face_metrics_list = self.extract_landmarks(
+                image,
+                session_key=session_key,
+                timestamp_ms=timestamp_ms,
+                roi=roi_box,
+            )
+            if not face_metrics_list:
+                roi_box = None  # driver lost in the crop: re-discover on the full frame
+        if roi_box is None:
+            # In ROI mode full-frame passes are one-off IMAGE-mode detections; the
+            # session's tracking landmarker only ever sees the crop stream.
+            face_metrics_list = self.extract_landmarks(
+                image,
+                session_key=None if roi_state is not None else session_key,
+                timestamp_ms=timestamp_ms,
+            )
+            if roi_state is not None:
+                roi_state["frames_since_full"] = 0
+                roi_state["crop"] = None
+                roi_state["driver_bbox"] = None
+                roi_state["passenger_boxes"] = []
+
         if not face_metrics_list:
             return {
                 "face_detected": False,
@@ -262,28 +545,35 @@ class LandmarkEngine:
                 "image_height": int(image_height),
             }
 
-        # Driver selection: prefer faces near horizontal center; among those, prefer largest box.
-        # If none are central enough, fall back to closest-to-center then largest (tie-break).
-        half_w = max(float(image_width) / 2.0, 1.0)
-        center_band_px = 0.22 * half_w  # ~central 44% of frame width
-        in_center_band = [
-            c
-            for c in candidates
-            if abs((c["face_bbox"]["x"] + c["face_bbox"]["w"] / 2.0) - image_center_x)
-            <= center_band_px
-        ]
-        if in_center_band:
-            driver = max(in_center_band, key=lambda c: c["area"])
+        if roi_box is not None and roi_state is not None:
+            # ROI pass: the driver is the face that best overlaps the last driver box;
+            # passengers are carried over from the last full-frame pass.
+            last_bbox = roi_state["driver_bbox"]
+            driver = max(candidates, key=lambda c: (_bbox_iou(c["face_bbox"], last_bbox), c["area"]))
+            kept = [driver]
         else:
-            driver = sorted(
-                candidates,
-                key=lambda c: (c["center_distance_norm"], -c["area"]),
-            )[0]
-
-        # Keep up to MAX_FACES total. Passengers are largest remaining boxes.
-        remaining = [c for c in candidates if c is not driver]
-        remaining_sorted = sorted(remaining, key=lambda c: c["area"], reverse=True)
-        kept = [driver] + remaining_sorted[: max(0, MAX_FACES - 1)]
+            # Driver selection: prefer faces near horizontal center; among those, prefer largest box.
+            # If none are central enough, fall back to closest-to-center then largest (tie-break).
+            half_w = max(float(image_width) / 2.0, 1.0)
+            center_band_px = 0.22 * half_w  # ~central 44% of frame width
+            in_center_band = [
+                c
+                for c in candidates
+                if abs((c["face_bbox"]["x"] + c["face_bbox"]["w"] / 2.0) - image_center_x)
+                <= center_band_px
+            ]
+            if in_center_band:
+                driver = max(in_center_band, key=lambda c: c["area"])
+            else:
+                driver = sorted(
+                    candidates,
+                    key=lambda c: (c["center_distance_norm"], -c["area"]),
+                )[0]
+
+            # Keep up to MAX_FACES total. Passengers are largest remaining boxes.
+            remaining = [c for c in candidates if c is not driver]
+            remaining_sorted = sorted(remaining, key=lambda c: c["area"], reverse=True)
+            kept = [driver] + remaining_sorted[: max(0, MAX_FACES - 1)]
 
         faces_meta: List[Dict[str, Any]] = []
         all_face_boxes: List[Dict[str, int]] = []
@@ -308,6 +598,22 @@ class LandmarkEngine:
                 }
             )
 
+        if roi_state is not None:
+            if roi_box is not None:
+                for pb in roi_state["passenger_boxes"]:
+                    faces_meta.append(
+                        {
+                            "bbox": [pb["x"], pb["y"], pb["w"], pb["h"]],
+                            "role": "passenger",
+                            "box_color": "white",
+                        }
+                    )
+                    all_face_boxes.append(dict(pb))
+                roi_state["frames_since_full"] = int(roi_state["frames_since_full"]) + 1
+            else:
+                roi_state["passenger_boxes"] = [dict(b) for b in all_face_boxes[1:]]
+            roi_state["driver_bbox"] = dict(driver["face_bbox"])
+
         face_area_ratio = float(driver["face_bbox"]["w"] * driver["face_bbox"]["h"]) / max(1.0, float(image_width * image_height))
         eye_distance_norm = float(driver.get("eye_distance_px", 0.0)) / max(1.0, float(image_width))
         face_presence_conf = min(
@@ -347,16 +653,29 @@ class LandmarkEngine:
             "eye_distance_norm": round(float(eye_distance_norm), 4),
             # Per-face metadata for UI overlays and passenger logic.
             "faces_meta": faces_meta,
+            "landmark_pass": "roi" if roi_box is not None else "full",
             "image_width": int(image_width),
             "image_height": int(image_height),
         }
 
-    def extract_landmarks(self, image: np.ndarray) -> List[FaceMetrics]:
+    def extract_landmarks(
+        self,
+        image: np.ndarray | FrameContext,
+        *,
+        session_key: Optional[str] = None,
+        timestamp_ms: Optional[int] = None,
+        roi: Optional[Tuple[int, int, int, int]] = None,
+    ) -> List[FaceMetrics]:
         """
         Extract landmarks from image.
 
         Args:
-            image: BGR image from OpenCV
+            image: BGR image from OpenCV, or the frame's shared `FrameContext`
+            session_key: stream session to track across frames (VIDEO mode);
+                None runs a one-off IMAGE-mode detection
+            timestamp_ms: frame capture time for VIDEO mode (defaults to now)
+            roi: optional (x0, y0, x1, y1) crop to run detection on; landmarks and
+                metrics are still reported in full-frame coordinates
 
         Returns:
             List of FaceMetrics for each detected face
@@ -368,42 +687,45 @@ class LandmarkEngine:
             return []
 
         try:
-            # Convert BGR to RGB for MediaPipe
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            h, w = rgb_image.shape[:2]
-
-            # Convert numpy array to MediaPipe Image
-            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_image)
+            # RGB conversion + mediapipe.Image come from the shared frame context
+            # (only the crop is converted in ROI mode).
+            frame = FrameContext.of(image)
+            h, w = frame.height, frame.width
+            offset_x, offset_y = 0, 0
+            if roi is not None:
+                offset_x, offset_y = int(roi[0]), int(roi[1])
+                mp_image = frame.mp_image_crop(roi)
+            else:
+                mp_image = frame.mp_image()
+            src_w, src_h = int(mp_image.width), int(mp_image.height)
 
             # Run face landmark detection
-            results = self.facemesh.detect(mp_image)
+            results = self._detect(mp_image, session_key, timestamp_ms)
 
             if not results.face_landmarks or len(results.face_landmarks) == 0:
                 return []
 
             faces_metrics = []
+            expected = max(1, int(getattr(self, "_expected_landmarks", 468)))
+            min_ratio = float(getattr(self, "_min_landmark_ratio", 0.70))
+            # Pixel -> normalized full-frame coordinates for the public landmarks_3d.
+            to_normalized = np.array([1.0 / max(1, w), 1.0 / max(1, h), 1.0], dtype=np.float32)
             for face_id, face_landmarks in enumerate(results.face_landmarks):
-                # Extract landmarks - face_landmarks is a list of NormalizedLandmark objects
-                landmarks_3d = []
-                landmarks_2d = []
-
-                for landmark in face_landmarks:
-                    landmarks_3d.append([landmark.x, landmark.y, landmark.z])
-                    landmarks_2d.append([landmark.x * w, landmark.y * h])
-
-                landmark_count = int(len(landmarks_2d))
-                expected = max(1, int(getattr(self, "_expected_landmarks", 468)))
+                landmark_count = int(len(face_landmarks))
                 landmark_ratio = float(landmark_count / float(expected))
-                if landmark_ratio < float(getattr(self, "_min_landmark_ratio", 0.70)):
+                if landmark_ratio < min_ratio:
                     # Skip low-integrity landmark sets.
                     continue
 
-                landmarks_3d = np.array(landmarks_3d)
-                landmarks_2d = np.array(landmarks_2d)
+                # One contiguous float32 array per face; 2D metrics use a pixel view of it,
+                # landmarks_3d keeps MediaPipe's normalized x, y (relative to the full
+                # frame, also in ROI mode) and z.
+                landmarks_px = _landmarks_to_array(face_landmarks, src_w, src_h, offset_x, offset_y)
+                landmarks_2d = landmarks_px[:, :2]
+                landmarks_3d = landmarks_px * to_normalized
 
                 # Compute metrics
-                ear_left = self._compute_ear(landmarks_2d, side="left")
-                ear_right = self._compute_ear(landmarks_2d, side="right")
+                ear_left, ear_right = self._compute_ears(landmarks_2d)
                 ear_avg = (ear_left + ear_right) / 2.0
 
                 mar = self._compute_mar(landmarks_2d)
@@ -422,8 +744,8 @@ class LandmarkEngine:
                     "w": int(face_bbox.get("w", 0.0)),
                     "h": int(face_bbox.get("h", 0.0)),
                 }
-                mouth_stats = self._mouth_stats_from_landmarks(landmarks_2d.tolist(), face_box_int)
-                eye_distance_px = self._eye_distance_from_landmarks(landmarks_2d.tolist())
+                mouth_stats = self._mouth_stats_from_landmarks(landmarks_2d, face_box_int)
+                eye_distance_px = self._eye_distance_from_landmarks(landmarks_2d)
 
                 # Determine if frontal
                 is_frontal = abs(head_yaw) < 30 and abs(head_pitch) < 30 and abs(head_roll) < 20
@@ -431,8 +753,8 @@ class LandmarkEngine:
                 metrics = FaceMetrics(
                     face_id=face_id,
                     face_bbox=face_bbox,
-                    landmarks_3d=landmarks_3d.tolist(),
-                    landmarks_2d=landmarks_2d.tolist(),
+                    landmarks_3d=landmarks_3d,
+                    landmarks_2d=landmarks_2d,
                     ear_left=round(ear_left, 3),
                     ear_right=round(ear_right, 3),
                     ear_avg=round(ear_avg, 3),
@@ -458,42 +780,30 @@ class LandmarkEngine:
             return faces_metrics
 
         except Exception as e:
-            print(f"⚠ Error in landmark extraction: {e}")
+            _log.warning("Error in landmark extraction: %s", e)
             return []
 
     @staticmethod
-    def _compute_ear(landmarks: np.ndarray, side: str = "left") -> float:
+    def _compute_ears(landmarks: np.ndarray) -> Tuple[float, float]:
         """
-        Compute Eye Aspect Ratio (EAR).
+        Compute Eye Aspect Ratio (EAR) for both eyes at once.
 
         EAR = (||p2 - p6|| + ||p3 - p5||) / (2 * ||p1 - p4||)
 
         Lower EAR = eyes closing/closed
         Higher EAR = eyes open
-        """
-        if side == "left":
-            # Left eye landmarks: 33, 160, 158, 133, 153, 144
-            eye_indices = [33, 160, 158, 133, 153, 144]
-        else:
-            # Right eye landmarks: 362, 385, 387, 263, 373, 380
-            eye_indices = [362, 385, 387, 263, 373, 380]
 
-        try:
-            points = landmarks[eye_indices]
-
-            # Vertical distances
-            vertical_1 = np.linalg.norm(points[1] - points[5])
-            vertical_2 = np.linalg.norm(points[2] - points[4])
+        Returns (left, right).
+        """
+        if landmarks.shape[0] <= int(_EYE_IDX.max()):
+            return 0.35, 0.35  # Default: eyes open
 
-            # Horizontal distance
-            horizontal = np.linalg.norm(points[0] - points[3])
-
-            # Compute EAR
-            ear = (vertical_1 + vertical_2) / (2.0 * horizontal) if horizontal > 0 else 0.0
-            return float(ear)
-        except Exception as e:
-            print(f"⚠ Error computing EAR ({side}): {e}")
-            return 0.35  # Default: eyes open
+        eyes = landmarks[_EYE_IDX]  # (2, 6, 2)
+        # Vertical distances p2-p6, p3-p5 and horizontal p1-p4, per eye.
+        vertical = np.linalg.norm(eyes[:, [1, 2]] - eyes[:, [5, 4]], axis=2).sum(axis=1)
+        horizontal = np.linalg.norm(eyes[:, 0] - eyes[:, 3], axis=1)
+        ear = np.where(horizontal > 0, vertical / np.maximum(2.0 * horizontal, 1e-12), 0.0)
+        return float(ear[0]), float(ear[1])
 
     @staticmethod
     def _compute_mar(landmarks: np.ndarray) -> float:
@@ -505,24 +815,18 @@ class LandmarkEngine:
         Lower MAR = mouth closed
         Higher MAR = mouth open/yawning
         """
-        try:
-            # Use a stable, scale-invariant ratio:
-            # MAR = lip_opening / mouth_width
-            # lip_opening: inner upper (13) to inner lower (14)
-            # mouth_width: left corner (61) to right corner (291)
-            upper_inner = landmarks[13]
-            lower_inner = landmarks[14]
-            left_corner = landmarks[61]
-            right_corner = landmarks[291]
-
-            lip_opening = np.linalg.norm(upper_inner - lower_inner)
-            mouth_width = np.linalg.norm(left_corner - right_corner)
-            if mouth_width <= 1e-6:
-                return 0.0
-            return float(lip_opening / mouth_width)
-        except Exception as e:
-            print(f"⚠ Error computing MAR: {e}")
+        # Use a stable, scale-invariant ratio:
+        # MAR = lip_opening / mouth_width
+        # lip_opening: inner upper (13) to inner lower (14)
+        # mouth_width: left corner (61) to right corner (291)
+        if landmarks.shape[0] <= int(_MAR_IDX.max()):
+            return 0.0
+        upper_inner, lower_inner, left_corner, right_corner = landmarks[_MAR_IDX]
+        lip_opening = np.linalg.norm(upper_inner - lower_inner)
+        mouth_width = np.linalg.norm(left_corner - right_corner)
+        if mouth_width <= 1e-6:
             return 0.0
+        return float(lip_opening / mouth_width)
 
     @staticmethod
     def _compute_head_pose(
@@ -537,33 +841,10 @@ class LandmarkEngine:
         Returns angles in degrees.
         """
         try:
-            # 3D model points (generic face model, millimeters)
-            # Commonly used in head-pose examples; absolute scale doesn't matter for angles.
-            model_points = np.array(
-                [
-                    (0.0, 0.0, 0.0),  # Nose tip
-                    (0.0, -330.0, -65.0),  # Chin
-                    (-225.0, 170.0, -135.0),  # Left eye outer corner
-                    (225.0, 170.0, -135.0),  # Right eye outer corner
-                    (-150.0, -150.0, -125.0),  # Left mouth corner
-                    (150.0, -150.0, -125.0),  # Right mouth corner
-                ],
-                dtype=np.float64,
-            )
-
+            # 3D model points: `_HEAD_POSE_MODEL_POINTS` (generic face model, millimeters).
             # 2D image points from MediaPipe FaceMesh indices
             # nose: 1, chin: 152, left eye: 33, right eye: 263, mouth corners: 61, 291
-            image_points = np.array(
-                [
-                    landmarks_2d[1],
-                    landmarks_2d[152],
-                    landmarks_2d[33],
-                    landmarks_2d[263],
-                    landmarks_2d[61],
-                    landmarks_2d[291],
-                ],
-                dtype=np.float64,
-            )
+            image_points = landmarks_2d[_POSE_IDX].astype(np.float64)
 
             focal_length = float(img_w)
             center = (float(img_w) / 2.0, float(img_h) / 2.0)
@@ -574,7 +855,7 @@ class LandmarkEngine:
             dist_coeffs = np.zeros((4, 1), dtype=np.float64)
 
             success, rvec, tvec = cv2.solvePnP(
-                model_points,
+                _HEAD_POSE_MODEL_POINTS,
                 image_points,
                 camera_matrix,
                 dist_coeffs,
@@ -588,7 +869,7 @@ class LandmarkEngine:
             return float(yaw), float(pitch), float(roll)
 
         except Exception as e:
-            print(f"⚠ Error computing head pose: {e}")
+            _log.warning("Error computing head pose: %s", e)
             return 0.0, 0.0, 0.0
 
     @staticmethod
@@ -616,73 +897,43 @@ class LandmarkEngine:
         return (np.degrees(yaw), np.degrees(pitch), np.degrees(roll))
 
     @staticmethod
-    def _eye_boxes_from_landmarks(landmarks_2d: List[List[float]] | List[Tuple[float, float]]) -> List[Dict[str, int]]:
-        if not landmarks_2d:
+    def _eye_boxes_from_landmarks(landmarks_2d: np.ndarray) -> List[Dict[str, int]]:
+        if landmarks_2d is None or len(landmarks_2d) == 0:
             return []
 
-        def _bbox_for_indices(indices: List[int]) -> Optional[Dict[str, int]]:
-            pts = [landmarks_2d[i] for i in indices if i < len(landmarks_2d)]
-            if not pts:
-                return None
-            xs = [float(p[0]) for p in pts]
-            ys = [float(p[1]) for p in pts]
-            x_min, y_min = min(xs), min(ys)
-            w, h = (max(xs) - x_min), (max(ys) - y_min)
-            if w <= 0 or h <= 0:
-                return None
-            return {"x": int(x_min), "y": int(y_min), "w": int(w), "h": int(h)}
-
-        left = _bbox_for_indices([33, 160, 158, 133, 153, 144])
-        right = _bbox_for_indices([362, 385, 387, 263, 373, 380])
+        n = landmarks_2d.shape[0]
         boxes: List[Dict[str, int]] = []
-        if left:
-            boxes.append(left)
-        if right:
-            boxes.append(right)
+        for indices in _EYE_IDX:
+            pts = landmarks_2d[indices[indices < n]]
+            if pts.shape[0] == 0:
+                continue
+            x_min, y_min = pts.min(axis=0)
+            x_max, y_max = pts.max(axis=0)
+            w, h = float(x_max - x_min), float(y_max - y_min)
+            if w <= 0 or h <= 0:
+                continue
+            boxes.append({"x": int(x_min), "y": int(y_min), "w": int(w), "h": int(h)})
         return boxes
 
     @staticmethod
-    def _eye_distance_from_landmarks(landmarks_2d: List[List[float]] | List[Tuple[float, float]]) -> float:
-        try:
-            if len(landmarks_2d) <= 263:
-                return 0.0
-            left = landmarks_2d[33]
-            right = landmarks_2d[263]
-            dx = float(left[0]) - float(right[0])
-            dy = float(left[1]) - float(right[1])
-            return float((dx * dx + dy * dy) ** 0.5)
-        except Exception:
+    def _eye_distance_from_landmarks(landmarks_2d: np.ndarray) -> float:
+        if landmarks_2d.shape[0] <= int(_EYE_CORNER_IDX.max()):
             return 0.0
+        left, right = landmarks_2d[_EYE_CORNER_IDX]
+        return float(np.linalg.norm(left - right))
 
     @staticmethod
     def _mouth_stats_from_landmarks(
-        landmarks_2d: List[List[float]] | List[Tuple[float, float]],
+        landmarks_2d: np.ndarray,
         face_bbox: Dict[str, int],
     ) -> Dict[str, Any]:
-        mouth_idx = [61, 291, 78, 308, 13, 14, 0, 17, 82, 312, 87, 317, 95, 324, 88, 318]
-        pts: List[Tuple[float, float]] = []
-        valid = 0
-
-        for idx in mouth_idx:
-            if idx >= len(landmarks_2d):
-                continue
-            p = landmarks_2d[idx]
-            try:
-                x = float(p[0])
-                y = float(p[1])
-            except Exception:
-                continue
-            pts.append((x, y))
-            if np.isfinite(x) and np.isfinite(y):
-                valid += 1
-
-        if not pts:
+        pts = landmarks_2d[_MOUTH_IDX[_MOUTH_IDX < landmarks_2d.shape[0]]]
+        if pts.shape[0] == 0:
             return {"center": [0.0, 0.0], "area_ratio": 0.0, "landmark_ratio": 0.0}
 
-        xs = [p[0] for p in pts]
-        ys = [p[1] for p in pts]
-        x_min, x_max = min(xs), max(xs)
-        y_min, y_max = min(ys), max(ys)
+        valid = int(np.count_nonzero(np.isfinite(pts).all(axis=1)))
+        x_min, y_min = pts.min(axis=0)
+        x_max, y_max = pts.max(axis=0)
 
         width = max(0.0, float(x_max - x_min))
         height = max(0.0, float(y_max - y_min))
@@ -692,7 +943,7 @@ class LandmarkEngine:
         face_w = max(1.0, float(face_bbox.get("w", 1)))
         face_h = max(1.0, float(face_bbox.get("h", 1)))
         area_ratio = float((width * height) / max(1.0, face_w * face_h))
-        landmark_ratio = float(valid / max(1, len(mouth_idx)))
+        landmark_ratio = float(valid / max(1, len(_MOUTH_IDX)))
         return {
             "center": [cx, cy],
             "area_ratio": area_ratio,
@@ -707,13 +958,13 @@ class LandmarkEngine:
         Compute bounding box from landmarks.
         """
         try:
-            x_coords = landmarks_2d[:, 0]
-            y_coords = landmarks_2d[:, 1]
+            lo = landmarks_2d.min(axis=0)
+            hi = landmarks_2d.max(axis=0)
 
-            x_min = float(np.clip(np.min(x_coords), 0, img_w))
-            x_max = float(np.clip(np.max(x_coords), 0, img_w))
-            y_min = float(np.clip(np.min(y_coords), 0, img_h))
-            y_max = float(np.clip(np.max(y_coords), 0, img_h))
+            x_min = float(np.clip(lo[0], 0, img_w))
+            x_max = float(np.clip(hi[0], 0, img_w))
+            y_min = float(np.clip(lo[1], 0, img_h))
+            y_max = float(np.clip(hi[1], 0, img_h))
 
             w = x_max - x_min
             h = y_max - y_min
@@ -726,7 +977,7 @@ class LandmarkEngine:
                 "confidence": 1.0,
             }
         except Exception as e:
-            print(f"⚠ Error computing bounding box: {e}")
+            _log.warning("Error computing bounding box: %s", e)
             return {"x": 0, "y": 0, "w": 0, "h": 0, "confidence": 0.0}
 
 
@@ -738,7 +989,13 @@ def get_landmark_engine() -> LandmarkEngine:
     """Get or create landmark engine singleton."""
     global _landmark_engine
     if _landmark_engine is None:
-        _landmark_engine = LandmarkEngine()
+        engine = LandmarkEngine()
+        get_session_registry().register_owner(
+            "landmarks",
+            release=engine.release_session,
+            lookup=engine.session_state,
+        )
+        _landmark_engine = engine
     return _landmark_engine
 
 
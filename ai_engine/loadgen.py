@@ -0,0 +1,699 @@
+"""ai_engine.loadgen
+
+Fleet load generator: N simulated vehicles streaming frames to one AI engine.
+
+Answers "how many vehicles can one AI engine process serve":
+
+- every vehicle is a thread with its own trip/driver and keep-alive connection,
+  posting frames to `POST /analyze_frame` (raw JPEG or base64 JSON) at a fixed
+  fps from a recorded sequence (`--video` / `--frames`) or synthetic frames
+- frames are paced on a fixed schedule like a camera: when a request is still
+  in flight at a frame's capture time, that frame is dropped (counted), not
+  queued
+- a local stand-in backend answers what the engine calls (`/is-active-trip`,
+  `/active-trips`, `/trips/<id>`, `/drivers/<id>/thresholds`, `/events`, the
+  ai-results/SOS routes and their batch variants) from memory, so the engine is
+  measured without MongoDB; `--backend-latency-ms` simulates a slow backend
+- the engine's CPU and RSS are sampled over time (psutil when installed,
+  otherwise `/proc` on Linux), together with achieved fps and windowed p95
+
+By default the engine is spawned as a subprocess (`python app.py`) wired to the
+stand-in backend. `--target` uses an already running engine instead (start it
+with `BACKEND_BASE_URL` pointing at `--backend-port`; pass `--engine-pid` to
+sample it).
+
+`--vehicles 4,8,16` runs one step per fleet size and reports the largest size
+that met the target fps and `--slo-p95-ms`.
+
+Usage (from the repo root, or `python loadgen.py ...` from `ai_engine/`):
+  python -m ai_engine.loadgen --vehicles 8 --fps 5 --duration 60
+  python -m ai_engine.loadgen --vehicles 2,4,8,16 --fps 5 --video dashcam.mp4 --output fleet.json
+  python -m ai_engine.loadgen --target http://127.0.0.1:5001 --engine-pid 4242 --vehicles 10
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+# Engine modules use flat imports (`from landmark_engine import ...`).
+_ENGINE_DIR = os.path.dirname(os.path.abspath(__file__))
+if _ENGINE_DIR not in sys.path:
+    sys.path.insert(0, _ENGINE_DIR)
+
+import argparse
+import base64
+import http.client
+import json
+import subprocess
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+
+import cv2
+import numpy as np
+
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from bench import load_image_frames, load_video_frames, synthetic_frames
+
+try:
+    import psutil
+
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+
+LOADGEN_TRIP_PREFIX = "load-trip"
+LOADGEN_DRIVER_PREFIX = "load-driver"
+
+
+# ---------------------------------------------------------------------------
+# Stand-in backend
+# ---------------------------------------------------------------------------
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+
+class StubBackend:
+    """In-memory backend answering the routes the AI engine calls."""
+
+    def __init__(self, *, trips: Dict[str, str], latency_ms: float = 0.0) -> None:
+        self.trips = dict(trips)  # trip_id -> driver_id (all ACTIVE)
+        self.latency_s = max(0.0, float(latency_ms)) / 1000.0
+        self.requests: Counter = Counter()
+        self.items: Counter = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+        self.app = self._build_app()
+
+    def _count(self, route: str, items: int = 0) -> None:
+        with self._lock:
+            self.requests[route] += 1
+            if items:
+                self.items[route] += items
+
+    def _write_delay(self) -> None:
+        if self.latency_s > 0:
+            time.sleep(self.latency_s)
+
+    def _build_app(self) -> Flask:
+        stub = Flask("loadgen_backend")
+        thresholds = {"ear_drowsiness": 0.20, "mar_yawning": 0.08, "head_turn": 20.0}
+
+        @stub.get("/is-active-trip/<trip_id>")
+        def is_active_trip(trip_id: str) -> Any:
+            self._count("is_active_trip")
+            return jsonify({"trip_id": trip_id, "is_active": trip_id in self.trips}), 200
+
+        @stub.get("/active-trips")
+        def active_trips() -> Any:
+            self._count("active_trips")
+            etag = "loadgen:1"
+            if request.if_none_match.contains(etag):
+                resp = Response(status=304)
+            else:
+                resp = jsonify({"boot_id": "loadgen", "version": 1, "trip_ids": sorted(self.trips), "drivers": self.trips})
+            resp.set_etag(etag)
+            return resp
+
+        @stub.get("/trips/<trip_id>")
+        def get_trip(trip_id: str) -> Any:
+            self._count("get_trip")
+            if trip_id not in self.trips:
+                return jsonify({"error": "Trip not found"}), 404
+            return jsonify({"trip_id": trip_id, "driver_id": self.trips[trip_id], "status": "ACTIVE"}), 200
+
+        @stub.get("/drivers/<driver_id>/thresholds")
+        def get_thresholds(driver_id: str) -> Any:
+            self._count("thresholds")
+            etag = "loadgen-thresholds"
+            if request.if_none_match.contains(etag):
+                resp = Response(status=304)
+            else:
+                resp = jsonify({"driver_id": driver_id, "thresholds": thresholds})
+            resp.set_etag(etag)
+            return resp
+
+        def _batch_len() -> int:
+            payload = request.get_json(silent=True)
+            if isinstance(payload, dict):
+                payload = payload.get("events", [])
+            return len(payload) if isinstance(payload, list) else 0
+
+        @stub.post("/events")
+        def post_event() -> Any:
+            self._write_delay()
+            self._count("events", 1)
+            return jsonify({"message": "Event stored"}), 201
+
+        @stub.post("/events/batch")
+        def post_events_batch() -> Any:
+            self._write_delay()
+            n = _batch_len()
+            self._count("events_batch", n)
+            return jsonify({"recorded": n, "ended": 0, "duplicates": 0, "skipped": 0}), 200
+
+        @stub.post("/trips/<trip_id>/ai-results")
+        def post_ai_result(trip_id: str) -> Any:
+            self._write_delay()
+            self._count("ai_results", 1)
+            if trip_id not in self.trips:
+                return jsonify({"error": "TRIP_NOT_ACTIVE"}), 409
+            return jsonify({"message": "AI result recorded"}), 200
+
+        @stub.post("/trips/<trip_id>/ai-results/batch")
+        def post_ai_results_batch(trip_id: str) -> Any:
+            self._write_delay()
+            n = _batch_len()
+            self._count("ai_results_batch", n)
+            if trip_id not in self.trips:
+                return jsonify({"error": "TRIP_NOT_ACTIVE"}), 409
+            return jsonify({"recorded": n, "ended": 0, "duplicates": 0, "ignored": 0, "end_not_found": 0}), 200
+
+        @stub.post("/trips/<trip_id>/sos")
+        def post_sos(trip_id: str) -> Any:
+            self._write_delay()
+            self._count("sos", 1)
+            return jsonify({"message": "SOS recorded"}), 200
+
+        return stub
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._server = make_server(host, int(port), self.app, threaded=True, request_handler=_QuietHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="loadgen-backend").start()
+        return f"http://{host}:{self._server.server_port}"
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": dict(self.requests), "items": dict(self.items)}
+
+
+# ---------------------------------------------------------------------------
+# Engine process + resource sampling
+# ---------------------------------------------------------------------------
+
+
+class ProcessSampler:
+    """CPU % (of one core) and RSS of a process, via psutil or /proc."""
+
+    def __init__(self, pid: int) -> None:
+        self.pid = int(pid)
+        self._proc = psutil.Process(self.pid) if PSUTIL_AVAILABLE else None
+        self._tick = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self._page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+        self._last: Optional[Tuple[float, float]] = None
+        if self._proc is not None:
+            self._proc.cpu_percent(None)
+
+    def _proc_cpu_s(self) -> Optional[float]:
+        try:
+            with open(f"/proc/{self.pid}/stat", "r") as fh:
+                fields = fh.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / float(self._tick)
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def _proc_rss_mb(self) -> Optional[float]:
+        try:
+            with open(f"/proc/{self.pid}/statm", "r") as fh:
+                return int(fh.read().split()[1]) * self._page / (1024.0 * 1024.0)
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def sample(self) -> Dict[str, Any]:
+        if self._proc is not None:
+            try:
+                return {
+                    "cpu_percent": round(self._proc.cpu_percent(None), 1),
+                    "rss_mb": round(self._proc.memory_info().rss / (1024.0 * 1024.0), 1),
+                    "threads": self._proc.num_threads(),
+                }
+            except Exception:
+                return {"cpu_percent": None, "rss_mb": None}
+
+        now = time.monotonic()
+        cpu_s = self._proc_cpu_s()
+        cpu_pct = None
+        if cpu_s is not None and self._last is not None and now > self._last[0]:
+            cpu_pct = round(100.0 * (cpu_s - self._last[1]) / (now - self._last[0]), 1)
+        if cpu_s is not None:
+            self._last = (now, cpu_s)
+        rss = self._proc_rss_mb()
+        return {"cpu_percent": cpu_pct, "rss_mb": round(rss, 1) if rss is not None else None}
+
+
+def spawn_engine(*, backend_url: str, port: int, log_path: Optional[str]) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["BACKEND_BASE_URL"] = backend_url
+    env["AI_ENGINE_PORT"] = str(int(port))
+    env.setdefault("PYTHONUNBUFFERED", "1")
+    out = open(log_path, "w", encoding="utf-8") if log_path else subprocess.DEVNULL
+    return subprocess.Popen([sys.executable, os.path.join(_ENGINE_DIR, "app.py")], cwd=_ENGINE_DIR, env=env, stdout=out, stderr=subprocess.STDOUT)
+
+
+def wait_for_engine(base_url: str, *, timeout_s: float, proc: Optional[subprocess.Popen] = None) -> None:
+    deadline = time.monotonic() + float(timeout_s)
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"AI engine exited with code {proc.returncode} during startup")
+        try:
+            with urlopen(f"{base_url}/health", timeout=2) as resp:
+                if getattr(resp, "status", 200) == 200:
+                    return
+        except Exception:
+            time.sleep(0.5)
+    raise RuntimeError(f"AI engine at {base_url} not healthy after {timeout_s:.0f}s")
+
+
+def fetch_engine_latency(base_url: str) -> Dict[str, Any]:
+    """Per-stage percentiles from the engine's `/health` (`latency`), best effort."""
+    try:
+        with urlopen(f"{base_url}/health", timeout=5) as resp:
+            return (json.loads(resp.read().decode("utf-8") or "{}").get("latency") or {})
+    except Exception:
+        return {}
+
+
+# ---------------------------------------------------------------------------
+# Vehicles
+# ---------------------------------------------------------------------------
+
+
+def _percentiles_ms(latencies_s: List[float]) -> Dict[str, Optional[float]]:
+    if not latencies_s:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    arr = np.asarray(latencies_s, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {"p50": round(float(p50), 2), "p95": round(float(p95), 2), "p99": round(float(p99), 2), "max": round(float(arr.max()), 2)}
+
+
+class Vehicle(threading.Thread):
+    """One simulated vehicle: fixed-rate frame schedule over a keep-alive connection."""
+
+    def __init__(
+        self,
+        index: int,
+        *,
+        target: str,
+        bodies: List[bytes],
+        fmt: str,
+        fps: float,
+        start_at: float,
+        stop_at: float,
+        timeout_s: float,
+        speed_kmh: float,
+        recorder: "LatencyRecorder",
+    ) -> None:
+        super().__init__(daemon=True, name=f"vehicle-{index}")
+        self.index = int(index)
+        self.trip_id = f"{LOADGEN_TRIP_PREFIX}-{index}"
+        self.driver_id = f"{LOADGEN_DRIVER_PREFIX}-{index}"
+        parts = urlsplit(target)
+        self._host = parts.hostname or "127.0.0.1"
+        self._port = parts.port or 80
+        self._bodies = bodies
+        self._fmt = fmt
+        self._interval_s = 1.0 / max(0.1, float(fps))
+        self._start_at = float(start_at)
+        self._stop_at = float(stop_at)
+        self._timeout_s = float(timeout_s)
+        self._speed = float(speed_kmh)
+        self._recorder = recorder
+
+        self.sent = 0
+        self.ok = 0
+        self.errors = 0
+        self.dropped = 0
+        self.latencies: List[float] = []
+        self.active_s = 0.0
+        self.last_error: Optional[str] = None
+
+    def _request(self, conn: http.client.HTTPConnection, frame_no: int) -> int:
+        body = self._bodies[(self.index * 7 + frame_no) % len(self._bodies)]
+        if self._fmt == "jpeg":
+            path = f"/analyze_frame?trip_id={self.trip_id}&speed={self._speed:g}&input_type=loadgen&frame_id={frame_no}"
+            conn.request("POST", path, body=body, headers={"Content-Type": "image/jpeg"})
+        else:
+            doc = json.dumps({
+                "trip_id": self.trip_id,
+                "image": body.decode("ascii"),
+                "speed": self._speed,
+                "input_type": "loadgen",
+                "frame_id": str(frame_no),
+            })
+            conn.request("POST", "/analyze_frame", body=doc, headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        resp.read()
+        return int(resp.status)
+
+    def run(self) -> None:
+        conn = http.client.HTTPConnection(self._host, self._port, timeout=self._timeout_s)
+        next_at = self._start_at
+        frame_no = 0
+        while True:
+            now = time.monotonic()
+            if now < next_at:
+                time.sleep(next_at - now)
+                now = time.monotonic()
+            if now >= self._stop_at:
+                break
+            # Capture slots that passed while the previous request was in flight are lost.
+            missed = int((now - next_at) / self._interval_s)
+            if missed > 0:
+                self.dropped += missed
+                frame_no += missed
+                next_at += missed * self._interval_s
+
+            self.sent += 1
+            self._recorder.begin()
+            t0 = time.perf_counter()
+            try:
+                status = self._request(conn, frame_no)
+            except Exception as e:
+                status = 0
+                self.last_error = f"{type(e).__name__}: {e}"
+                conn.close()
+            latency = time.perf_counter() - t0
+            self._recorder.end(latency, ok=(status == 200))
+            if status == 200:
+                self.ok += 1
+                self.latencies.append(latency)
+            else:
+                self.errors += 1
+                if status:
+                    self.last_error = f"HTTP {status}"
+
+            frame_no += 1
+            next_at += self._interval_s
+        conn.close()
+        self.active_s = max(1e-9, min(time.monotonic(), self._stop_at) - self._start_at)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "vehicle": self.index,
+            "trip_id": self.trip_id,
+            "sent": self.sent,
+            "ok": self.ok,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "achieved_fps": round(self.ok / self.active_s, 2) if self.active_s else 0.0,
+            "latency_ms": _percentiles_ms(self.latencies),
+            "last_error": self.last_error,
+        }
+
+
+class LatencyRecorder:
+    """Completed-request log shared by all vehicles, for the per-interval timeline."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._window: List[Tuple[float, bool]] = []
+        self.inflight = 0
+
+    def begin(self) -> None:
+        with self._lock:
+            self.inflight += 1
+
+    def end(self, latency_s: float, *, ok: bool) -> None:
+        with self._lock:
+            self.inflight -= 1
+            self._window.append((latency_s, ok))
+
+    def drain(self) -> Tuple[List[Tuple[float, bool]], int]:
+        with self._lock:
+            window, self._window = self._window, []
+            return window, self.inflight
+
+
+# ---------------------------------------------------------------------------
+# Run
+# ---------------------------------------------------------------------------
+
+
+def encode_bodies(frames: List[np.ndarray], *, fmt: str, quality: int = 85) -> List[bytes]:
+    bodies: List[bytes] = []
+    for frame in frames:
+        ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)])
+        if not ok:
+            continue
+        data = buf.tobytes()
+        bodies.append(data if fmt == "jpeg" else base64.b64encode(data))
+    if not bodies:
+        raise ValueError("no frames could be encoded")
+    return bodies
+
+
+def run_step(
+    *,
+    vehicles: int,
+    target: str,
+    bodies: List[bytes],
+    fmt: str,
+    fps: float,
+    duration_s: float,
+    ramp_s: float,
+    timeout_s: float,
+    speed_kmh: float,
+    sample_interval_s: float,
+    sampler: Optional[ProcessSampler],
+) -> Dict[str, Any]:
+    """Drive `vehicles` concurrent vehicles for `duration_s` and return the step report."""
+    recorder = LatencyRecorder()
+    t0 = time.monotonic() + 0.5
+    stop_at = t0 + float(duration_s)
+    fleet = [
+        Vehicle(
+            i,
+            target=target,
+            bodies=bodies,
+            fmt=fmt,
+            fps=fps,
+            start_at=t0 + (float(ramp_s) * i / max(1, vehicles)),
+            stop_at=stop_at,
+            timeout_s=timeout_s,
+            speed_kmh=speed_kmh,
+            recorder=recorder,
+        )
+        for i in range(int(vehicles))
+    ]
+    for v in fleet:
+        v.start()
+
+    timeline: List[Dict[str, Any]] = []
+    if sampler is not None:
+        sampler.sample()  # prime the CPU delta
+    next_sample = t0 + float(sample_interval_s)
+    while any(v.is_alive() for v in fleet):
+        time.sleep(max(0.0, min(0.1, next_sample - time.monotonic())))
+        now = time.monotonic()
+        if now < next_sample:
+            continue
+        window, inflight = recorder.drain()
+        ok_lat = [lat for lat, ok in window if ok]
+        point: Dict[str, Any] = {
+            "t_s": round(now - t0, 2),
+            "fps": round(len(ok_lat) / float(sample_interval_s), 2),
+            "errors": sum(1 for _, ok in window if not ok),
+            "p95_ms": _percentiles_ms(ok_lat)["p95"],
+            "inflight": inflight,
+        }
+        if sampler is not None:
+            point.update(sampler.sample())
+        timeline.append(point)
+        next_sample += float(sample_interval_s)
+    for v in fleet:
+        v.join()
+
+    per_vehicle = [v.report() for v in fleet]
+    all_lat = [lat for v in fleet for lat in v.latencies]
+    sent = sum(v.sent for v in fleet)
+    dropped = sum(v.dropped for v in fleet)
+    cpu = [p["cpu_percent"] for p in timeline if p.get("cpu_percent") is not None]
+    rss = [p["rss_mb"] for p in timeline if p.get("rss_mb") is not None]
+    achieved = [r["achieved_fps"] for r in per_vehicle]
+    return {
+        "vehicles": int(vehicles),
+        "target_fps": float(fps),
+        "duration_s": float(duration_s),
+        "summary": {
+            "frames_sent": sent,
+            "frames_ok": sum(v.ok for v in fleet),
+            "errors": sum(v.errors for v in fleet),
+            "dropped": dropped,
+            "drop_ratio": round(dropped / float(sent + dropped), 4) if (sent + dropped) else 0.0,
+            "achieved_fps_total": round(sum(achieved), 2),
+            "achieved_fps_per_vehicle": {
+                "min": round(min(achieved), 2) if achieved else 0.0,
+                "mean": round(sum(achieved) / len(achieved), 2) if achieved else 0.0,
+            },
+            "latency_ms": _percentiles_ms(all_lat),
+            "cpu_percent": {"mean": round(sum(cpu) / len(cpu), 1), "max": max(cpu)} if cpu else None,
+            "rss_mb": {"start": rss[0], "end": rss[-1], "max": max(rss)} if rss else None,
+        },
+        "per_vehicle": per_vehicle,
+        "timeline": timeline,
+    }
+
+
+def _step_meets_slo(step: Dict[str, Any], *, fps_ratio: float, slo_p95_ms: float) -> bool:
+    s = step["summary"]
+    p95 = s["latency_ms"]["p95"]
+    return (
+        s["errors"] == 0
+        and p95 is not None
+        and p95 <= float(slo_p95_ms)
+        and s["achieved_fps_per_vehicle"]["min"] >= float(fps_ratio) * float(step["target_fps"])
+    )
+
+
+def _load_frames(args: argparse.Namespace) -> Tuple[List[np.ndarray], str]:
+    if args.video:
+        return load_video_frames(args.video, max_frames=args.max_frames), f"video:{os.path.basename(args.video)}"
+    if args.frames:
+        return load_image_frames(args.frames, max_frames=args.max_frames), f"frames:{os.path.basename(os.path.normpath(args.frames))}"
+    width, height = (int(v) for v in str(args.size).lower().split("x"))
+    return synthetic_frames(args.max_frames, width=width, height=height), "synthetic"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m ai_engine.loadgen", description="Simulated vehicle fleet against /analyze_frame")
+    parser.add_argument("--vehicles", default="4", help="Fleet size, or comma-separated sizes to step through (e.g. 2,4,8,16)")
+    parser.add_argument("--fps", type=float, default=5.0, help="Frames per second per vehicle (default 5)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per step (default 30)")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Seconds over which vehicle starts are staggered (default 2)")
+    parser.add_argument("--format", choices=["jpeg", "json"], default="jpeg", help="Raw image/jpeg body or base64 JSON (default jpeg)")
+    parser.add_argument("--video", default=None, help="Recorded video to replay")
+    parser.add_argument("--frames", default=None, help="Directory of recorded frame images to replay")
+    parser.add_argument("--max-frames", type=int, default=120, help="Frames loaded and looped per vehicle (default 120)")
+    parser.add_argument("--size", default="640x480", help="Synthetic frame size WxH (default 640x480)")
+    parser.add_argument("--quality", type=int, default=85, help="JPEG quality of replayed frames (default 85)")
+    parser.add_argument("--speed", type=float, default=60.0, help="Vehicle speed sent with each frame (km/h)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout in seconds (default 10)")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Timeline sampling interval in seconds (default 1)")
+    parser.add_argument("--target", default=None, help="Use a running AI engine at this URL instead of spawning one")
+    parser.add_argument("--engine-pid", type=int, default=None, help="PID of the --target engine to sample CPU/memory")
+    parser.add_argument("--engine-port", type=int, default=5101, help="Port for the spawned AI engine (default 5101)")
+    parser.add_argument("--engine-log", default=None, help="Write the spawned engine's output here (default: discarded)")
+    parser.add_argument("--startup-timeout", type=float, default=120.0, help="Seconds to wait for the engine's /health")
+    parser.add_argument("--backend-port", type=int, default=0, help="Stand-in backend port (default: ephemeral; set it with --target)")
+    parser.add_argument("--backend-latency-ms", type=float, default=0.0, help="Artificial delay on stand-in backend writes")
+    parser.add_argument("--slo-p95-ms", type=float, default=200.0, help="p95 latency a step must stay under to count as served (default 200)")
+    parser.add_argument("--fps-ratio", type=float, default=0.95, help="Min achieved/target fps per vehicle to count as served (default 0.95)")
+    parser.add_argument("--pause", type=float, default=3.0, help="Seconds between steps (default 3)")
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    steps = [int(v) for v in str(args.vehicles).split(",") if v.strip()]
+    if not steps or min(steps) < 1:
+        print("--vehicles must be positive integers", file=sys.stderr)
+        return 2
+    max_vehicles = max(steps)
+
+    frames, source = _load_frames(args)
+    bodies = encode_bodies(frames, fmt=args.format, quality=args.quality)
+
+    backend = StubBackend(
+        trips={f"{LOADGEN_TRIP_PREFIX}-{i}": f"{LOADGEN_DRIVER_PREFIX}-{i}" for i in range(max_vehicles)},
+        latency_ms=args.backend_latency_ms,
+    )
+    backend_url = backend.start(port=args.backend_port)
+    print(f"[loadgen] stand-in backend at {backend_url}", file=sys.stderr)
+
+    proc: Optional[subprocess.Popen] = None
+    sampler: Optional[ProcessSampler] = None
+    try:
+        if args.target:
+            target = str(args.target).rstrip("/")
+            if args.engine_pid:
+                sampler = ProcessSampler(args.engine_pid)
+        else:
+            proc = spawn_engine(backend_url=backend_url, port=args.engine_port, log_path=args.engine_log)
+            target = f"http://127.0.0.1:{int(args.engine_port)}"
+            sampler = ProcessSampler(proc.pid)
+        wait_for_engine(target, timeout_s=args.startup_timeout, proc=proc)
+        print(f"[loadgen] AI engine at {target}", file=sys.stderr)
+
+        results: List[Dict[str, Any]] = []
+        for idx, n in enumerate(steps):
+            if idx:
+                time.sleep(max(0.0, float(args.pause)))
+            print(f"[loadgen] step {idx + 1}/{len(steps)}: {n} vehicle(s) x {args.fps:g} fps for {args.duration:g}s", file=sys.stderr)
+            step = run_step(
+                vehicles=n,
+                target=target,
+                bodies=bodies,
+                fmt=args.format,
+                fps=args.fps,
+                duration_s=args.duration,
+                ramp_s=args.ramp,
+                timeout_s=args.timeout,
+                speed_kmh=args.speed,
+                sample_interval_s=args.sample_interval,
+                sampler=sampler,
+            )
+            step["meets_slo"] = _step_meets_slo(step, fps_ratio=args.fps_ratio, slo_p95_ms=args.slo_p95_ms)
+            results.append(step)
+            s = step["summary"]
+            print(
+                f"[loadgen]   fps={s['achieved_fps_total']:.1f} (min/vehicle {s['achieved_fps_per_vehicle']['min']:.2f}) "
+                f"p50={s['latency_ms']['p50']} p95={s['latency_ms']['p95']} p99={s['latency_ms']['p99']} ms "
+                f"dropped={s['dropped']} errors={s['errors']} cpu={s['cpu_percent']} rss={s['rss_mb']} "
+                f"{'OK' if step['meets_slo'] else 'SLO MISSED'}",
+                file=sys.stderr,
+            )
+
+        served = [step["vehicles"] for step in results if step["meets_slo"]]
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "target": target,
+            "params": {
+                "fps": args.fps,
+                "duration_s": args.duration,
+                "format": args.format,
+                "source": source,
+                "frames": len(bodies),
+                "slo_p95_ms": args.slo_p95_ms,
+                "fps_ratio": args.fps_ratio,
+                "backend_latency_ms": args.backend_latency_ms,
+                "resource_sampler": "psutil" if PSUTIL_AVAILABLE else "procfs",
+            },
+            "max_vehicles_within_slo": max(served) if served else 0,
+            "steps": results,
+            "backend": backend.stats(),
+            "engine_latency": fetch_engine_latency(target),
+        }
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        backend.stop()
+
+    text = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+    print(f"[loadgen] max vehicles within SLO: {report['max_vehicles_within_slo']}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
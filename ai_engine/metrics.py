@@ -0,0 +1,235 @@
+"""ai_engine.metrics
+
+In-process latency histograms and a Prometheus text exposition.
+
+- `Histogram`: fixed cumulative buckets (seconds), observed under a per-series
+  lock with one `bisect` per sample, so instrumenting the fast loop costs a
+  couple of microseconds per stage
+- `timed(stage)`: context manager recording wall time into
+  `ai_engine_stage_seconds{stage="..."}`
+- `observe_queue_wait(queue, seconds)`: time a job waited in a background queue
+  (`ai_engine_queue_wait_seconds{queue="..."}`)
+- `quantile(q)`: p50/p95/p99 estimated from the buckets (linear interpolation
+  inside the bucket, same as PromQL `histogram_quantile`)
+- `register_gauge(name, help, collect)`: point-in-time values pulled at scrape
+  time (queue depths, drop counters) from the existing `stats()` methods
+- `render_prometheus()`: text format 0.0.4 for `GET /metrics`
+
+Stages may nest (e.g. `parse` includes `decode` for binary bodies, `fast_loop`
+includes every per-frame stage).
+
+Set `METRICS_ENABLED=0` to turn recording into a no-op.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from structured_log import get_logger
+
+_log = get_logger("metrics")
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").strip().lower() not in {"0", "false", "no", "off"}
+
+# 100us .. 10s in a 1-2.5-5 progression: fine enough for sub-ms stages
+# (behavior/risk) and wide enough for model inference under load.
+DEFAULT_BUCKETS_S: Tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0,
+)
+
+QUANTILES: Tuple[float, ...] = (0.5, 0.95, 0.99)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram for one label set."""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS_S) -> None:
+        self.buckets: Tuple[float, ...] = tuple(sorted(float(b) for b in buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot = +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value_s: float) -> None:
+        idx = bisect_left(self.buckets, value_s)
+        with self._lock:
+            self._counts[idx] += 1
+            self._sum += value_s
+            self._count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """(per-bucket counts, sum, count); bucket counts are NOT cumulative."""
+        with self._lock:
+            return list(self._counts), self._sum, self._count
+
+    def quantile(self, q: float, snapshot: Optional[Tuple[List[int], float, int]] = None) -> Optional[float]:
+        counts, _, total = snapshot or self.snapshot()
+        if total <= 0:
+            return None
+        rank = max(0.0, min(1.0, float(q))) * total
+        cumulative = 0
+        for idx, n in enumerate(counts):
+            if n and cumulative + n >= rank:
+                if idx >= len(self.buckets):
+                    # Above the largest bound: report the bound (PromQL does the same).
+                    return self.buckets[-1]
+                lower = self.buckets[idx - 1] if idx > 0 else 0.0
+                upper = self.buckets[idx]
+                return lower + (upper - lower) * ((rank - cumulative) / n)
+            cumulative += n
+        return self.buckets[-1]
+
+
+class _Family:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...]) -> None:
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.series: Dict[Labels, Histogram] = {}
+
+
+_families: Dict[str, _Family] = {}
+_gauges: Dict[str, Tuple[str, Callable[[], Iterable[Tuple[Dict[str, Any], float]]]]] = {}
+_registry_lock = threading.Lock()
+
+
+def histogram(name: str, help_text: str = "", *, buckets: Tuple[float, ...] = DEFAULT_BUCKETS_S, **labels: Any) -> Histogram:
+    """Return (creating on first use) the histogram for `name` + `labels`."""
+    key: Labels = tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+    family = _families.get(name)
+    if family is not None:
+        series = family.series.get(key)
+        if series is not None:
+            return series
+    with _registry_lock:
+        family = _families.get(name)
+        if family is None:
+            family = _families[name] = _Family(name, help_text, buckets)
+        series = family.series.get(key)
+        if series is None:
+            series = family.series[key] = Histogram(family.buckets)
+        return series
+
+
+STAGE_SECONDS = "ai_engine_stage_seconds"
+QUEUE_WAIT_SECONDS = "ai_engine_queue_wait_seconds"
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    if METRICS_ENABLED:
+        histogram(STAGE_SECONDS, "Per-stage processing latency.", stage=stage).observe(seconds)
+
+
+def observe_queue_wait(queue: str, seconds: float) -> None:
+    if METRICS_ENABLED:
+        histogram(QUEUE_WAIT_SECONDS, "Time a job waited in a background queue before running.", queue=queue).observe(seconds)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Record the wall time of the `with` body as `stage` (also on exceptions)."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def register_gauge(name: str, help_text: str, collect: Callable[[], Iterable[Tuple[Dict[str, Any], float]]]) -> None:
+    """Register a gauge whose `(labels, value)` samples are pulled at scrape time."""
+    with _registry_lock:
+        _gauges[name] = (help_text, collect)
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    parts = []
+    for k, v in labels:
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def summary() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """{family: {label-string: {count, p50_ms, p95_ms, p99_ms}}} for JSON diagnostics."""
+    out: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    with _registry_lock:
+        families = [(f.name, list(f.series.items())) for f in _families.values()]
+    for name, series in families:
+        rows: Dict[str, Dict[str, Any]] = {}
+        for labels, hist in series:
+            snap = hist.snapshot()
+            row: Dict[str, Any] = {"count": snap[2]}
+            for q in QUANTILES:
+                v = hist.quantile(q, snap)
+                row[f"p{int(q * 100)}_ms"] = round(v * 1000.0, 3) if v is not None else None
+            rows[",".join(v for _, v in labels) or "_"] = row
+        out[name] = rows
+    return out
+
+
+def render_prometheus() -> str:
+    """Prometheus text exposition (format 0.0.4) of all histograms and gauges."""
+    lines: List[str] = []
+    with _registry_lock:
+        families = [(f.name, f.help, f.buckets, list(f.series.items())) for f in _families.values()]
+        gauges = list(_gauges.items())
+
+    for name, help_text, buckets, series in families:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        quantile_lines: List[str] = []
+        for labels, hist in series:
+            snap = hist.snapshot()
+            counts, total_sum, total = snap
+            cumulative = 0
+            for bound, n in zip(list(buckets) + [float("inf")], counts):
+                cumulative += n
+                le = labels + (("le", _format_value(bound)),)
+                lines.append(f"{name}_bucket{_format_labels(le)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total_sum)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {total}")
+            for q in QUANTILES:
+                v = hist.quantile(q, snap)
+                if v is not None:
+                    ql = labels + (("quantile", str(q)),)
+                    quantile_lines.append(f"{name}_quantile{_format_labels(ql)} {_format_value(v)}")
+        if quantile_lines:
+            # Precomputed p50/p95/p99 for dashboards without histogram_quantile.
+            lines.append(f"# HELP {name}_quantile Estimated {name} quantiles (from buckets).")
+            lines.append(f"# TYPE {name}_quantile gauge")
+            lines.extend(quantile_lines)
+
+    for name, (help_text, collect) in gauges:
+        try:
+            samples = list(collect())
+        except Exception as e:
+            _log.warning("metrics gauge %s failed: %s", name, e)
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            label_items = tuple(sorted((str(k), str(v)) for k, v in (labels or {}).items()))
+            lines.append(f"{name}{_format_labels(label_items)} {_format_value(value)}")
+
+    return "\n".join(lines) + "\n"
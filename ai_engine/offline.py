@@ -0,0 +1,430 @@
+"""ai_engine.offline
+
+Offline analysis of recorded dashcam video files.
+
+Re-processes a recording through the same fast-loop pipeline as
+`POST /analyze_frame`, without HTTP:
+
+1) frames are read with `cv2.VideoCapture` in the parent process
+2) frames fan out to a `multiprocessing` pool; every worker owns its own
+   `LandmarkEngine` (and `FaceRecognitionService` for identity samples)
+3) per-frame metrics come back in capture order and are fed through a single
+   `BehaviorEngine` / `RiskEngine` / `FinalDecisionEngine`
+4) episodes are built with `app._build_episode_persistence_payloads`, so the
+   output matches what the live service would have persisted
+
+The slow loop (emotion, passenger SOS gesture) is not run offline.
+
+Usage (from the repo root, or `python offline.py ...` from `ai_engine/`):
+  python -m ai_engine.offline analyze dashcam.mp4 --trip-id <trip_id>
+  python -m ai_engine.offline analyze dashcam.mp4 --trip-id <trip_id> --workers 6 --stride 2 --output episodes.jsonl
+  python -m ai_engine.offline analyze dashcam.mp4 --trip-id <trip_id> --thresholds '{"ear_drowsiness": 0.18}' --post
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+# Engine modules use flat imports (`from landmark_engine import ...`); make them
+# importable when run as `python -m ai_engine.offline` and in spawned workers.
+_ENGINE_DIR = os.path.dirname(os.path.abspath(__file__))
+if _ENGINE_DIR not in sys.path:
+    sys.path.insert(0, _ENGINE_DIR)
+
+import argparse
+import json
+import multiprocessing
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from behavior_engine import BehaviorEngine
+from final_decision_engine import FinalDecisionEngine
+from risk_engine import RiskEngine
+
+
+IDENTITY_MATCH_EVERY_N_FRAMES = int(os.getenv("IDENTITY_MATCH_EVERY_N_FRAMES", "20"))
+IDENTITY_MATCH_TOLERANCE = float(os.getenv("IDENTITY_MATCH_TOLERANCE", "0.5"))
+DRIVER_NOT_VISIBLE_AFTER_S = float(os.getenv("DRIVER_NOT_VISIBLE_AFTER_S", "3.0"))
+OFFLINE_WORKERS = int(os.getenv("OFFLINE_WORKERS", "0"))  # 0 -> cpu_count - 1
+OFFLINE_CHUNKSIZE = int(os.getenv("OFFLINE_CHUNKSIZE", "4"))
+
+
+# ---------------------------------------------------------------------------
+# Worker side (one LandmarkEngine / FaceRecognitionService per process)
+# ---------------------------------------------------------------------------
+
+_worker_identity_every = 0
+
+
+def _init_worker(identity_every: int) -> None:
+    global _worker_identity_every
+    _worker_identity_every = int(identity_every)
+
+    from landmark_engine import get_landmark_engine
+
+    get_landmark_engine()
+    if _worker_identity_every > 0:
+        from face_recognition_service import get_face_recognition_service
+
+        get_face_recognition_service()
+
+
+def _analyze_worker_frame(
+    item: Tuple[int, int, float, np.ndarray],
+) -> Tuple[int, int, float, Dict[str, Any], List[Tuple[Dict[str, int], List[float]]]]:
+    """Landmark metrics (+ periodic face embeddings) for one frame."""
+    ordinal, frame_no, ts, image = item
+
+    from landmark_engine import get_landmark_engine
+
+    cv_metrics = get_landmark_engine().process_frame(image)
+
+    embeddings: List[Tuple[Dict[str, int], List[float]]] = []
+    if _worker_identity_every > 0 and ordinal % _worker_identity_every == 0:
+        from face_recognition_service import get_face_recognition_service
+
+        try:
+            for bbox, emb in get_face_recognition_service().extract_face_embeddings(image):
+                embeddings.append((dict(bbox), np.asarray(emb, dtype=np.float32).reshape(-1).tolist()))
+        except Exception:
+            embeddings = []
+
+    return ordinal, frame_no, ts, cv_metrics, embeddings
+
+
+# ---------------------------------------------------------------------------
+# Parent side
+# ---------------------------------------------------------------------------
+
+
+def _iter_video_frames(
+    path: str,
+    *,
+    start_ts: float,
+    stride: int = 1,
+    max_frames: Optional[int] = None,
+) -> Iterator[Tuple[int, int, float, np.ndarray]]:
+    """Yield (ordinal, frame_no, capture_ts, frame_bgr) in file order."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"cannot open video: {path}")
+
+    fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0)
+    stride = max(1, int(stride))
+    frame_no = -1
+    ordinal = 0
+    try:
+        while True:
+            if max_frames is not None and ordinal >= int(max_frames):
+                break
+            ok = cap.grab()
+            if not ok:
+                break
+            frame_no += 1
+            if frame_no % stride != 0:
+                continue
+            ok, frame = cap.retrieve()
+            if not ok or frame is None:
+                continue
+
+            pos_ms = float(cap.get(cv2.CAP_PROP_POS_MSEC) or 0.0)
+            if pos_ms <= 0.0 and fps > 0.0:
+                pos_ms = (frame_no / fps) * 1000.0
+            yield ordinal, frame_no, float(start_ts) + pos_ms / 1000.0, frame
+            ordinal += 1
+    finally:
+        cap.release()
+
+
+def _parse_start_ts(value: Optional[str], path: str) -> float:
+    """Recording start time: epoch seconds, ISO-8601, or the file mtime."""
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return parsed.timestamp()
+    try:
+        return float(os.path.getmtime(path))
+    except OSError:
+        return time.time()
+
+
+def _load_thresholds_arg(value: Optional[str]) -> Dict[str, float]:
+    if not value:
+        return {}
+    raw = value
+    if os.path.exists(value):
+        with open(value, "r", encoding="utf-8") as fh:
+            raw = fh.read()
+    data = json.loads(raw)
+    if not isinstance(data, dict):
+        raise ValueError("--thresholds must be a JSON object")
+    return {str(k): float(v) for k, v in data.items()}
+
+
+def analyze_video(
+    path: str,
+    *,
+    trip_id: str,
+    driver_id: Optional[str] = None,
+    thresholds: Optional[Dict[str, float]] = None,
+    speed_kmh: float = 0.0,
+    start_ts: Optional[float] = None,
+    workers: Optional[int] = None,
+    stride: int = 1,
+    max_frames: Optional[int] = None,
+    identity_every: int = IDENTITY_MATCH_EVERY_N_FRAMES,
+    on_episode: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """Analyze a video file and return its episodes + a run summary.
+
+    `thresholds` entries override the driver's stored thresholds (useful when
+    re-processing footage after threshold changes). `identity_every=0` disables
+    the fixed-identity visibility check. `on_episode` is called for every
+    episode payload as soon as it is produced.
+    """
+    # Episode builder + identity helpers live in the service module.
+    import app as engine_app
+    from driver_session_manager import get_driver_session_manager
+
+    started = time.perf_counter()
+    trip_id = str(trip_id or "").strip()
+    driver_id = str(driver_id or "").strip() or engine_app._get_driver_id_from_trip(
+        trip_id, wait_s=engine_app.BIND_SESSION_WAIT_S
+    )
+    session_key = trip_id or f"driver:{driver_id}"
+
+    resolved_thresholds = dict(
+        get_driver_session_manager().get_thresholds(
+            session_key=session_key, driver_id=driver_id, wait_s=engine_app.BIND_SESSION_WAIT_S
+        )
+    )
+    resolved_thresholds.update(thresholds or {})
+
+    if start_ts is None:
+        start_ts = _parse_start_ts(None, path)
+    n_workers = int(workers or OFFLINE_WORKERS or max(1, (os.cpu_count() or 2) - 1))
+
+    behavior_engine = BehaviorEngine()
+    risk_engine = RiskEngine()
+    decision_engine = FinalDecisionEngine()
+
+    # Isolated episode state so a run never interleaves with live sessions.
+    episode_session = f"offline:{session_key}:{uuid.uuid4().hex[:8]}"
+    video_id = os.path.basename(path)
+    driver_emotion_payload = {
+        "driver_emotion": "unknown",
+        "confidence": 0.0,
+        "stress_level": "LOW",
+        "timestamp": None,
+    }
+
+    episodes: List[Dict[str, Any]] = []
+    driver_encoding: Optional[np.ndarray] = None
+    last_driver_seen: float = 0.0
+    frames_analyzed = 0
+    first_ts: Optional[float] = None
+    last_ts: Optional[float] = None
+    last_risk: Dict[str, Any] = {}
+
+    def _emit(payloads: List[Dict[str, Any]]) -> None:
+        for payload in payloads:
+            episodes.append(payload)
+            if on_episode is not None:
+                on_episode(payload)
+
+    frames = _iter_video_frames(path, start_ts=float(start_ts), stride=stride, max_frames=max_frames)
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(processes=n_workers, initializer=_init_worker, initargs=(int(identity_every),)) as pool:
+        for ordinal, frame_no, ts, cv_metrics, embeddings in pool.imap(
+            _analyze_worker_frame, frames, chunksize=max(1, int(OFFLINE_CHUNKSIZE))
+        ):
+            frames_analyzed += 1
+            first_ts = ts if first_ts is None else first_ts
+            last_ts = ts
+
+            # Fixed identity: the first driver face sampled becomes the reference
+            # encoding; later samples refresh "last seen" like the live loop does.
+            if identity_every > 0:
+                if embeddings:
+                    target_bbox = engine_app._driver_bbox_from_faces_meta(cv_metrics.get("faces_meta", []) or [], cv_metrics)
+                    picked = engine_app._pick_embedding_for_target(
+                        embeddings=[(bbox, np.asarray(emb, dtype=np.float32)) for bbox, emb in embeddings],
+                        target_bbox=target_bbox,
+                    )
+                    if picked is not None:
+                        if driver_encoding is None:
+                            driver_encoding = np.asarray(picked, dtype=np.float32)
+                            last_driver_seen = ts
+                        elif engine_app._cosine_similarity(picked, driver_encoding) >= float(IDENTITY_MATCH_TOLERANCE):
+                            last_driver_seen = ts
+                if driver_encoding is not None:
+                    unseen_s = max(0.0, ts - last_driver_seen)
+                    cv_metrics["driver_last_seen_s_ago"] = float(unseen_s)
+                    cv_metrics["driver_matched_recently"] = bool(unseen_s <= float(DRIVER_NOT_VISIBLE_AFTER_S))
+
+            behavior = behavior_engine.update(
+                driver_id=driver_id,
+                cv_metrics=cv_metrics,
+                thresholds=resolved_thresholds,
+                ts=ts,
+            )
+            detections = list(behavior.get("detections", []) or [])
+            risk_result = risk_engine.compute(
+                trip_id=trip_id or "unknown_trip",
+                detections=detections,
+                raw_scores=behavior.get("raw_scores"),
+                speed_kmh=max(0.0, float(speed_kmh)),
+            )
+            final_decision = decision_engine.decide(risk_result=risk_result, emotion_result=None, sos_triggered=False)
+            last_risk = {
+                "risk_score_temporal": risk_result.get("risk_score_temporal"),
+                "risk_level_temporal": risk_result.get("risk_level_temporal"),
+                "risk_score_weighted": final_decision.get("risk_score_weighted"),
+                "risk_level_weighted": final_decision.get("risk_level_weighted"),
+                "risk_level": final_decision.get("risk_level"),
+                "reasons": risk_result.get("reasons", []),
+            }
+
+            faces_meta = cv_metrics.get("faces_meta", []) or []
+            _emit(engine_app._build_episode_persistence_payloads(
+                session_key=episode_session,
+                trip_id=trip_id,
+                driver_id=driver_id,
+                detections=detections,
+                ts_iso=datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(),
+                risk_result=last_risk,
+                driver_emotion_payload=driver_emotion_payload,
+                metadata={
+                    "input_type": "video_file",
+                    "frame_id": str(frame_no),
+                    "video_id": video_id,
+                    "cv_metrics": cv_metrics,
+                    "driver": next((m for m in faces_meta if m.get("role") == "driver"), None),
+                    "passengers": [m for m in faces_meta if m.get("role") == "passenger"],
+                    "trip_active": bool(trip_id),
+                    "driver_emotion": driver_emotion_payload,
+                    "passenger_emotions": [],
+                    "warnings": [],
+                },
+            ))
+
+    # Close episodes still open when the recording ends.
+    if last_ts is not None:
+        _emit(engine_app._build_episode_persistence_payloads(
+            session_key=episode_session,
+            trip_id=trip_id,
+            driver_id=driver_id,
+            detections=[],
+            ts_iso=datetime.fromtimestamp(last_ts, tz=timezone.utc).isoformat(),
+            risk_result=last_risk,
+            driver_emotion_payload=driver_emotion_payload,
+            metadata={"input_type": "video_file", "video_id": video_id, "trip_active": bool(trip_id)},
+        ))
+    engine_app._reset_episode_state(episode_session)
+
+    elapsed_s = time.perf_counter() - started
+    video_s = max(0.0, float((last_ts or 0.0) - (first_ts or 0.0)))
+    started_by_type = Counter(p.get("event_type") for p in episodes if p.get("event_action") == "start")
+    return {
+        "trip_id": trip_id or None,
+        "driver_id": driver_id,
+        "video": path,
+        "thresholds": resolved_thresholds,
+        "workers": n_workers,
+        "frames_analyzed": frames_analyzed,
+        "video_seconds": round(video_s, 3),
+        "elapsed_seconds": round(elapsed_s, 3),
+        "realtime_factor": round(video_s / elapsed_s, 2) if elapsed_s > 0 else None,
+        "episodes_started": dict(started_by_type),
+        "episodes": episodes,
+    }
+
+
+def _cmd_analyze(args: argparse.Namespace) -> int:
+    out_fh = open(args.output, "w", encoding="utf-8") if args.output else None
+    client = None
+    if args.post:
+        from persistence_client import get_persistence_client
+
+        client = get_persistence_client()
+
+    def _on_episode(payload: Dict[str, Any]) -> None:
+        line = json.dumps(payload, default=str)
+        if out_fh is not None:
+            out_fh.write(line + "\n")
+        elif not args.quiet:
+            print(line)
+        if client is not None:
+            client.enqueue([payload])
+
+    try:
+        summary = analyze_video(
+            args.video,
+            trip_id=args.trip_id,
+            driver_id=args.driver_id,
+            thresholds=_load_thresholds_arg(args.thresholds),
+            speed_kmh=args.speed,
+            start_ts=_parse_start_ts(args.start, args.video),
+            workers=args.workers,
+            stride=args.stride,
+            max_frames=args.max_frames,
+            identity_every=0 if args.no_identity else args.identity_every,
+            on_episode=_on_episode,
+        )
+    finally:
+        if out_fh is not None:
+            out_fh.close()
+
+    summary.pop("episodes", None)
+    failed = 0
+    if client is not None:
+        drained = client.flush(timeout_s=args.post_timeout)
+        stats = client.stats()
+        failed = int(stats["rejected"]) + int(stats["dropped"]) + int(stats["queue_length"])
+        summary["posted"] = stats["sent"]
+        summary["post_requests"] = stats["requests"]
+        summary["post_failed"] = failed
+        summary["post_drained"] = drained
+    print(json.dumps(summary, indent=2, default=str), file=sys.stderr)
+    return 0 if failed == 0 else 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m ai_engine.offline", description="Offline video-file analysis")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("analyze", help="Analyze a recorded video and emit episode payloads (JSON lines)")
+    p.add_argument("video", help="Path to the video file")
+    p.add_argument("--trip-id", default="", help="Trip the episodes belong to")
+    p.add_argument("--driver-id", default=None, help="Driver id (default: resolved from the trip via backend)")
+    p.add_argument("--thresholds", default=None, help="JSON object or JSON file overriding driver thresholds")
+    p.add_argument("--speed", type=float, default=0.0, help="Constant speed (km/h) fed to risk scoring")
+    p.add_argument("--start", default=None, help="Recording start time (epoch seconds or ISO-8601; default: file mtime)")
+    p.add_argument("--workers", type=int, default=None, help="Worker processes (default: OFFLINE_WORKERS or cpu_count - 1)")
+    p.add_argument("--stride", type=int, default=1, help="Analyze every Nth frame")
+    p.add_argument("--max-frames", type=int, default=None, help="Stop after N analyzed frames")
+    p.add_argument("--identity-every", type=int, default=IDENTITY_MATCH_EVERY_N_FRAMES, help="Identity sample cadence (frames)")
+    p.add_argument("--no-identity", action="store_true", help="Skip face-embedding identity checks")
+    p.add_argument("--output", default=None, help="Write episode JSON lines here instead of stdout")
+    p.add_argument("--post", action="store_true", help="Also persist episodes to the backend (BACKEND_BASE_URL)")
+    p.add_argument("--post-timeout", type=float, default=60.0, help="Seconds to wait for queued posts at the end (default 60)")
+    p.add_argument("--quiet", action="store_true", help="Do not print episodes to stdout")
+    p.set_defaults(func=_cmd_analyze)
+
+    args = parser.parse_args(argv)
+    return int(args.func(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,630 @@
+"""ai_engine.persistence_client
+
+Asynchronous, pooled, batched delivery of AI results to the backend.
+
+`BackendPersistenceClient` replaces "one `urlopen` per payload" on the fast
+loop's persistence path:
+
+- keep-alive HTTP connections, reused from a small pool (no TCP/TLS setup per post)
+- an in-memory queue bounded by `max_queue`; overflow is spooled to a JSONL file
+  when a spool directory is configured, otherwise dropped and counted
+- micro-batching per trip: episode start/end payloads queued within
+  `batch_interval_s` (or up to `batch_max`) go out as one request to
+  `/trips/<id>/ai-results/batch` or `/events/batch`
+- the active-trip check runs once per batch against the cached
+  `trip_registry` snapshot instead of one GET per payload
+- retry with exponential backoff on transport errors, 429 and 5xx; batches for
+  one trip are delivered in order (one in flight per trip)
+- SOS events skip batching and are delivered ahead of queued episodes; they are
+  never dropped for queue size or retry count
+
+Backends without the batch routes get per-payload posts over the same pooled
+connections (detected once from a non-JSON 404/405 response).
+
+Usage:
+    client = get_persistence_client()
+    client.enqueue(payloads)      # episode start/end payloads
+    client.enqueue_sos(payload)
+    client.flush(timeout_s=10.0)  # e.g. before exiting a batch job
+"""
+
+from __future__ import annotations
+
+import atexit
+import http.client
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from metrics import observe_queue_wait
+from structured_log import get_logger
+from trip_registry import ActiveTripRegistry, get_active_trip_registry
+
+_log = get_logger("persistence")
+
+
+BACKEND_BASE_URL = os.getenv("BACKEND_BASE_URL", "http://localhost:5000")
+NO_ACTIVE_TRIP_ID = os.getenv("NO_ACTIVE_TRIP_ID", "NO_ACTIVE_TRIP")
+
+BACKEND_CLIENT_WORKERS = int(os.getenv("BACKEND_CLIENT_WORKERS", "2"))
+BACKEND_CLIENT_POOL_SIZE = int(os.getenv("BACKEND_CLIENT_POOL_SIZE", "4"))
+BACKEND_CLIENT_TIMEOUT_S = float(os.getenv("BACKEND_CLIENT_TIMEOUT_S", "5.0"))
+BACKEND_QUEUE_MAX = int(os.getenv("BACKEND_QUEUE_MAX", "5000"))
+BACKEND_BATCH_MAX = int(os.getenv("BACKEND_BATCH_MAX", "50"))
+BACKEND_BATCH_INTERVAL_MS = float(os.getenv("BACKEND_BATCH_INTERVAL_MS", "250"))
+BACKEND_RETRY_MAX = int(os.getenv("BACKEND_RETRY_MAX", "5"))
+BACKEND_RETRY_BACKOFF_S = float(os.getenv("BACKEND_RETRY_BACKOFF_S", "0.5"))
+BACKEND_RETRY_BACKOFF_MAX_S = float(os.getenv("BACKEND_RETRY_BACKOFF_MAX_S", "30.0"))
+BACKEND_SPOOL_DIR = os.getenv("BACKEND_SPOOL_DIR", "").strip()
+
+_SPOOL_FILENAME = "backend_spool.jsonl"
+
+
+class _Retry(Exception):
+    """Delivery failed in a way worth retrying (transport error, 429, 5xx)."""
+
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+        self.delivered = 0  # payloads of the failed request sequence already accepted
+
+
+class _ConnectionPool:
+    """Keep-alive `http.client` connections to one backend origin."""
+
+    def __init__(self, base_url: str, *, size: int, timeout_s: float) -> None:
+        parts = urlsplit(base_url)
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname or "localhost"
+        self._port = parts.port
+        self._prefix = parts.path.rstrip("/")
+        self._size = max(1, int(size))
+        self._timeout_s = float(timeout_s)
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def _acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop(), True
+            self.created += 1
+        cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        return cls(self._host, self._port, timeout=self._timeout_s), False
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if len(self._idle) < self._size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method: str, path: str, body: Optional[Any] = None) -> Tuple[int, bytes]:
+        """Send one request; returns (status, body). Raises OSError/HTTPException on transport errors."""
+        data = None if body is None else json.dumps(body, default=str).encode("utf-8")
+        headers = {"Connection": "keep-alive"}
+        if data is not None:
+            headers["Content-Type"] = "application/json"
+
+        for attempt in range(2):
+            conn, reused = self._acquire()
+            try:
+                conn.request(method, f"{self._prefix}{path}", body=data, headers=headers)
+                resp = conn.getresponse()
+                payload = resp.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                # An idle keep-alive connection may have been closed by the server; retry once fresh.
+                if reused and attempt == 0:
+                    continue
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            return int(resp.status), payload
+        raise http.client.HTTPException("unreachable")
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class BackendPersistenceClient:
+    """Background, batched delivery of episode and SOS payloads to the backend."""
+
+    def __init__(
+        self,
+        base_url: str = BACKEND_BASE_URL,
+        *,
+        no_active_trip_id: str = NO_ACTIVE_TRIP_ID,
+        workers: int = BACKEND_CLIENT_WORKERS,
+        pool_size: int = BACKEND_CLIENT_POOL_SIZE,
+        timeout_s: float = BACKEND_CLIENT_TIMEOUT_S,
+        max_queue: int = BACKEND_QUEUE_MAX,
+        batch_max: int = BACKEND_BATCH_MAX,
+        batch_interval_s: float = BACKEND_BATCH_INTERVAL_MS / 1000.0,
+        max_retries: int = BACKEND_RETRY_MAX,
+        backoff_s: float = BACKEND_RETRY_BACKOFF_S,
+        backoff_max_s: float = BACKEND_RETRY_BACKOFF_MAX_S,
+        spool_dir: Optional[str] = BACKEND_SPOOL_DIR or None,
+        trip_registry: Optional[ActiveTripRegistry] = None,
+    ) -> None:
+        self.base_url = str(base_url).rstrip("/")
+        self.no_active_trip_id = str(no_active_trip_id)
+        if trip_registry is None:
+            same_backend = self.base_url == BACKEND_BASE_URL.rstrip("/")
+            trip_registry = get_active_trip_registry() if same_backend else ActiveTripRegistry(self.base_url)
+        self._trip_registry = trip_registry
+        self._pool = _ConnectionPool(self.base_url, size=pool_size, timeout_s=timeout_s)
+        self._workers = max(1, int(workers))
+        self._max_queue = max(1, int(max_queue))
+        self._batch_max = max(1, int(batch_max))
+        self._batch_interval_s = max(0.0, float(batch_interval_s))
+        self._max_retries = max(0, int(max_retries))
+        self._backoff_s = max(0.01, float(backoff_s))
+        self._backoff_max_s = max(self._backoff_s, float(backoff_max_s))
+
+        self._spool_path: Optional[str] = None
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+            self._spool_path = os.path.join(spool_dir, _SPOOL_FILENAME)
+        self._spool_lock = threading.Lock()
+        self._spool_pending = bool(self._spool_path and os.path.exists(self._spool_path))
+        self._unspool_after = 0.0
+
+        # trip key -> {"items": deque, "first_at", "not_before", "attempts", "inflight"}
+        self._trips: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._sos: Deque[Dict[str, Any]] = deque()
+        self._queued = 0
+        self._inflight = 0
+        self._closing = False
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+        # Batch routes are assumed present until the backend answers with a routing 404/405.
+        self._batch_routes = {"trip": True, "events": True}
+
+        self._counts = {
+            "enqueued": 0,
+            "sent": 0,
+            "requests": 0,
+            "batches": 0,
+            "retries": 0,
+            "rerouted": 0,
+            "rejected": 0,
+            "dropped": 0,
+            "spooled": 0,
+            "unspooled": 0,
+            "sos_sent": 0,
+        }
+        self._last_error: Optional[str] = None
+
+    # -- producer side ---------------------------------------------------
+
+    def _ensure_started(self) -> None:
+        # Called with the condition held; workers start on first enqueue.
+        if self._threads:
+            return
+        for idx in range(self._workers):
+            t = threading.Thread(target=self._worker_loop, daemon=True, name=f"backend-client-{idx}")
+            t.start()
+            self._threads.append(t)
+
+    def _trip_key(self, payload: Dict[str, Any]) -> str:
+        return str(payload.get("trip_id") or "").strip() or self.no_active_trip_id
+
+    def _enqueue_locked(self, payload: Dict[str, Any], *, now: float) -> None:
+        key = self._trip_key(payload)
+        entry = self._trips.get(key)
+        if entry is None:
+            entry = {"items": deque(), "first_at": now, "not_before": 0.0, "attempts": 0, "inflight": False}
+            self._trips[key] = entry
+        if not entry["items"]:
+            entry["first_at"] = now
+        entry["items"].append(payload)
+        self._queued += 1
+
+    def enqueue(self, payloads: Iterable[Dict[str, Any]]) -> int:
+        """Queue episode payloads for delivery. Returns how many were kept (queued or spooled)."""
+        overflow: List[Dict[str, Any]] = []
+        kept = 0
+        with self._cond:
+            self._ensure_started()
+            now = time.monotonic()
+            for payload in payloads:
+                payload = dict(payload)
+                self._counts["enqueued"] += 1
+                if self._queued >= self._max_queue:
+                    overflow.append(payload)
+                    continue
+                self._enqueue_locked(payload, now=now)
+                kept += 1
+            self._cond.notify_all()
+
+        if overflow:
+            if self._spool(overflow, kind="result"):
+                kept += len(overflow)
+            else:
+                with self._cond:
+                    self._counts["dropped"] += len(overflow)
+                _log.warning("backend persistence queue full; dropped %s episode payload(s)", len(overflow))
+        return kept
+
+    def enqueue_sos(self, payload: Dict[str, Any]) -> None:
+        """Queue an SOS event; delivered ahead of episode batches and never dropped."""
+        with self._cond:
+            self._ensure_started()
+            self._sos.append({"payload": dict(payload), "not_before": 0.0, "attempts": 0})
+            self._cond.notify_all()
+
+    # -- worker side -----------------------------------------------------
+
+    def _next_job_locked(self, now: float) -> Tuple[Optional[Tuple[str, Any, Any]], Optional[float]]:
+        """Pick the next deliverable job, or return how long to wait for one."""
+        wait_s: Optional[float] = None
+
+        if self._sos:
+            job = self._sos[0]
+            if job["not_before"] <= now:
+                self._sos.popleft()
+                return ("sos", None, job), None
+            wait_s = job["not_before"] - now
+
+        for key, entry in self._trips.items():
+            if entry["inflight"] or not entry["items"]:
+                continue
+            if entry["not_before"] > now:
+                remaining = entry["not_before"] - now
+                wait_s = remaining if wait_s is None else min(wait_s, remaining)
+                continue
+            due = entry["first_at"] + self._batch_interval_s
+            if self._closing or len(entry["items"]) >= self._batch_max or due <= now:
+                items = [entry["items"].popleft() for _ in range(min(self._batch_max, len(entry["items"])))]
+                entry["inflight"] = True
+                self._queued -= len(items)
+                if not entry["attempts"]:
+                    observe_queue_wait("backend_persistence", now - entry["first_at"])
+                return ("batch", key, items), None
+            wait_s = (due - now) if wait_s is None else min(wait_s, due - now)
+
+        return None, wait_s
+
+    def _worker_loop(self) -> None:
+        while True:
+            self._maybe_unspool()
+            with self._cond:
+                job, wait_s = self._next_job_locked(time.monotonic())
+                if job is None:
+                    self._cond.wait(timeout=wait_s if wait_s is not None else 1.0)
+                    continue
+                self._inflight += 1
+
+            kind, key, data = job
+            try:
+                if kind == "sos":
+                    self._run_sos(data)
+                else:
+                    self._run_batch(key, data)
+            except Exception as e:
+                _log.warning("backend persistence job failed: %s", e)
+            finally:
+                with self._cond:
+                    self._inflight -= 1
+                    self._cond.notify_all()
+
+    def _backoff(self, attempts: int) -> float:
+        return min(self._backoff_max_s, self._backoff_s * (2 ** max(0, attempts - 1)))
+
+    def _run_batch(self, key: str, items: List[Dict[str, Any]]) -> None:
+        failed = False
+        try:
+            self._deliver_batch(key, items)
+        except _Retry as e:
+            failed = True
+            items = list(getattr(e, "remaining", items))
+            self._last_error = str(e)
+        except Exception as e:
+            # Not a transport problem (e.g. a payload that cannot be serialized): a
+            # retry would fail the same way, so the batch counts as rejected.
+            self._last_error = f"{type(e).__name__}: {e}"
+            with self._cond:
+                self._counts["rejected"] += len(items)
+            _log.warning("backend persistence could not deliver %s payload(s) trip_id=%s: %s", len(items), key, self._last_error)
+        finally:
+            # Always clear `inflight`, or the trip would never be scheduled again.
+            items = self._finish_batch(key, failed, items)
+
+        if items:
+            # Payloads that exhausted their retries rest in the spool for a full backoff period.
+            self._unspool_after = time.monotonic() + self._backoff_max_s
+            if not self._spool(items, kind="result"):
+                with self._cond:
+                    self._counts["dropped"] += len(items)
+                _log.warning("backend persistence gave up on %s payload(s) trip_id=%s: %s", len(items), key, self._last_error)
+
+    def _finish_batch(self, key: str, failed: bool, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Update the trip entry after a delivery attempt; returns payloads that exhausted their retries."""
+        with self._cond:
+            entry = self._trips.get(key)
+            if entry is None:
+                return []
+            entry["inflight"] = False
+            if not failed:
+                entry["attempts"] = 0
+                entry["not_before"] = 0.0
+                items = []
+            else:
+                entry["attempts"] += 1
+                if entry["attempts"] <= self._max_retries:
+                    # Put the undelivered payloads back in front so the trip's events stay in order.
+                    entry["items"].extendleft(reversed(items))
+                    self._queued += len(items)
+                    entry["not_before"] = time.monotonic() + self._backoff(entry["attempts"])
+                    self._counts["retries"] += 1
+                    items = []
+                else:
+                    entry["attempts"] = 0
+                    entry["not_before"] = 0.0
+            if not entry["items"] and not entry["inflight"]:
+                del self._trips[key]
+            self._cond.notify_all()
+        return items
+
+    def _run_sos(self, job: Dict[str, Any]) -> None:
+        try:
+            self._deliver_sos(dict(job["payload"]))
+            with self._cond:
+                self._counts["sos_sent"] += 1
+        except _Retry as e:
+            self._last_error = str(e)
+            with self._cond:
+                job["attempts"] += 1
+                job["not_before"] = time.monotonic() + self._backoff(job["attempts"])
+                self._counts["retries"] += 1
+                self._sos.append(job)
+                self._cond.notify_all()
+        except Exception as e:
+            self._last_error = f"{type(e).__name__}: {e}"
+            with self._cond:
+                self._counts["rejected"] += 1
+            _log.warning("backend persistence could not deliver SOS: %s", self._last_error)
+
+    # -- delivery --------------------------------------------------------
+
+    def _post(self, path: str, body: Any) -> Tuple[int, bytes]:
+        try:
+            status, data = self._pool.request("POST", path, body)
+        except (OSError, http.client.HTTPException) as e:
+            raise _Retry(f"POST {path}: {e}") from e
+        with self._cond:
+            self._counts["requests"] += 1
+        if status == 429 or status >= 500:
+            raise _Retry(f"POST {path}: backend returned {status}")
+        return status, data
+
+    def _check_trip_active(self, trip_id: str) -> bool:
+        """One cached registry check per batch (see trip_registry)."""
+        if trip_id == self.no_active_trip_id:
+            return False
+        return self._trip_registry.is_active(trip_id)
+
+    def _as_background(self, payload: Dict[str, Any], *, is_sos: Optional[bool] = None) -> Dict[str, Any]:
+        # Never leak an inactive/stale trip_id into background events.
+        out = dict(payload)
+        out["trip_id"] = self.no_active_trip_id
+        out["is_sos"] = bool(out.get("sos_triggered", False)) if is_sos is None else is_sos
+        return out
+
+    def _send_items(self, kind: str, path: str, items: List[Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]]]:
+        """POST items to `path` (batch route when available). Returns (status, unsent items)."""
+        if len(items) > 1 and self._batch_routes[kind]:
+            status, data = self._post(f"{path}/batch", {"events": items})
+            routing_miss = status in (404, 405) and not data.lstrip().startswith(b"{")
+            if not routing_miss:
+                if 200 <= status < 300:
+                    with self._cond:
+                        self._counts["batches"] += 1
+                    return status, []
+                return status, items
+            _log.warning("backend has no %s/batch route; falling back to per-event posts", path)
+            self._batch_routes[kind] = False
+
+        for idx, item in enumerate(items):
+            try:
+                status, _ = self._post(path, item)
+            except _Retry as e:
+                e.delivered = idx
+                raise
+            if status == 409 or not (200 <= status < 300):
+                return status, items[idx:]
+        return 200, []
+
+    def _deliver_batch(self, key: str, items: List[Dict[str, Any]]) -> None:
+        """Deliver one trip's batch. On `_Retry`, `remaining` holds the undelivered payloads."""
+        offset = 0
+        try:
+            if self._check_trip_active(key):
+                status, unsent = self._send_items("trip", f"/trips/{quote(key, safe='')}/ai-results", items)
+                self._count_sent(len(items) - len(unsent))
+                if not unsent:
+                    return
+                if status != 409:
+                    self._reject(status, unsent, key)
+                    return
+                # Trip ended between the check and the post: store under global events instead.
+                with self._cond:
+                    self._counts["rerouted"] += len(unsent)
+                offset = len(items) - len(unsent)
+
+            background = [self._as_background(p) for p in items[offset:]]
+            status, unsent = self._send_items("events", "/events", background)
+            self._count_sent(len(background) - len(unsent))
+            if unsent:
+                self._reject(status, unsent, key)
+        except _Retry as e:
+            self._count_sent(e.delivered)
+            e.remaining = items[offset + e.delivered:]  # type: ignore[attr-defined]
+            raise
+
+    def _deliver_sos(self, payload: Dict[str, Any]) -> None:
+        trip_id = self._trip_key(payload)
+        if self._check_trip_active(trip_id):
+            status, _ = self._post(f"/trips/{quote(trip_id, safe='')}/sos", payload)
+        else:
+            status, _ = self._post("/events", self._as_background(payload, is_sos=True))
+        if not (200 <= status < 300):
+            self._reject(status, [payload], trip_id)
+
+    def _count_sent(self, n: int) -> None:
+        if n > 0:
+            with self._cond:
+                self._counts["sent"] += n
+
+    def _reject(self, status: int, items: List[Dict[str, Any]], key: str) -> None:
+        # 4xx other than 409/429 will not succeed on retry.
+        with self._cond:
+            self._counts["rejected"] += len(items)
+        self._last_error = f"backend returned {status}"
+        _log.warning("backend rejected %s payload(s) trip_id=%s: status=%s", len(items), key, status)
+
+    # -- disk spool ------------------------------------------------------
+
+    def _spool(self, payloads: List[Dict[str, Any]], *, kind: str) -> bool:
+        if not self._spool_path:
+            return False
+        try:
+            with self._spool_lock:
+                with open(self._spool_path, "a", encoding="utf-8") as f:
+                    for payload in payloads:
+                        f.write(json.dumps({"kind": kind, "payload": payload}, default=str) + "\n")
+                self._spool_pending = True
+        except OSError as e:
+            _log.warning("backend spool write failed: %s", e)
+            return False
+        with self._cond:
+            self._counts["spooled"] += len(payloads)
+        return True
+
+    def _maybe_unspool(self) -> None:
+        """Move spooled payloads back into memory once the queue has drained to half."""
+        if not self._spool_pending or self._closing or time.monotonic() < self._unspool_after:
+            return
+        with self._cond:
+            room = self._max_queue // 2 - self._queued
+        if room <= 0:
+            return
+
+        with self._spool_lock:
+            if not self._spool_pending:
+                return
+            draining = f"{self._spool_path}.{uuid.uuid4().hex}.draining"
+            try:
+                os.replace(self._spool_path, draining)
+                with open(draining, "r", encoding="utf-8") as f:
+                    lines = [line for line in f if line.strip()]
+                os.remove(draining)
+            except FileNotFoundError:
+                self._spool_pending = False
+                return
+            except OSError as e:
+                _log.warning("backend spool read failed: %s", e)
+                return
+            take, rest = lines[:room], lines[room:]
+            if rest:
+                with open(self._spool_path, "a", encoding="utf-8") as f:
+                    f.writelines(rest)
+            self._spool_pending = bool(rest)
+
+        results: List[Dict[str, Any]] = []
+        sos: List[Dict[str, Any]] = []
+        for line in take:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            (sos if record.get("kind") == "sos" else results).append(record.get("payload") or {})
+
+        with self._cond:
+            now = time.monotonic()
+            for payload in results:
+                self._enqueue_locked(payload, now=now)
+            for payload in sos:
+                self._sos.append({"payload": payload, "not_before": 0.0, "attempts": 0})
+            self._counts["unspooled"] += len(results) + len(sos)
+            self._cond.notify_all()
+
+    # -- lifecycle -------------------------------------------------------
+
+    def flush(self, timeout_s: float = 10.0) -> bool:
+        """Send everything queued now (ignoring the batch interval). True when drained in time."""
+        deadline = time.monotonic() + max(0.0, float(timeout_s))
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            try:
+                while self._queued or self._sos or self._inflight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(timeout=min(remaining, 0.1))
+                return True
+            finally:
+                self._closing = False
+
+    def close(self, timeout_s: float = 5.0) -> None:
+        """Flush, then spool whatever is still queued (if spooling is enabled)."""
+        if not self.flush(timeout_s=timeout_s):
+            with self._cond:
+                leftover = [p for entry in self._trips.values() for p in entry["items"]]
+                sos = [job["payload"] for job in self._sos]
+                for entry in self._trips.values():
+                    entry["items"].clear()
+                self._sos.clear()
+                self._queued = 0
+            if self._spool(leftover, kind="result") and self._spool(sos, kind="sos"):
+                _log.info("spooled %s undelivered payload(s)", len(leftover) + len(sos))
+            elif leftover or sos:
+                _log.warning("backend persistence exiting with %s undelivered payload(s)", len(leftover) + len(sos))
+        self._pool.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "base_url": self.base_url,
+                "workers": self._workers,
+                "max_queue": self._max_queue,
+                "queue_length": self._queued,
+                "sos_queue_length": len(self._sos),
+                "trips_queued": sum(1 for e in self._trips.values() if e["items"]),
+                "inflight": self._inflight,
+                "batch_max": self._batch_max,
+                "batch_interval_ms": round(self._batch_interval_s * 1000.0, 1),
+                "batch_routes": dict(self._batch_routes),
+                "spool_path": self._spool_path,
+                "spool_pending": self._spool_pending,
+                "connections": {"created": self._pool.created, "reused": self._pool.reused},
+                **self._counts,
+                "last_error": self._last_error,
+            }
+
+
+_persistence_client: Optional[BackendPersistenceClient] = None
+_persistence_client_lock = threading.Lock()
+
+
+def get_persistence_client() -> BackendPersistenceClient:
+    global _persistence_client
+    with _persistence_client_lock:
+        if _persistence_client is None:
+            _persistence_client = BackendPersistenceClient()
+            atexit.register(_persistence_client.close)
+        return _persistence_client
@@ -15,6 +15,8 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional
 
+from session_registry import get_session_registry
+
 
 def _to_float(value: Any, default: float = 0.0) -> float:
     try:
@@ -102,8 +104,7 @@ class RiskEngine:
         return self._get_or_create(trip_id).as_dict()
 
     def reset_trip(self, *, trip_id: str) -> None:
-        if trip_id in self._counters:
-            del self._counters[trip_id]
+        self._counters.pop(trip_id, None)
 
     def compute(
         self,
@@ -330,5 +331,12 @@ _risk_engine_singleton: Optional[RiskEngine] = None
 def get_risk_engine() -> RiskEngine:
     global _risk_engine_singleton
     if _risk_engine_singleton is None:
-        _risk_engine_singleton = RiskEngine()
+        engine = RiskEngine()
+        get_session_registry().register_owner(
+            "risk_counters",
+            scope="trip",
+            release=lambda trip_id: engine.reset_trip(trip_id=trip_id),
+            lookup=engine._counters.get,
+        )
+        _risk_engine_singleton = engine
     return _risk_engine_singleton
@@ -0,0 +1,384 @@
+"""ai_engine.session_registry
+
+One place that decides how long per-session state lives.
+
+The engines keep their own per-session dictionaries (risk counters, alert
+cooldowns, emotion smoothing, temporal behavior buffers, identity sessions,
+tracking landmarkers, ...). Each engine registers an *owner* here: a release
+hook, plus an optional lookup used for memory accounting. The registry tracks
+which sessions are alive and tears every owner down together:
+
+- `touch(session_key, trip=..., driver=...)` is called once per frame. It is
+  O(1): the session moves to the tail of an LRU `OrderedDict`.
+- Sessions idle for longer than `SESSION_IDLE_TTL_S` are evicted by an
+  incremental sweep from the LRU head. The sweep runs at most every
+  `SESSION_SWEEP_INTERVAL_S` on the calling thread and stops at the first
+  live session.
+- When more than `SESSION_MAX` sessions are alive, the least recently used
+  ones are evicted.
+- `end_session(session_key)` is the single teardown hook (trip complete / reset).
+
+Owner scopes:
+
+- `session`: keyed by the session key (`trip_id`, or `driver:<id>` for
+  trip-less frames).
+- `trip`: keyed by the trip id used for risk counters and alert cooldowns.
+- `driver`: keyed by driver id (temporal behavior state, thresholds).
+
+Trip- and driver-scoped state can be shared by several sessions. It is released
+only when the last session that referenced the key goes away.
+
+Release hooks run outside the registry lock. They must be cheap and must not
+call back into the registry.
+
+`ExpiryHeap` gives the engines' own idle timeouts (behavior drivers, driver
+sessions, calibration sessions) O(1) amortized per-frame cost instead of a scan
+of every entry.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field, fields, is_dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from structured_log import get_logger
+
+_log = get_logger("sessions")
+
+
+SESSION_IDLE_TTL_S = float(os.getenv("SESSION_IDLE_TTL_S", "1800"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "5000"))
+SESSION_SWEEP_INTERVAL_S = float(os.getenv("SESSION_SWEEP_INTERVAL_S", "5"))
+
+SCOPES = ("session", "trip", "driver")
+
+
+def approx_size(obj: Any, *, max_depth: int = 8) -> int:
+    """Approximate retained bytes of `obj`.
+
+    Walks containers, dataclasses and NumPy arrays (by `nbytes`). Any other
+    object counts with its shallow size, so native handles (landmarkers, ONNX
+    sessions) are not followed. Shared objects are counted once.
+    """
+    seen: Set[int] = set()
+    total = 0
+    stack: List[Tuple[Any, int]] = [(obj, 0)]
+    while stack:
+        item, depth = stack.pop()
+        if item is None or id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, np.ndarray):
+            total += sys.getsizeof(item) + (int(item.nbytes) if item.base is None else 0)
+            continue
+        try:
+            total += sys.getsizeof(item)
+        except TypeError:
+            continue
+        if depth >= max_depth:
+            continue
+        if isinstance(item, dict):
+            for k, v in item.items():
+                stack.append((k, depth + 1))
+                stack.append((v, depth + 1))
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            stack.extend((v, depth + 1) for v in item)
+        elif is_dataclass(item) and not isinstance(item, type):
+            stack.extend((getattr(item, f.name, None), depth + 1) for f in fields(item))
+    return total
+
+
+class ExpiryHeap:
+    """Idle-timeout queue: a min-heap of `last_seen + ttl` deadlines, one entry per key.
+
+    The owner keeps the authoritative last-seen time. `last_seen(key)` reads it
+    and returns None once the key is gone. Activity does not touch the heap.
+    When a deadline comes up, the entry is checked against the current
+    last-seen time. It is then either expired or pushed back with its real
+    deadline. So `pop_expired` costs O(1) when nothing is due, and each key is
+    re-pushed at most once per TTL.
+    """
+
+    def __init__(self, ttl_s: float, last_seen: Callable[[Hashable], Optional[float]]) -> None:
+        self._ttl_s = float(ttl_s)
+        self._last_seen = last_seen
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._scheduled: Set[Hashable] = set()
+        self._seq = itertools.count()  # tie-break: keys need not be comparable
+        self._lock = threading.Lock()
+
+    def schedule(self, key: Hashable, last_seen: float) -> None:
+        """Track `key` (no-op if it is already tracked); call when an entry is created."""
+        if self._ttl_s <= 0:
+            return
+        with self._lock:
+            if key in self._scheduled:
+                return
+            self._scheduled.add(key)
+            heapq.heappush(self._heap, (float(last_seen) + self._ttl_s, next(self._seq), key))
+
+    def pop_expired(self, now: float) -> List[Hashable]:
+        """Keys idle for longer than the TTL at `now`; they are no longer tracked."""
+        out: List[Hashable] = []
+        if self._ttl_s <= 0:
+            return out
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] < now:
+                _, _, key = heapq.heappop(heap)
+                seen = self._last_seen(key)
+                if seen is None:
+                    self._scheduled.discard(key)
+                elif (now - float(seen)) > self._ttl_s:
+                    self._scheduled.discard(key)
+                    out.append(key)
+                else:
+                    heapq.heappush(heap, (float(seen) + self._ttl_s, next(self._seq), key))
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heap.clear()
+            self._scheduled.clear()
+
+    def __len__(self) -> int:
+        return len(self._scheduled)
+
+
+@dataclass
+class _Owner:
+    name: str
+    scope: str
+    release: Callable[[str], None]
+    lookup: Optional[Callable[[str], Any]] = None
+
+
+@dataclass
+class SessionEntry:
+    session_key: str
+    created_at: float
+    last_seen: float  # monotonic
+    frames: int = 0
+    keys: Dict[str, Set[str]] = field(default_factory=dict)  # scope -> keys referenced by this session
+
+
+class SessionRegistry:
+    """LRU + idle-TTL registry of live sessions with per-owner teardown."""
+
+    def __init__(
+        self,
+        *,
+        idle_ttl_s: float = SESSION_IDLE_TTL_S,
+        max_sessions: int = SESSION_MAX,
+        sweep_interval_s: float = SESSION_SWEEP_INTERVAL_S,
+    ) -> None:
+        self._idle_ttl_s = float(idle_ttl_s)
+        self._max_sessions = max(1, int(max_sessions))
+        self._sweep_interval_s = max(0.0, float(sweep_interval_s))
+
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, SessionEntry]" = OrderedDict()
+        self._refs: Dict[Tuple[str, str], int] = {}
+        self._owners: Dict[str, _Owner] = {}
+        self._next_sweep = 0.0
+
+        self._counts = {"created": 0, "ended": 0, "evicted_idle": 0, "evicted_lru": 0, "release_errors": 0}
+
+    def register_owner(
+        self,
+        name: str,
+        *,
+        release: Callable[[str], None],
+        lookup: Optional[Callable[[str], Any]] = None,
+        scope: str = "session",
+    ) -> None:
+        """Register per-session state to tear down (re-registering `name` replaces it)."""
+        if scope not in SCOPES:
+            raise ValueError(f"unknown session scope: {scope}")
+        with self._lock:
+            self._owners[name] = _Owner(name=name, scope=scope, release=release, lookup=lookup)
+
+    def touch(self, session_key: str, *, now: Optional[float] = None, **keys: Optional[str]) -> None:
+        """Mark a session as used; `keys` are the trip/driver keys this frame used."""
+        mono = float(now if now is not None else time.monotonic())
+        session_key = str(session_key)
+        victims: List[Tuple[SessionEntry, str]] = []
+        with self._lock:
+            entry = self._sessions.get(session_key)
+            if entry is None:
+                entry = SessionEntry(session_key=session_key, created_at=time.time(), last_seen=mono)
+                self._sessions[session_key] = entry
+                self._counts["created"] += 1
+            else:
+                self._sessions.move_to_end(session_key)
+                entry.last_seen = mono
+            entry.frames += 1
+            for scope, key in keys.items():
+                if not key:
+                    continue
+                key = str(key)
+                held = entry.keys.setdefault(scope, set())
+                if key not in held:
+                    held.add(key)
+                    self._refs[(scope, key)] = self._refs.get((scope, key), 0) + 1
+
+            while len(self._sessions) > self._max_sessions:
+                _, lru = self._sessions.popitem(last=False)
+                victims.append((lru, "evicted_lru"))
+            if mono >= self._next_sweep:
+                self._next_sweep = mono + self._sweep_interval_s
+                victims.extend((e, "evicted_idle") for e in self._pop_idle_locked(mono))
+            released = self._unref_locked(victims)
+        self._release(released)
+
+    def end_session(self, session_key: str) -> bool:
+        """Tear down all state of a session now. Returns False if it was not tracked."""
+        session_key = str(session_key)
+        with self._lock:
+            entry = self._sessions.pop(session_key, None)
+            if entry is not None:
+                released = self._unref_locked([(entry, "ended")])
+            else:
+                # Not tracked (never touched, or already evicted): still drop what
+                # owners may hold under this key.
+                self._counts["ended"] += 1
+                released = [(o, session_key) for o in self._owners.values() if o.scope == "session"]
+                if self._refs.get(("trip", session_key), 0) == 0:
+                    released += [(o, session_key) for o in self._owners.values() if o.scope == "trip"]
+        self._release(released)
+        return entry is not None
+
+    def reset_session(self, session_key: str) -> None:
+        """Release only session-scoped state; the session stays tracked and its
+        trip/driver state (risk counters, behavior buffers) is kept."""
+        session_key = str(session_key)
+        with self._lock:
+            released = [(o, session_key) for o in self._owners.values() if o.scope == "session"]
+        self._release(released)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Evict idle sessions now; returns how many were evicted."""
+        mono = float(now if now is not None else time.monotonic())
+        with self._lock:
+            victims = [(e, "evicted_idle") for e in self._pop_idle_locked(mono)]
+            released = self._unref_locked(victims)
+        self._release(released)
+        return len(victims)
+
+    def _pop_idle_locked(self, mono: float) -> List[SessionEntry]:
+        if self._idle_ttl_s <= 0:
+            return []
+        out: List[SessionEntry] = []
+        # LRU order == last_seen order, so stop at the first session still in use.
+        while self._sessions:
+            entry = next(iter(self._sessions.values()))
+            if (mono - entry.last_seen) <= self._idle_ttl_s:
+                break
+            self._sessions.popitem(last=False)
+            out.append(entry)
+        return out
+
+    def _unref_locked(self, victims: List[Tuple[SessionEntry, str]]) -> List[Tuple[_Owner, str]]:
+        """Drop the victims' key references; return the (owner, key) releases due."""
+        if not victims:
+            return []
+        by_scope: Dict[str, List[_Owner]] = {}
+        for owner in self._owners.values():
+            by_scope.setdefault(owner.scope, []).append(owner)
+
+        released: List[Tuple[_Owner, str]] = []
+        for entry, reason in victims:
+            self._counts[reason] += 1
+            released.extend((o, entry.session_key) for o in by_scope.get("session", []))
+            for scope, held in entry.keys.items():
+                for key in held:
+                    ref = (scope, key)
+                    n = self._refs.get(ref, 0) - 1
+                    if n > 0:
+                        self._refs[ref] = n
+                        continue
+                    self._refs.pop(ref, None)
+                    released.extend((o, key) for o in by_scope.get(scope, []))
+        return released
+
+    def _release(self, released: List[Tuple[_Owner, str]]) -> None:
+        for owner, key in released:
+            try:
+                owner.release(key)
+            except Exception as e:
+                with self._lock:
+                    self._counts["release_errors"] += 1
+                _log.warning("session release %s(%s) failed: %s", owner.name, key, e)
+
+    def describe(self, session_key: str) -> Optional[Dict[str, Any]]:
+        """Session metadata with approximate bytes held by each owner."""
+        session_key = str(session_key)
+        with self._lock:
+            entry = self._sessions.get(session_key)
+            if entry is None:
+                return None
+            keys = {scope: sorted(held) for scope, held in entry.keys.items()}
+            info: Dict[str, Any] = {
+                "session_key": entry.session_key,
+                "created_at": entry.created_at,
+                "idle_s": round(time.monotonic() - entry.last_seen, 3),
+                "frames": entry.frames,
+                "keys": keys,
+            }
+            owners = list(self._owners.values())
+
+        memory: Dict[str, int] = {}
+        for owner in owners:
+            if owner.lookup is None:
+                continue
+            lookup_keys = [session_key] if owner.scope == "session" else keys.get(owner.scope, [])
+            size = 0
+            for key in lookup_keys:
+                try:
+                    size += approx_size(owner.lookup(key))
+                except Exception:
+                    continue
+            memory[owner.name] = size
+        info["memory_bytes"] = memory
+        info["total_bytes"] = sum(memory.values())
+        return info
+
+    def largest(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Sessions sorted by approximate memory, largest first (walks every session)."""
+        with self._lock:
+            keys = list(self._sessions.keys())
+        described = [d for d in (self.describe(k) for k in keys) if d is not None]
+        described.sort(key=lambda d: d["total_bytes"], reverse=True)
+        return described[: max(0, int(limit))]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self._max_sessions,
+                "idle_ttl_s": self._idle_ttl_s,
+                "owners": sorted(f"{o.scope}:{o.name}" for o in self._owners.values()),
+                **self._counts,
+            }
+
+
+_session_registry_singleton: Optional[SessionRegistry] = None
+_session_registry_lock = threading.Lock()
+
+
+def get_session_registry() -> SessionRegistry:
+    global _session_registry_singleton
+    if _session_registry_singleton is None:
+        with _session_registry_lock:
+            if _session_registry_singleton is None:
+                _session_registry_singleton = SessionRegistry()
+    return _session_registry_singleton
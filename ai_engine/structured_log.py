@@ -0,0 +1,182 @@
+"""ai_engine.structured_log
+
+Structured, queue-backed logging for the AI engine.
+
+Replaces `print()` on the request path:
+
+- every module logs through `get_logger("<engine>")` (a child of the
+  `ai_engine` logger); records are put on a bounded in-memory queue and
+  formatted/written by one background `QueueListener` thread, so the fast loop
+  never blocks on stdout/stderr
+- when the queue is full records are dropped and counted instead of blocking
+- `log_event(logger, level, msg, **fields)` attaches key/value fields, rendered
+  as `key=value` (text) or one JSON object per line (`LOG_FORMAT=json`); it
+  checks the level first, so disabled lines cost one comparison
+- `Sampler(every_n)` lets per-frame debug lines through once every N frames per
+  session (`FRAME_LOG_SAMPLE_N`)
+
+Levels: `LOG_LEVEL` sets the default, `LOG_LEVELS` overrides per engine, e.g.
+`LOG_LEVELS=frame=DEBUG,emotion=WARNING,persistence=INFO`.
+
+Output goes to stderr (stdout stays clean for the CLI tools' JSON output).
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Hashable, Optional
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper() or "INFO"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").strip().lower()
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+FRAME_LOG_SAMPLE_N = int(os.getenv("FRAME_LOG_SAMPLE_N", "30"))
+
+ROOT_LOGGER = "ai_engine"
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Non-blocking queue handler: a full queue drops the record and counts it."""
+
+    def __init__(self, q: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge %-args here (cheap); formatting happens on the listener thread.
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _fields(record: logging.LogRecord) -> Dict[str, Any]:
+    fields = getattr(record, "fields", None)
+    return dict(fields) if isinstance(fields, dict) else {}
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        doc: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        doc.update(_fields(record))
+        if record.exc_info:
+            doc["exc"] = self.formatException(record.exc_info)
+        return json.dumps(doc, default=str)
+
+
+_handler: Optional[_DroppingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+_configure_lock = threading.Lock()
+
+
+def _parse_level(value: str, default: int) -> int:
+    level = logging.getLevelName(str(value).strip().upper())
+    return level if isinstance(level, int) else default
+
+
+def configure_logging() -> None:
+    """Install the queue handler on the `ai_engine` logger (idempotent)."""
+    global _handler, _listener
+    with _configure_lock:
+        if _handler is not None:
+            return
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(_parse_level(LOG_LEVEL, logging.INFO))
+        root.propagate = False
+        for item in LOG_LEVELS.split(","):
+            name, sep, level = item.partition("=")
+            if sep and name.strip():
+                logging.getLogger(f"{ROOT_LOGGER}.{name.strip()}").setLevel(_parse_level(level, logging.INFO))
+
+        stream = logging.StreamHandler(sys.stderr)
+        stream.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+        q: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=max(0, LOG_QUEUE_MAX))
+        _handler = _DroppingQueueHandler(q)
+        _listener = QueueListener(q, stream, respect_handler_level=False)
+        _listener.start()
+        root.addHandler(_handler)
+        # Drain what is still queued when the process exits.
+        atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for one engine/module, e.g. `get_logger("landmark")` -> `ai_engine.landmark`."""
+    configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def log_event(logger: logging.Logger, level: int, msg: str, **fields: Any) -> None:
+    """Log `msg` with structured key/value fields (no work when `level` is disabled)."""
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, extra={"fields": fields})
+
+
+class Sampler:
+    """Lets one in every `every_n` calls per key through (the first call always passes)."""
+
+    def __init__(self, every_n: int) -> None:
+        self._every_n = max(1, int(every_n))
+        self._counts: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: Hashable) -> bool:
+        with self._lock:
+            n = self._counts.get(key, 0)
+            self._counts[key] = n + 1
+            if len(self._counts) > 4096:
+                # Keys are sessions; forget them all rather than grow without bound.
+                self._counts = {key: n + 1}
+        return n % self._every_n == 0
+
+    def forget(self, key: Hashable) -> None:
+        with self._lock:
+            self._counts.pop(key, None)
+
+
+def stats() -> Dict[str, Any]:
+    handler = _handler
+    if handler is None:
+        return {"configured": False}
+    return {
+        "configured": True,
+        "level": logging.getLevelName(logging.getLogger(ROOT_LOGGER).level),
+        "format": LOG_FORMAT,
+        "queue_length": handler.queue.qsize(),
+        "queue_max": LOG_QUEUE_MAX,
+        "dropped": handler.dropped,
+    }
@@ -0,0 +1,157 @@
+"""ai_engine.task_pool
+
+Bounded background executors.
+
+`BoundedExecutor` is a fixed set of daemon worker threads fed from a bounded
+queue. It replaces "one new thread per job" so background work cannot grow
+without limit under fleet load:
+
+- queue-depth limit: once `max_queue` jobs are pending, new jobs are dropped
+  (and counted) instead of piling up
+- per-key coalescing: a job submitted with a `key` replaces that key's job if
+  it is still waiting, so e.g. a session's newest frame wins
+- stats: queue length, submitted/completed/failed/dropped/coalesced counts,
+  queue wait time and run time (last / average / max); waits are also recorded
+  in the `ai_engine_queue_wait_seconds{queue=<name>}` histogram (`metrics.py`)
+
+Used by `app.py` for slow analytics (CPU-bound) and trip-driver resolution,
+and by `driver_session_manager.py` for threshold refreshes, each with its own
+pool. Backend persistence has its own batching client (`persistence_client.py`).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Optional
+
+from metrics import observe_queue_wait
+from structured_log import get_logger
+
+_log = get_logger("task_pool")
+
+
+class BoundedExecutor:
+    """Fixed worker threads over a bounded, coalescing job queue."""
+
+    def __init__(self, name: str, *, workers: int, max_queue: int) -> None:
+        self.name = str(name)
+        self._workers = max(1, int(workers))
+        self._max_queue = max(1, int(max_queue))
+
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._pending_by_key: Dict[Hashable, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._dropped = 0
+        self._coalesced = 0
+        self._running = 0
+        self._wait_ms_last = 0.0
+        self._wait_ms_total = 0.0
+        self._wait_ms_max = 0.0
+        self._run_ms_last = 0.0
+        self._run_ms_total = 0.0
+        self._run_ms_max = 0.0
+
+    def _ensure_started(self) -> None:
+        # Called with the condition held; workers start on first submit.
+        if self._threads:
+            return
+        for idx in range(self._workers):
+            t = threading.Thread(target=self._worker_loop, daemon=True, name=f"{self.name}-{idx}")
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, fn: Callable[..., Any], *, key: Optional[Hashable] = None, **kwargs: Any) -> bool:
+        """Queue `fn(**kwargs)`. Returns False when the job was dropped (queue full).
+
+        With `key`, a still-waiting job for the same key is updated in place
+        (latest arguments win, original queue position and wait clock kept).
+        """
+        with self._cond:
+            self._ensure_started()
+            self._submitted += 1
+
+            if key is not None:
+                pending = self._pending_by_key.get(key)
+                if pending is not None:
+                    pending["fn"] = fn
+                    pending["kwargs"] = kwargs
+                    self._coalesced += 1
+                    return True
+
+            if len(self._queue) >= self._max_queue:
+                self._dropped += 1
+                return False
+
+            job = {"fn": fn, "kwargs": kwargs, "key": key, "queued_at": time.perf_counter()}
+            self._queue.append(job)
+            if key is not None:
+                self._pending_by_key[key] = job
+            self._cond.notify()
+            return True
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.popleft()
+                if job["key"] is not None:
+                    self._pending_by_key.pop(job["key"], None)
+                wait_ms = (time.perf_counter() - float(job["queued_at"])) * 1000.0
+                self._wait_ms_last = wait_ms
+                self._wait_ms_total += wait_ms
+                self._wait_ms_max = max(self._wait_ms_max, wait_ms)
+                self._running += 1
+            observe_queue_wait(self.name, wait_ms / 1000.0)
+
+            started = time.perf_counter()
+            ok = True
+            try:
+                job["fn"](**job["kwargs"])
+            except Exception as e:
+                ok = False
+                _log.warning("%s job failed: %s", self.name, e)
+            run_ms = (time.perf_counter() - started) * 1000.0
+
+            with self._cond:
+                self._running -= 1
+                if ok:
+                    self._completed += 1
+                else:
+                    self._failed += 1
+                self._run_ms_last = run_ms
+                self._run_ms_total += run_ms
+                self._run_ms_max = max(self._run_ms_max, run_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            finished = max(1, self._completed + self._failed)
+            started = max(1, self._completed + self._failed + self._running)
+            return {
+                "workers": self._workers,
+                "max_queue": self._max_queue,
+                "queue_length": len(self._queue),
+                "running": self._running,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "dropped": self._dropped,
+                "coalesced": self._coalesced,
+                "wait_ms": {
+                    "last": round(self._wait_ms_last, 2),
+                    "avg": round(self._wait_ms_total / started, 2),
+                    "max": round(self._wait_ms_max, 2),
+                },
+                "run_ms": {
+                    "last": round(self._run_ms_last, 2),
+                    "avg": round(self._run_ms_total / finished, 2),
+                    "max": round(self._run_ms_max, 2),
+                },
+            }
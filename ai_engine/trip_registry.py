@@ -0,0 +1,235 @@
+"""ai_engine.trip_registry
+
+Cached view of which trips are ACTIVE on the backend.
+
+Replaces one blocking `GET /is-active-trip/<id>` per posted result with a
+process-wide snapshot of the backend's in-memory active-trip registry:
+
+- `GET /active-trips` returns every ACTIVE trip id plus a version ETag; the
+  snapshot is reused for `TRIP_ACTIVE_CACHE_TTL_S` and then revalidated with
+  `If-None-Match` (unchanged registry = 304, no body)
+- one refresh at a time; concurrent callers wait for it instead of issuing
+  their own request
+- the backend pushes trip starts and ends (`mark_active` / `mark_inactive`)
+  when it knows this engine's address, ahead of the next revalidation
+- `invalidate(trip_id)` drops the snapshot (trip ended/completed here, or the
+  backend answered 409) so the next check re-reads it
+- on transport errors the last snapshot is kept; with no snapshot at all a
+  trip counts as inactive (results then route to /events, never to a stale trip)
+  and the failure is cached for one TTL, so a backend outage costs one request
+  per TTL rather than one per check
+
+The snapshot also carries each active trip's driver id (`driver_for`), which
+lets the fast loop resolve a trip's driver without a request.
+
+Backends without `/active-trips` fall back to per-trip `/is-active-trip/<id>`
+lookups, cached per trip with the same TTL.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from structured_log import get_logger
+
+_log = get_logger("trip_registry")
+
+
+BACKEND_BASE_URL = os.getenv("BACKEND_BASE_URL", "http://localhost:5000")
+NO_ACTIVE_TRIP_ID = os.getenv("NO_ACTIVE_TRIP_ID", "NO_ACTIVE_TRIP")
+TRIP_ACTIVE_CACHE_TTL_S = float(os.getenv("TRIP_ACTIVE_CACHE_TTL_S", "2.0"))
+TRIP_ACTIVE_TIMEOUT_S = float(os.getenv("TRIP_ACTIVE_TIMEOUT_S", "2.0"))
+
+
+class ActiveTripRegistry:
+    """TTL-cached, ETag-revalidated snapshot of the backend's ACTIVE trip ids."""
+
+    def __init__(
+        self,
+        base_url: str = BACKEND_BASE_URL,
+        *,
+        ttl_s: float = TRIP_ACTIVE_CACHE_TTL_S,
+        timeout_s: float = TRIP_ACTIVE_TIMEOUT_S,
+        no_active_trip_id: str = NO_ACTIVE_TRIP_ID,
+    ) -> None:
+        self.base_url = str(base_url).rstrip("/")
+        self._ttl_s = max(0.0, float(ttl_s))
+        self._timeout_s = float(timeout_s)
+        self._no_active_trip_id = str(no_active_trip_id)
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._active: Optional[FrozenSet[str]] = None
+        self._drivers: Dict[str, str] = {}
+        self._etag: Optional[str] = None
+        self._checked_at = 0.0  # monotonic; 0 = revalidate on next check
+        self._failed_at = 0.0  # monotonic time of the last failed refresh while no snapshot exists
+        self._snapshot_supported = True
+        self._per_trip: Dict[str, Tuple[bool, float]] = {}
+
+        self._counts = {"checks": 0, "hits": 0, "fetches": 0, "not_modified": 0, "errors": 0, "invalidations": 0}
+
+    def is_active(self, trip_id: Optional[str]) -> bool:
+        if (not trip_id) or (str(trip_id).strip() == self._no_active_trip_id):
+            return False
+        trip_id = str(trip_id)
+        with self._lock:
+            self._counts["checks"] += 1
+            if self._snapshot_supported:
+                if self._active is not None and (time.monotonic() - self._checked_at) < self._ttl_s:
+                    self._counts["hits"] += 1
+                    return trip_id in self._active
+                if self._active is None and (time.monotonic() - self._failed_at) < self._ttl_s:
+                    # Negative cache: the backend was just unreachable.
+                    self._counts["hits"] += 1
+                    return False
+            else:
+                cached = self._per_trip.get(trip_id)
+                if cached is not None and (time.monotonic() - cached[1]) < self._ttl_s:
+                    self._counts["hits"] += 1
+                    return cached[0]
+
+        if self._snapshot_supported:
+            active = self._refresh_snapshot()
+            if active is not None:
+                return trip_id in active
+            if self._snapshot_supported:
+                return False
+        return self._lookup_trip(trip_id)
+
+    def driver_for(self, trip_id: str) -> Optional[str]:
+        """Driver id of an ACTIVE trip from the last snapshot (memory only, no request)."""
+        with self._lock:
+            return self._drivers.get(str(trip_id))
+
+    def mark_active(self, trip_id: str, driver_id: Optional[str] = None) -> None:
+        """Record a trip start pushed by the backend ahead of the next snapshot."""
+        trip_id = str(trip_id)
+        with self._lock:
+            if self._active is not None:
+                self._active = self._active | {trip_id}
+            self._per_trip[trip_id] = (True, time.monotonic())
+            if driver_id:
+                self._drivers[trip_id] = str(driver_id)
+
+    def mark_inactive(self, trip_id: str) -> None:
+        """Record a trip end pushed by the backend ahead of the next snapshot."""
+        trip_id = str(trip_id)
+        with self._lock:
+            if self._active is not None:
+                self._active = self._active - {trip_id}
+            self._per_trip[trip_id] = (False, time.monotonic())
+            self._drivers.pop(trip_id, None)
+
+    def invalidate(self, trip_id: Optional[str] = None) -> None:
+        """Force the next check to revalidate (e.g. trip ended or backend returned 409)."""
+        with self._lock:
+            self._counts["invalidations"] += 1
+            self._checked_at = 0.0
+            self._failed_at = 0.0
+            if trip_id is None:
+                self._per_trip.clear()
+            else:
+                self._per_trip.pop(str(trip_id), None)
+
+    def _get(self, path: str, headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, Any], Optional[str]]:
+        req = Request(f"{self.base_url}{path}", headers=headers or {}, method="GET")
+        try:
+            with urlopen(req, timeout=self._timeout_s) as resp:
+                body = json.loads(resp.read().decode("utf-8") or "{}")
+                return int(getattr(resp, "status", 200)), body, resp.headers.get("ETag")
+        except HTTPError as exc:
+            return int(exc.code), {}, exc.headers.get("ETag") if exc.headers else None
+
+    def _refresh_snapshot(self) -> Optional[FrozenSet[str]]:
+        with self._refresh_lock:
+            # Another thread may have refreshed while this one waited.
+            with self._lock:
+                if self._active is not None and (time.monotonic() - self._checked_at) < self._ttl_s:
+                    return self._active
+                if self._active is None and (time.monotonic() - self._failed_at) < self._ttl_s:
+                    return None
+                etag = self._etag
+
+            headers = {"If-None-Match": etag} if etag else {}
+            try:
+                status, body, new_etag = self._get("/active-trips", headers)
+            except Exception as e:
+                with self._lock:
+                    self._counts["errors"] += 1
+                    # Keep serving the last snapshot (or "inactive"); retry after another TTL.
+                    if self._active is not None:
+                        self._checked_at = time.monotonic()
+                    else:
+                        self._failed_at = time.monotonic()
+                _log.warning("active trip registry refresh failed: %s", e)
+                return self._active
+
+            with self._lock:
+                if status == 304 and self._active is not None:
+                    self._counts["not_modified"] += 1
+                    self._checked_at = time.monotonic()
+                    return self._active
+                if status == 200 and isinstance(body.get("trip_ids"), list):
+                    self._counts["fetches"] += 1
+                    self._active = frozenset(str(t) for t in body["trip_ids"])
+                    drivers = body.get("drivers") if isinstance(body.get("drivers"), dict) else {}
+                    self._drivers = {str(t): str(d) for t, d in drivers.items() if d}
+                    self._etag = new_etag
+                    self._checked_at = time.monotonic()
+                    return self._active
+                if status in (404, 405):
+                    _log.warning("backend has no /active-trips route; using per-trip /is-active-trip lookups")
+                    self._snapshot_supported = False
+                    return None
+                self._counts["errors"] += 1
+                if self._active is None:
+                    self._failed_at = time.monotonic()
+                return self._active
+
+    def _lookup_trip(self, trip_id: str) -> bool:
+        try:
+            status, body, _ = self._get(f"/is-active-trip/{quote(trip_id, safe='')}")
+            is_active = status == 200 and bool(body.get("is_active", False))
+        except Exception:
+            # If check fails, prefer background /events routing (avoids appending to completed trips).
+            with self._lock:
+                self._counts["errors"] += 1
+                # Cached like an answer, so an outage costs one request per trip and TTL.
+                self._per_trip[trip_id] = (False, time.monotonic())
+            return False
+        with self._lock:
+            self._counts["fetches"] += 1
+            self._per_trip[trip_id] = (is_active, time.monotonic())
+        return is_active
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            age = (time.monotonic() - self._checked_at) if self._checked_at else None
+            return {
+                "ttl_s": self._ttl_s,
+                "mode": "snapshot" if self._snapshot_supported else "per_trip",
+                "active_trips": len(self._active) if self._active is not None else None,
+                "etag": self._etag,
+                "age_s": round(age, 2) if age is not None else None,
+                **self._counts,
+            }
+
+
+_active_trip_registry: Optional[ActiveTripRegistry] = None
+_active_trip_registry_lock = threading.Lock()
+
+
+def get_active_trip_registry() -> ActiveTripRegistry:
+    global _active_trip_registry
+    with _active_trip_registry_lock:
+        if _active_trip_registry is None:
+            _active_trip_registry = ActiveTripRegistry()
+        return _active_trip_registry
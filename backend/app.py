@@ -1,11 +1,15 @@
 from flask import Flask, jsonify, request, Response, render_template
 from flask_cors import CORS
-from pymongo import MongoClient
+from pymongo import InsertOne, MongoClient, ReturnDocument, UpdateOne
 from bson.objectid import ObjectId
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 import uuid
-from math import radians, sin, cos, sqrt, atan2, log, tan, pi
+import json
+import base64
+import hashlib
+import numpy as np
 from zeroconf import ServiceInfo, Zeroconf
 import socket
 import threading
@@ -21,10 +25,38 @@ load_dotenv()
 from calibration_model import (
     get_driver_calibration,
     create_driver_calibration,
-    get_personalized_thresholds,
+    thresholds_from_calibration,
     compute_and_store_thresholds,
     calibration_collection
 )
+from db_indexes import MONGO_ENSURE_INDEXES, ensure_indexes
+from event_filters import events_query
+from geo import (
+    bounding_box,
+    cumulative_distance_km,
+    mercator_px,
+    path_arrays,
+    path_distance_km,
+    route_coords,
+    segment_distances_km,
+    segment_speeds_kmh,
+)
+from trip_stats import (
+    DISTANCE_STALE_FIELD,
+    compute_max_speed,
+    compute_trip_distance_km,
+    has_stored_stats,
+    point_lat_lon,
+    segment_distance_km,
+    to_float,
+)
+from telemetry_store import (
+    BUCKETED_FLAG,
+    COUNT_FIELDS,
+    TRIP_HEADER_PROJECTION,
+    TripTelemetry,
+    is_bucketed,
+)
 
 
 def _get_lan_ipv4_addresses() -> list[str]:
@@ -67,6 +99,21 @@ db_name = "ivs_db"
 db = client[db_name]
 trips_collection = db["trips"]
 events_collection = db["events"]  # For detections when no active trip
+# Trip telemetry (path / sensor_data / ai_events) lives in bucket collections;
+# trip documents are compact headers. See telemetry_store.py.
+telemetry = TripTelemetry(db)
+
+# GET /trips page size (default / upper bound).
+TRIPS_PAGE_DEFAULT = int(os.getenv("TRIPS_PAGE_DEFAULT", "50"))
+TRIPS_PAGE_MAX = int(os.getenv("TRIPS_PAGE_MAX", "500"))
+
+# Compare-and-set attempts when a location write races another one for the same trip.
+# The last attempt records the point without a distance increment and flags the
+# distance stale (recomputed from the path on the next read).
+LOCATION_UPDATE_ATTEMPTS = 3
+
+# Upper bound on items accepted by one /trips/<id>/ai-results/batch or /events/batch request.
+AI_RESULTS_BATCH_MAX = int(os.getenv("AI_RESULTS_BATCH_MAX", "500"))
 
 IST_ZONE = ZoneInfo("Asia/Kolkata")
 
@@ -75,6 +122,11 @@ TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID", "").strip()
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN", "").strip()
 TWILIO_WHATSAPP_FROM = os.getenv("TWILIO_WHATSAPP_FROM", "whatsapp:+14155238886").strip()
 TWILIO_WHATSAPP_TO = os.getenv("TWILIO_WHATSAPP_TO", "").strip()
+# Optional: AI engine base URL for trip start/end notifications (driver pre-resolution,
+# active-trip registry updates).
+AI_ENGINE_BASE_URL = os.getenv("AI_ENGINE_BASE_URL", "").strip()
+# Pushes beyond this many pending are dropped; the AI engine's registry catches up on its own.
+AI_ENGINE_NOTIFY_MAX_PENDING = int(os.getenv("AI_ENGINE_NOTIFY_MAX_PENDING", "100"))
 
 print("TWILIO_ACCOUNT_SID:", TWILIO_ACCOUNT_SID)
 print("TWILIO_WHATSAPP_TO:", TWILIO_WHATSAPP_TO)
@@ -105,6 +157,99 @@ _DRIVER_SESSION = {
 }
 
 
+# In-memory registry of ACTIVE trip ids (-> driver_id), so hot status checks
+# never load trip documents. Maintained by create_trip/end_trip; `version`
+# changes whenever the set changes. Re-seeded from Mongo (trip_id/driver_id
+# projection only) every ACTIVE_TRIPS_RESYNC_S so several backend processes converge.
+ACTIVE_TRIPS_RESYNC_S = float(os.getenv("ACTIVE_TRIPS_RESYNC_S", "30"))
+_ACTIVE_TRIPS_LOCK = threading.Lock()
+_ACTIVE_TRIPS = {
+    "drivers": {},
+    "version": 0,
+    "synced_at": None,
+}
+
+
+def _set_active_trips(trip_drivers, *, synced=False):
+    """Replace the registry content ({trip_id: driver_id}); bumps the version only when it changed.
+
+    Returns the trip ids that were active before and no longer are.
+    """
+    trip_drivers = {str(t): d for t, d in trip_drivers.items() if t}
+    with _ACTIVE_TRIPS_LOCK:
+        ended = [t for t in _ACTIVE_TRIPS["drivers"] if t not in trip_drivers]
+        if trip_drivers != _ACTIVE_TRIPS["drivers"]:
+            _ACTIVE_TRIPS["drivers"] = trip_drivers
+            _ACTIVE_TRIPS["version"] += 1
+        if synced:
+            _ACTIVE_TRIPS["synced_at"] = datetime.utcnow()
+    return ended
+
+
+def _mark_trip_inactive(trip_id):
+    with _ACTIVE_TRIPS_LOCK:
+        if trip_id in _ACTIVE_TRIPS["drivers"]:
+            _ACTIVE_TRIPS["drivers"] = {t: d for t, d in _ACTIVE_TRIPS["drivers"].items() if t != trip_id}
+            _ACTIVE_TRIPS["version"] += 1
+
+
+def _active_trips_snapshot():
+    """Return (version, {trip_id: driver_id} of ACTIVE trips), re-seeding from Mongo when due."""
+    with _ACTIVE_TRIPS_LOCK:
+        synced_at = _ACTIVE_TRIPS["synced_at"]
+    if synced_at is None or (datetime.utcnow() - synced_at).total_seconds() >= ACTIVE_TRIPS_RESYNC_S:
+        try:
+            docs = trips_collection.find({"status": "ACTIVE"}, {"trip_id": 1, "driver_id": 1, "_id": 0})
+            _set_active_trips({d.get("trip_id"): d.get("driver_id") for d in docs}, synced=True)
+        except Exception as e:
+            print(f"⚠ active trip registry resync failed: {e}")
+    with _ACTIVE_TRIPS_LOCK:
+        # The dict is replaced, never mutated, so handing it out is safe.
+        return _ACTIVE_TRIPS["version"], _ACTIVE_TRIPS["drivers"]
+
+
+# Trip start/end pushes share two worker threads instead of a thread per trip.
+_AI_ENGINE_NOTIFY_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ai-engine-notify")
+_AI_ENGINE_NOTIFY_SLOTS = threading.BoundedSemaphore(max(1, AI_ENGINE_NOTIFY_MAX_PENDING))
+
+
+def _notify_ai_engine(path, payload, what):
+    """Best-effort POST to the AI engine on the notify pool (never blocks the request)."""
+    if not AI_ENGINE_BASE_URL:
+        return
+    if not _AI_ENGINE_NOTIFY_SLOTS.acquire(blocking=False):
+        print(f"⚠ AI engine {what} notification dropped: {AI_ENGINE_NOTIFY_MAX_PENDING} already pending")
+        return
+
+    def _send():
+        try:
+            body = json.dumps(payload).encode("utf-8")
+            req = urllib.request.Request(
+                f"{AI_ENGINE_BASE_URL.rstrip('/')}{path}",
+                data=body,
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            with urllib.request.urlopen(req, timeout=2):
+                pass
+        except Exception as e:
+            print(f"⚠ AI engine {what} notification failed: {e}")
+        finally:
+            _AI_ENGINE_NOTIFY_SLOTS.release()
+
+    _AI_ENGINE_NOTIFY_EXECUTOR.submit(_send)
+
+
+def _notify_ai_engine_trip_started(trip_id, driver_id):
+    """Push the trip's driver so the AI engine knows it before the first frame."""
+    _notify_ai_engine(f"/trips/{trip_id}/start", {"driver_id": driver_id}, "trip-start")
+
+
+def _notify_ai_engine_trip_ended(trip_id):
+    """Push a trip end so the AI engine's active-trip registry drops it before its next refresh."""
+    _notify_ai_engine(f"/trips/{trip_id}/end", {}, "trip-end")
+
+
 def _get_driver_session_snapshot():
     with _DRIVER_SESSION_LOCK:
         return dict(_DRIVER_SESSION)
@@ -317,65 +462,6 @@ def _normalize_event_key(trip_id, driver_id, event_type, episode_start_ts):
     return f"{trip_id}|{driver_id}|{event_type}|{episode_start_ts}"
 
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance in kilometers between two lat/lon points using Haversine formula."""
-    R = 6371  # Earth's radius in km
-    
-    lat1_rad = radians(lat1)
-    lat2_rad = radians(lat2)
-    delta_lat = radians(lat2 - lat1)
-    delta_lon = radians(lon2 - lon1)
-    
-    a = sin(delta_lat / 2) ** 2 + cos(lat1_rad) * cos(lat2_rad) * sin(delta_lon / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    distance = R * c
-    return distance
-
-
-def _to_float(value, default=0.0):
-    try:
-        return float(value)
-    except (TypeError, ValueError):
-        return default
-
-
-def compute_max_speed(trip):
-    max_speed = 0.0
-
-    sensor_data = trip.get("sensor_data", []) or []
-    for point in sensor_data:
-        max_speed = max(max_speed, _to_float(point.get("speed", 0)))
-
-    path = trip.get("path", []) or []
-    for point in path:
-        max_speed = max(max_speed, _to_float(point.get("speed", 0)))
-
-    return round(max_speed, 2)
-
-
-def compute_trip_distance_km(path):
-    if not path or len(path) < 2:
-        return 0.0
-
-    total_distance = 0.0
-    for i in range(1, len(path)):
-        prev = path[i - 1]
-        curr = path[i]
-
-        try:
-            prev_lat = float(prev.get("lat", prev.get("latitude", 0)) or 0)
-            prev_lon = float(prev.get("lng", prev.get("lon", prev.get("longitude", 0))) or 0)
-            curr_lat = float(curr.get("lat", curr.get("latitude", 0)) or 0)
-            curr_lon = float(curr.get("lng", curr.get("lon", curr.get("longitude", 0))) or 0)
-        except (TypeError, ValueError):
-            continue
-
-        if prev_lat and prev_lon and curr_lat and curr_lon:
-            total_distance += haversine_distance(prev_lat, prev_lon, curr_lat, curr_lon)
-
-    return round(total_distance, 2)
-
-
 def _parse_datetime_any(value):
     if value is None:
         return None
@@ -547,8 +633,12 @@ def create_trip():
             "license_no": license_no,
             "start_time": now,
             "status": "ACTIVE",
-            "sensor_data": [],  # Initialize empty sensor data array
-            "path": []  # Initialize empty path array for GPS points
+            # Path points, sensor samples and AI events go to the telemetry buckets.
+            BUCKETED_FLAG: True,
+            **{count_field: 0 for count_field in COUNT_FIELDS.values()},
+            # Maintained on every location/sensor write (see trip_stats.py).
+            "distance_km": 0.0,
+            "max_speed": 0.0,
         }
         
         # Insert into MongoDB
@@ -566,6 +656,9 @@ def create_trip():
                 }
             },
         )
+        for ended_trip_id in _set_active_trips({trip_id: driver_id}):
+            _notify_ai_engine_trip_ended(ended_trip_id)
+        _notify_ai_engine_trip_started(trip_id, driver_id)
         
         return jsonify({
             "message": "Trip created successfully",
@@ -578,13 +671,112 @@ def create_trip():
         return jsonify({"error": str(e)}), 500
 
 
+def _encode_trips_cursor(trip):
+    """Opaque keyset cursor for the (start_time, _id) position of a trip."""
+    start_time = trip.get("start_time")
+    position = {
+        "t": start_time.isoformat() if isinstance(start_time, datetime) else None,
+        "id": str(trip["_id"]),
+    }
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_trips_cursor(cursor):
+    """Mongo condition selecting the trips after a cursor (newest-first order); raises ValueError."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        oid = ObjectId(position["id"])
+        start_time = datetime.fromisoformat(position["t"]) if position.get("t") else None
+    except Exception:
+        raise ValueError("invalid cursor")
+    if start_time is None:
+        # Trips without start_time sort after all others; only the _id tie-break is left.
+        return {"start_time": None, "_id": {"$lt": oid}}
+    return {
+        "$or": [
+            {"start_time": {"$lt": start_time}},
+            {"start_time": start_time, "_id": {"$lt": oid}},
+            {"start_time": None},
+        ]
+    }
+
+
+def _trip_list_filter(args):
+    """Mongo filter for GET /trips query parameters; raises ValueError for bad values."""
+    clauses = []
+    driver_id = _clean_str(args.get("driver_id"))
+    if driver_id:
+        clauses.append({"driver_id": driver_id})
+    status = _clean_str(args.get("status"))
+    if status:
+        clauses.append({"status": status.upper()})
+    risk_levels = [r.strip().upper() for r in str(args.get("risk_level") or "").split(",") if r.strip()]
+    if risk_levels:
+        clauses.append({"risk_level": risk_levels[0] if len(risk_levels) == 1 else {"$in": risk_levels}})
+
+    start_range = {}
+    for param, op in (("start_from", "$gte"), ("start_to", "$lt")):
+        raw = args.get(param)
+        if raw:
+            value = _parse_iso_to_utc_naive(raw)
+            if value is None:
+                raise ValueError(f"invalid {param} (expected ISO-8601)")
+            start_range[op] = value
+    if start_range:
+        clauses.append({"start_time": start_range})
+
+    cursor = args.get("cursor")
+    if cursor:
+        clauses.append(_decode_trips_cursor(cursor))
+
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _trip_duration_minutes(trip):
+    """Stored duration, else end - start (0 while the trip has no end)."""
+    if "duration_minutes" in trip:
+        return trip["duration_minutes"]
+    start_dt = _parse_datetime_any(trip.get("start_time") or trip.get("start"))
+    end_dt = _parse_datetime_any(trip.get("end_time") or trip.get("end"))
+    if not start_dt or not end_dt:
+        return 0
+    return round((end_dt - start_dt).total_seconds() / 60, 2)
+
+
 @app.get("/trips")
 def get_trips():
-    """Fetch all trips"""
+    """List trips, newest first, one keyset page at a time.
+
+    Query parameters: `limit` (default TRIPS_PAGE_DEFAULT, max TRIPS_PAGE_MAX),
+    `cursor` (the previous page's `next_cursor`), and filters `driver_id`,
+    `status`, `risk_level` (comma-separated) and `start_from`/`start_to` (ISO).
+    Trip headers only; summary fields come from the stored aggregates.
+    """
     try:
-        trips = list(trips_collection.find())
+        limit = request.args.get("limit", TRIPS_PAGE_DEFAULT, type=int)
+        limit = max(1, min(int(limit or TRIPS_PAGE_DEFAULT), TRIPS_PAGE_MAX))
+        try:
+            query = _trip_list_filter(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # One extra document tells whether another page exists.
+        docs = list(
+            trips_collection.find(query, TRIP_HEADER_PROJECTION)
+            .sort([("start_time", -1), ("_id", -1)])
+            .limit(limit + 1)
+        )
+        next_cursor = _encode_trips_cursor(docs[limit - 1]) if len(docs) > limit else None
+        trips = docs[:limit]
+
         # Convert ObjectId and datetime to string for JSON serialization
         for trip in trips:
+            # Summary columns come from the header aggregates (no telemetry is read).
+            trip["distance_km"], trip["max_speed"] = _trip_stats(trip)
+            trip["duration_minutes"] = _trip_duration_minutes(trip)
             trip["_id"] = str(trip["_id"])
             formatted_start = to_ist_display(trip.get("start_time") or trip.get("start"))
             formatted_end = to_ist_display(trip.get("end_time") or trip.get("end"))
@@ -592,45 +784,7 @@ def get_trips():
             trip["end_time"] = formatted_end
             trip["start"] = formatted_start
             trip["end"] = formatted_end
-            trip["max_speed"] = compute_max_speed(trip)
-            
-            # Calculate duration for display (fallback if not stored)
-            if "duration_minutes" not in trip:
-                start_time = trip.get("start_time")
-                end_time = trip.get("end_time")
-                if start_time and end_time:
-                    try:
-                        if isinstance(start_time, str):
-                            start_dt = datetime.fromisoformat(start_time.replace("Z", "+00:00"))
-                        else:
-                            start_dt = start_time
-                        if isinstance(end_time, str):
-                            end_dt = datetime.fromisoformat(end_time.replace("Z", "+00:00"))
-                        else:
-                            end_dt = end_time
-                        duration_seconds = (end_dt - start_dt).total_seconds()
-                        trip["duration_minutes"] = round(duration_seconds / 60, 2)
-                    except:
-                        trip["duration_minutes"] = 0
-                else:
-                    trip["duration_minutes"] = 0
-            
-            path = trip.get("path", [])
-            total_distance = 0.0
-
-            for i in range(1, len(path)):
-                prev = path[i - 1]
-                curr = path[i]
-
-                total_distance += haversine_distance(
-                    float(prev.get("lat", 0)),
-                    float(prev.get("lon", 0)),
-                    float(curr.get("lat", 0)),
-                    float(curr.get("lon", 0))
-                )
-
-            trip["distance_km"] = round(total_distance, 2)
-        return jsonify({"trips": trips}), 200
+        return jsonify({"trips": trips, "next_cursor": next_cursor, "limit": limit}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -642,6 +796,7 @@ def get_trip(trip_id):
         trip = trips_collection.find_one({"trip_id": trip_id})
         if not trip:
             return jsonify({"error": "Trip not found"}), 404
+        telemetry.load_into(trip)
         trip["_id"] = str(trip["_id"])
         formatted_start = to_ist_display(trip.get("start_time") or trip.get("start"))
         formatted_end = to_ist_display(trip.get("end_time") or trip.get("end"))
@@ -649,7 +804,7 @@ def get_trip(trip_id):
         trip["end_time"] = formatted_end
         trip["start"] = formatted_start
         trip["end"] = formatted_end
-        trip["max_speed"] = compute_max_speed(trip)
+        trip["distance_km"], trip["max_speed"] = _trip_stats(trip, loaded=True)
         trip["ai_events"] = trip.get("ai_events", [])
         trip["sos_triggered"] = trip.get("sos_triggered", False)
         trip["sos_events"] = trip.get("sos_events", [])
@@ -753,13 +908,113 @@ def _build_consolidated_trip_events(trip: dict) -> list[dict]:
     return consolidated_events
 
 
-def _get_trip_or_404(trip_id: str) -> tuple[dict | None, tuple | None]:
+def _get_trip_or_404(trip_id: str, *series: str) -> tuple[dict | None, tuple | None]:
+    """Load a trip plus the telemetry series (path/sensor_data/ai_events) the caller needs."""
     trip = trips_collection.find_one({"trip_id": trip_id})
     if not trip:
         return None, (jsonify({"error": "Trip not found"}), 404)
+    telemetry.load_into(trip, *series)
     return trip, None
 
 
+def _trip_stats(trip: dict, *, loaded: bool = False) -> tuple[float, float]:
+    """(distance_km, max_speed) from the header aggregates.
+
+    Trips without maintained aggregates (created before they existed) fall back
+    to a full recompute over their telemetry; `loaded=True` means trip["path"]
+    and trip["sensor_data"] are already filled in.
+    """
+    if has_stored_stats(trip):
+        if trip.get(DISTANCE_STALE_FIELD):
+            return _recompute_stale_distance(trip), round(to_float(trip.get("max_speed")), 2)
+        return round(to_float(trip.get("distance_km")), 2), round(to_float(trip.get("max_speed")), 2)
+    if not loaded:
+        fields = ("path", "sensor_data")
+        embedded = trips_collection.find_one({"trip_id": trip.get("trip_id")}, {f: 1 for f in fields}) or {}
+        trip = telemetry.load_into(
+            {"trip_id": trip.get("trip_id"), **{f: embedded.get(f) for f in fields}},
+            *fields,
+            item_fields={"path": ("lat", "lng", "lon", "speed"), "sensor_data": ("speed",)},
+        )
+    return compute_trip_distance_km(trip.get("path") or []), compute_max_speed(trip)
+
+
+def _recompute_stale_distance(trip: dict) -> float:
+    """Distance of a trip whose distance_km is flagged stale, stored back when it is complete.
+
+    The result is written (and the flag cleared) only if the loaded path holds
+    exactly path_count points and no point was reserved since; otherwise the
+    flag stays and the next read recomputes.
+    """
+    trip_id = trip.get("trip_id")
+    count_field = COUNT_FIELDS["path"]
+    header = trips_collection.find_one({"trip_id": trip_id}, {count_field: 1, "path": 1}) or {}
+    path = telemetry.load_into(
+        {"trip_id": trip_id, "path": header.get("path")},
+        "path",
+        item_fields={"path": ("lat", "lng", "lon")},
+    )["path"]
+    distance = path_distance_km(path)
+    count = header.get(count_field)
+    if count is not None and len(path) == int(count):
+        trips_collection.update_one(
+            {"trip_id": trip_id, count_field: count, DISTANCE_STALE_FIELD: True},
+            {"$set": {"distance_km": distance}, "$unset": {DISTANCE_STALE_FIELD: ""}},
+        )
+    return round(distance, 2)
+
+
+def _series_count(trip: dict, field: str) -> int:
+    """Number of stored items of one telemetry series (header counter when maintained)."""
+    count_field = COUNT_FIELDS[field]
+    if is_bucketed(trip) and count_field in trip:
+        return int(trip.get(count_field) or 0)
+    trip_id = trip.get("trip_id")
+    embedded = list(trips_collection.aggregate([
+        {"$match": {"trip_id": trip_id}},
+        {"$project": {"n": {"$size": {"$ifNull": [f"${field}", []]}}}},
+    ]))
+    return (embedded[0]["n"] if embedded else 0) + telemetry[field].count(trip_id)
+
+
+def _reserve_seq(trip_query: dict, field: str, n: int, update: dict | None = None):
+    """Apply `update` to the trip header while reserving n item numbers of one telemetry series.
+
+    The series counter is `$inc`-ed in the same atomic update, so concurrent
+    writers get disjoint numbers; items are then appended to the buckets under
+    them (see telemetry_store.py). Returns (header, first seq), or (None, None)
+    when no trip matches `trip_query`.
+    """
+    count_field = COUNT_FIELDS[field]
+    update = dict(update or {})
+    update["$inc"] = {**update.get("$inc", {}), count_field: n}
+    header = trips_collection.find_one_and_update(
+        trip_query,
+        update,
+        projection={"trip_id": 1, count_field: 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not header:
+        return None, None
+    return header, int(header.get(count_field) or 0) - n
+
+
+def _release_seq(trip_query: dict, field: str, seq: int, n: int, undo: dict | None = None) -> bool:
+    """Give back item numbers reserved by _reserve_seq whose append failed.
+
+    Only possible while they are still the newest (the counter still ends at
+    seq + n), and `undo` (e.g. the distance increment and previous last point)
+    is applied in the same update. Otherwise a later write already took the
+    next number: the header then keeps counting the lost items, which is
+    accepted (reads use the stored items; max_speed is never rolled back).
+    """
+    count_field = COUNT_FIELDS[field]
+    update = dict(undo or {})
+    update["$inc"] = {**update.get("$inc", {}), count_field: -n}
+    result = trips_collection.update_one({**trip_query, count_field: seq + n}, update)
+    return result.modified_count > 0
+
+
 def _render_route_png(path: list[dict]) -> bytes:
     """Render route on top of real OpenStreetMap tiles, fallback to local drawing."""
     from PIL import Image, ImageDraw
@@ -768,50 +1023,28 @@ def _render_route_png(path: list[dict]) -> bytes:
     tile_size = 256
     line_color = (220, 20, 60)  # crimson
 
-    coords: list[tuple[float, float]] = []  # (lon, lat)
-    for pt in path or []:
-        lat = pt.get("lat")
-        lng = pt.get("lng", pt.get("lon"))
-        if lat is None or lng is None:
-            continue
-        try:
-            lat_f = float(lat)
-            lng_f = float(lng)
-            # Clamp latitude to Web Mercator valid range.
-            lat_f = max(-85.0511, min(85.0511, lat_f))
-            coords.append((lng_f, lat_f))
-        except Exception:
-            continue
+    lons, lats = route_coords(path)
 
     def _fallback() -> bytes:
         img = Image.new("RGB", (width, height), (255, 255, 255))
         draw = ImageDraw.Draw(img)
 
-        if len(coords) < 2:
+        if lons.size < 2:
             draw.text((20, 20), "No route data available", fill=(0, 0, 0))
         else:
-            xs = [c[0] for c in coords]
-            ys = [c[1] for c in coords]
-            min_x, max_x = min(xs), max(xs)
-            min_y, max_y = min(ys), max(ys)
+            min_y, min_x, max_y, max_x = bounding_box(lats, lons)
 
             dx = max(max_x - min_x, 1e-9)
             dy = max(max_y - min_y, 1e-9)
 
-            def project(lng_val: float, lat_val: float) -> tuple[int, int]:
-                px = int((lng_val - min_x) / dx * (width - 40) + 20)
-                py = int(height - ((lat_val - min_y) / dy * (height - 40) + 20))
-                return px, py
+            xs = ((lons - min_x) / dx * (width - 40) + 20).astype(int).tolist()
+            ys = (height - ((lats - min_y) / dy * (height - 40) + 20)).astype(int).tolist()
 
-            for i in range(1, len(coords)):
-                (lng1, lat1) = coords[i - 1]
-                (lng2, lat2) = coords[i]
-                x1, y1 = project(lng1, lat1)
-                x2, y2 = project(lng2, lat2)
-                draw.line([(x1, y1), (x2, y2)], fill=line_color, width=4)
+            for i in range(1, len(xs)):
+                draw.line([(xs[i - 1], ys[i - 1]), (xs[i], ys[i])], fill=line_color, width=4)
 
-            x0, y0 = project(coords[0][0], coords[0][1])
-            x1, y1 = project(coords[-1][0], coords[-1][1])
+            x0, y0 = xs[0], ys[0]
+            x1, y1 = xs[-1], ys[-1]
             draw.ellipse((x0 - 6, y0 - 6, x0 + 6, y0 + 6), fill=(0, 180, 0))
             draw.ellipse((x1 - 6, y1 - 6, x1 + 6, y1 + 6), fill=(0, 0, 180))
 
@@ -819,36 +1052,22 @@ def _render_route_png(path: list[dict]) -> bytes:
         img.save(buf, format="PNG")
         return buf.getvalue()
 
-    if len(coords) < 2:
+    if lons.size < 2:
         return _fallback()
 
-    def lonlat_to_global_px(lon_val: float, lat_val: float, zoom_val: int) -> tuple[float, float]:
-        scale = (2 ** zoom_val) * tile_size
-        x = (lon_val + 180.0) / 360.0 * scale
-        lat_rad = radians(lat_val)
-        y = (1.0 - (log(tan(lat_rad) + (1.0 / cos(lat_rad))) / pi)) / 2.0 * scale
-        return x, y
-
-    def pick_zoom(min_lon: float, max_lon: float, min_lat: float, max_lat: float) -> int:
-        pad = 40
-        for z in range(18, 1, -1):
-            x1, y1 = lonlat_to_global_px(min_lon, max_lat, z)
-            x2, y2 = lonlat_to_global_px(max_lon, min_lat, z)
-            span_x = abs(x2 - x1)
-            span_y = abs(y2 - y1)
-            if span_x <= (width - pad * 2) and span_y <= (height - pad * 2):
-                return z
-        return 2
-
-    lons = [c[0] for c in coords]
-    lats = [c[1] for c in coords]
-    min_lon, max_lon = min(lons), max(lons)
-    min_lat, max_lat = min(lats), max(lats)
-
-    zoom = pick_zoom(min_lon, max_lon, min_lat, max_lat)
+    min_lat, min_lon, max_lat, max_lon = bounding_box(lats, lons)
+
+    # Highest zoom (18..2) at which the bounding box fits inside the padded image.
+    pad = 40
+    zooms = np.arange(18, 1, -1)
+    x1, y1 = mercator_px(min_lon, max_lat, zooms, tile_size)
+    x2, y2 = mercator_px(max_lon, min_lat, zooms, tile_size)
+    fits = (np.abs(x2 - x1) <= (width - pad * 2)) & (np.abs(y2 - y1) <= (height - pad * 2))
+    zoom = int(zooms[fits][0]) if fits.any() else 2
+
     center_lon = (min_lon + max_lon) / 2.0
     center_lat = (min_lat + max_lat) / 2.0
-    cx, cy = lonlat_to_global_px(center_lon, center_lat, zoom)
+    cx, cy = (float(v) for v in mercator_px(center_lon, center_lat, zoom, tile_size))
 
     top_left_x = cx - (width / 2.0)
     top_left_y = cy - (height / 2.0)
@@ -885,10 +1104,8 @@ def _render_route_png(path: list[dict]) -> bytes:
         return _fallback()
 
     # Draw route overlay.
-    points: list[tuple[float, float]] = []
-    for lon_val, lat_val in coords:
-        gx, gy = lonlat_to_global_px(lon_val, lat_val, zoom)
-        points.append((gx - top_left_x, gy - top_left_y))
+    gx, gy = mercator_px(lons, lats, zoom, tile_size)
+    points = list(zip((gx - top_left_x).tolist(), (gy - top_left_y).tolist()))
 
     if len(points) >= 2:
         draw.line(points, fill=line_color, width=4)
@@ -909,7 +1126,7 @@ def _render_route_png(path: list[dict]) -> bytes:
 def download_trip_json(trip_id: str):
     """Level-3: download full trip JSON (path + events + timestamps)."""
     try:
-        trip, err = _get_trip_or_404(trip_id)
+        trip, err = _get_trip_or_404(trip_id, "path", "ai_events")
         if err:
             return err
 
@@ -924,7 +1141,7 @@ def download_trip_json(trip_id: str):
             "risk_summary": {
                 "risk_level": trip.get("risk_level"),
                 "risk_score": trip.get("risk_score"),
-                "max_speed": compute_max_speed(trip),
+                "max_speed": _trip_stats(trip)[1],
             },
         }
         return jsonify(payload), 200
@@ -934,24 +1151,42 @@ def download_trip_json(trip_id: str):
 
 @app.get("/trip/<trip_id>/download_csv")
 def download_trip_csv(trip_id: str):
-    """Level-3: export path as CSV."""
+    """Level-3: export path as CSV.
+
+    `?extended=1` adds distance_km (travelled so far) and speed_kmh (over the
+    segment ending at the point) columns.
+    """
     try:
-        trip, err = _get_trip_or_404(trip_id)
+        trip, err = _get_trip_or_404(trip_id, "path")
         if err:
             return err
 
         path = trip.get("path", []) or []
+        extended = str(request.args.get("extended", "0")).lower() in {"1", "true", "yes"}
+        header = ["lat", "lng", "timestamp"]
+        extra = []
+        if extended:
+            arrays = path_arrays(path)
+            segments = segment_distances_km(arrays.lat, arrays.lon)
+            distance_km = np.round(cumulative_distance_km(segments), 3).tolist()
+            speed_kmh = [None] + [
+                None if np.isnan(v) else round(float(v), 2) for v in segment_speeds_kmh(segments, arrays.ts)
+            ]
+            header += ["distance_km", "speed_kmh"]
+            extra = list(zip(distance_km, speed_kmh))
+
         buf = io.StringIO()
         writer = csv.writer(buf)
-        writer.writerow(["lat", "lng", "timestamp"])
-        for pt in path:
-            writer.writerow(
-                [
-                    pt.get("lat"),
-                    pt.get("lng", pt.get("lon")),
-                    pt.get("timestamp"),
-                ]
-            )
+        writer.writerow(header)
+        for i, pt in enumerate(path):
+            row = [
+                pt.get("lat"),
+                pt.get("lng", pt.get("lon")),
+                pt.get("timestamp"),
+            ]
+            if extended:
+                row.extend(extra[i])
+            writer.writerow(row)
 
         csv_bytes = buf.getvalue().encode("utf-8")
         return Response(
@@ -967,7 +1202,7 @@ def download_trip_csv(trip_id: str):
 def download_trip_map_image(trip_id: str):
     """Level-3: download a static PNG map image of the route."""
     try:
-        trip, err = _get_trip_or_404(trip_id)
+        trip, err = _get_trip_or_404(trip_id, "path")
         if err:
             return err
 
@@ -986,7 +1221,7 @@ def download_trip_map_image(trip_id: str):
 def download_trip_report_pdf(trip_id: str):
     """Level-3: generate and download a full PDF report."""
     try:
-        trip, err = _get_trip_or_404(trip_id)
+        trip, err = _get_trip_or_404(trip_id, "path", "ai_events")
         if err:
             return err
 
@@ -1011,7 +1246,7 @@ def download_trip_report_pdf(trip_id: str):
         sos_count = len(trip.get("sos_events", []) or [])
 
         peak_risk_level = trip.get("risk_level", "UNKNOWN")
-        total_distance_km = compute_trip_distance_km(path)
+        total_distance_km = _trip_stats(trip)[0]
 
         png_bytes = _render_route_png(path)
         try:
@@ -1101,132 +1336,281 @@ def download_trip_report_pdf(trip_id: str):
         return jsonify({"error": str(e)}), 500
 
 
+def _normalize_ai_source(value) -> str:
+    source_raw = str(value or "ai_engine").strip().lower()
+    if "mobile" in source_raw:
+        return "mobile_app"
+    if "ai" in source_raw:
+        return "ai_engine"
+    return source_raw or "ai_engine"
+
+
+def _batch_events_from_request():
+    """Return the event list of a batch request body ({"events": [...]} or a bare list), or None."""
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+        body = body.get("events")
+    if not isinstance(body, list):
+        return None
+    return [item if isinstance(item, dict) else {} for item in body]
+
+
+def _prepare_trip_ai_result(trip_id, trip, payload):
+    """Normalize one AI result for a trip: action, episode keys, risk summary and the ai_events entry."""
+    source = _normalize_ai_source(payload.get("source", "ai_engine"))
+
+    detections = payload.get("detections", [])
+    labels = _extract_detection_labels(detections)
+    event_action = str(payload.get("event_action") or "frame").strip().lower()
+    event_type = payload.get("event_type")
+    if not event_type or event_type in {"DETECTION", "AI Detection", "AI_DETECTION"}:
+        # Store a stable primary label; the full list is in event_labels.
+        event_type = labels[0] if labels else "DETECTION"
+
+    episode_id = str(payload.get("episode_id") or "").strip() or None
+    episode_start_ts = str(payload.get("episode_start_ts") or payload.get("timestamp") or datetime.utcnow().isoformat())
+    event_key = str(payload.get("event_key") or "").strip() or None
+    driver_id = str((payload.get("metadata") or {}).get("driver", {}).get("driver_id") or trip.get("driver_id") or "unknown_driver")
+    if not event_key and event_action == "start":
+        event_key = _normalize_event_key(trip_id, driver_id, event_type, episode_start_ts)
+
+    item = {
+        "action": event_action,
+        "event_type": event_type,
+        "episode_id": episode_id,
+        "event_key": event_key,
+        "source": source,
+        # Always keep trip-level risk summary fresh.
+        "base_set": {
+            "risk_score": payload.get("risk_score"),
+            "risk_level": payload.get("risk_level", "UNKNOWN"),
+            "last_ai_update": datetime.utcnow(),
+        },
+    }
+
+    if event_action == "end":
+        item["end_set"] = {
+            "end_time": str(payload.get("episode_end_ts") or payload.get("timestamp") or datetime.utcnow().isoformat()),
+            "duration_s": payload.get("duration_s"),
+            "status": "ended",
+        }
+        return item
+
+    item["event"] = {
+        "timestamp": payload.get("timestamp") or datetime.utcnow().isoformat(),
+        "start_time": episode_start_ts if event_action == "start" else None,
+        "end_time": None,
+        "status": "active" if event_action == "start" else "frame",
+        "event_action": event_action,
+        "event_key": event_key,
+        "episode_id": episode_id,
+        "event_type": event_type,
+        "event_labels": labels,
+        "detections": detections,
+        "risk_score": payload.get("risk_score"),
+        "risk_score_temporal": payload.get("risk_score_temporal"),
+        "risk_score_weighted": payload.get("risk_score_weighted"),
+        "risk_level": payload.get("risk_level", "UNKNOWN"),
+        "risk_level_temporal": payload.get("risk_level_temporal"),
+        "risk_level_weighted": payload.get("risk_level_weighted"),
+        "reasons": payload.get("reasons", []),
+        "sos_triggered": bool(payload.get("sos_triggered", False)),
+        "sos_source": payload.get("sos_source"),
+        "driver_emotion": payload.get("driver_emotion"),
+        "passenger_emotions": payload.get("passenger_emotions", []),
+        "metadata": payload.get("metadata", {}),
+        "source": source,
+    }
+    return item
+
+
+def _ai_event_key_exists(trip, event_key) -> bool:
+    """True when an ai_events entry with this event_key is already stored for the trip."""
+    trip_id = trip.get("trip_id")
+    if telemetry["ai_events"].contains(trip_id, "event_key", event_key):
+        return True
+    if is_bucketed(trip):
+        return False
+    # Unmigrated trip: its older events are still embedded in the trip document.
+    return trips_collection.find_one({"trip_id": trip_id, "ai_events.event_key": event_key}, {"_id": 1}) is not None
+
+
+def _end_ai_episode(trip, key, value, end_set) -> int:
+    """Close the stored episode whose `key` (episode_id/event_key) matches; returns 1 if updated."""
+    trip_id = trip.get("trip_id")
+    modified = telemetry["ai_events"].update_item(trip_id, key, value, end_set)
+    if not modified and not is_bucketed(trip):
+        result = trips_collection.update_one(
+            {"trip_id": trip_id, f"ai_events.{key}": value},
+            {"$set": {f"ai_events.$.{k}": v for k, v in end_set.items()}},
+        )
+        modified = int(result.modified_count)
+    return modified
+
+
+def _trip_not_active_response(trip):
+    return jsonify(
+        {
+            "error": "Trip is not active",
+            "code": "TRIP_NOT_ACTIVE",
+            "status": trip.get("status"),
+        }
+    ), 409
+
+
 @app.post("/trips/<trip_id>/ai-results")
 def add_ai_result(trip_id):
     """Receive AI-engine detection/risk result and attach it to trip record."""
     try:
-        trip = trips_collection.find_one({"trip_id": trip_id})
+        trip = trips_collection.find_one({"trip_id": trip_id}, TRIP_HEADER_PROJECTION)
         if not trip:
             return jsonify({"error": "Trip not found"}), 404
 
         if trip.get("status") != "ACTIVE":
-            return jsonify(
-                {
-                    "error": "Trip is not active",
-                    "code": "TRIP_NOT_ACTIVE",
-                    "status": trip.get("status"),
-                }
-            ), 409
+            return _trip_not_active_response(trip)
 
         payload = request.get_json(silent=True) or {}
-
-        source_raw = str(payload.get("source", "ai_engine")).strip().lower()
-        if "mobile" in source_raw:
-            source = "mobile_app"
-        elif "ai" in source_raw:
-            source = "ai_engine"
-        else:
-            source = source_raw or "ai_engine"
-
-        detections = payload.get("detections", [])
-        labels = _extract_detection_labels(detections)
-        event_action = str(payload.get("event_action") or "frame").strip().lower()
-        event_type = payload.get("event_type")
-        if not event_type or event_type in {"DETECTION", "AI Detection", "AI_DETECTION"}:
-            # Store a stable primary label; the full list is in event_labels.
-            event_type = labels[0] if labels else "DETECTION"
-
-        episode_id = str(payload.get("episode_id") or "").strip() or None
-        episode_start_ts = str(payload.get("episode_start_ts") or payload.get("timestamp") or datetime.utcnow().isoformat())
-        event_key = str(payload.get("event_key") or "").strip() or None
-        driver_id = str((payload.get("metadata") or {}).get("driver", {}).get("driver_id") or trip.get("driver_id") or "unknown_driver")
-        if not event_key and event_action == "start":
-            event_key = _normalize_event_key(trip_id, driver_id, event_type, episode_start_ts)
-
-        # Always keep trip-level risk summary fresh.
-        base_set = {
-            "risk_score": payload.get("risk_score"),
-            "risk_level": payload.get("risk_level", "UNKNOWN"),
-            "last_ai_update": datetime.utcnow(),
-        }
-
-        if event_action == "end":
-            query = {"trip_id": trip_id}
-            if episode_id:
-                query["ai_events.episode_id"] = episode_id
-            elif event_key:
-                query["ai_events.event_key"] = event_key
+        item = _prepare_trip_ai_result(trip_id, trip, payload)
+        event_type = item["event_type"]
+        base_set = item["base_set"]
+
+        if item["action"] == "end":
+            if item["episode_id"]:
+                match = ("episode_id", item["episode_id"])
+            elif item["event_key"]:
+                match = ("event_key", item["event_key"])
             else:
                 return jsonify({"message": "episode end ignored: missing episode_id/event_key"}), 200
 
-            end_ts = str(payload.get("episode_end_ts") or payload.get("timestamp") or datetime.utcnow().isoformat())
-            duration_s = payload.get("duration_s")
-
-            update_doc = {
-                "$set": {
-                    **base_set,
-                    "ai_events.$.end_time": end_ts,
-                    "ai_events.$.duration_s": duration_s,
-                    "ai_events.$.status": "ended",
-                }
-            }
-            result = trips_collection.update_one(query, update_doc)
-            if result.modified_count > 0:
+            trips_collection.update_one({"trip_id": trip_id}, {"$set": base_set})
+            if _end_ai_episode(trip, *match, item["end_set"]) > 0:
                 return jsonify({"message": "AI episode ended", "trip_id": trip_id, "event_type": event_type}), 200
             return jsonify({"message": "AI episode end skipped (not found)", "trip_id": trip_id, "event_type": event_type}), 200
 
-        if event_action == "start" and event_key:
-            exists = trips_collection.find_one(
-                {"trip_id": trip_id, "ai_events.event_key": event_key},
-                {"_id": 1},
-            )
-            if exists:
+        if item["action"] == "start" and item["event_key"]:
+            if _ai_event_key_exists(trip, item["event_key"]):
                 trips_collection.update_one({"trip_id": trip_id}, {"$set": base_set})
                 return jsonify({"message": "Duplicate episode ignored", "trip_id": trip_id, "event_type": event_type}), 200
 
-        event = {
-            "timestamp": payload.get("timestamp") or datetime.utcnow().isoformat(),
-            "start_time": episode_start_ts if event_action == "start" else None,
-            "end_time": None,
-            "status": "active" if event_action == "start" else "frame",
-            "event_action": event_action,
-            "event_key": event_key,
-            "episode_id": episode_id,
-            "event_type": event_type,
-            "event_labels": labels,
-            "detections": detections,
-            "risk_score": payload.get("risk_score"),
-            "risk_score_temporal": payload.get("risk_score_temporal"),
-            "risk_score_weighted": payload.get("risk_score_weighted"),
-            "risk_level": payload.get("risk_level", "UNKNOWN"),
-            "risk_level_temporal": payload.get("risk_level_temporal"),
-            "risk_level_weighted": payload.get("risk_level_weighted"),
-            "reasons": payload.get("reasons", []),
-            "sos_triggered": bool(payload.get("sos_triggered", False)),
-            "sos_source": payload.get("sos_source"),
-            "driver_emotion": payload.get("driver_emotion"),
-            "passenger_emotions": payload.get("passenger_emotions", []),
-            "metadata": payload.get("metadata", {}),
-            "source": source,
-        }
-
-        update_doc = {
-            "$set": {
-                **base_set,
-            },
-            "$push": {
-                "ai_events": event
-            }
-        }
-
-        trips_collection.update_one({"trip_id": trip_id}, update_doc)
+        _, seq = _reserve_seq({"trip_id": trip_id}, "ai_events", 1, {"$set": base_set})
+        if seq is None:
+            return jsonify({"error": "Trip not found"}), 404
+        try:
+            telemetry["ai_events"].append(trip_id, [item["event"]], seq)
+        except Exception:
+            _release_seq({"trip_id": trip_id}, "ai_events", seq, 1)
+            raise
 
         return jsonify({
             "message": "AI result recorded",
             "trip_id": trip_id,
             "risk_level": payload.get("risk_level", "UNKNOWN"),
             "risk_score": payload.get("risk_score"),
-            "source": source,
+            "source": item["source"],
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.post("/trips/<trip_id>/ai-results/batch")
+def add_ai_results_batch(trip_id):
+    """Attach a batch of AI results (start/end/frame) to a trip with a few bulk writes.
+
+    The trip is validated once and start events are de-duplicated in memory
+    (against the trip's stored event keys and earlier items of the batch). An
+    end whose episode starts in the same batch is folded into the appended entry;
+    other ends become positional `items.$` updates in the ai_events buckets,
+    applied after the append, so results match posting the items one by one.
+    """
+    try:
+        events = _batch_events_from_request()
+        if events is None:
+            return jsonify({"error": "expected a JSON list under 'events'"}), 400
+        if len(events) > AI_RESULTS_BATCH_MAX:
+            return jsonify({"error": f"batch too large (max {AI_RESULTS_BATCH_MAX})"}), 413
+
+        trip = trips_collection.find_one({"trip_id": trip_id}, {"trip_id": 1, "status": 1, "driver_id": 1, BUCKETED_FLAG: 1})
+        if not trip:
+            return jsonify({"error": "Trip not found"}), 404
+        if trip.get("status") != "ACTIVE":
+            return _trip_not_active_response(trip)
+
+        existing_keys = set()
+        if any(str(p.get("event_action") or "").strip().lower() == "start" for p in events):
+            # Only the event keys are needed for dedupe, not the stored events.
+            existing_keys = telemetry["ai_events"].values(trip_id, "event_key")
+            if not is_bucketed(trip):
+                stored = trips_collection.find_one({"trip_id": trip_id}, {"ai_events.event_key": 1}) or {}
+                existing_keys |= {e.get("event_key") for e in stored.get("ai_events") or [] if e.get("event_key")}
+
+        pushed = []
+        pushed_by_episode = {}
+        pushed_by_key = {}
+        ends = []
+        base_set = None
+        counts = {"recorded": 0, "ended": 0, "duplicates": 0, "ignored": 0}
+
+        for payload in events:
+            item = _prepare_trip_ai_result(trip_id, trip, payload)
+            base_set = item["base_set"]
+
+            if item["action"] == "end":
+                episode_id, event_key = item["episode_id"], item["event_key"]
+                if not (episode_id or event_key):
+                    counts["ignored"] += 1
+                    continue
+                started = pushed_by_episode.get(episode_id) if episode_id else pushed_by_key.get(event_key)
+                if started is not None:
+                    started.update(item["end_set"])
+                    counts["ended"] += 1
+                    continue
+                match = ("episode_id", episode_id) if episode_id else ("event_key", event_key)
+                ends.append((*match, item["end_set"]))
+                continue
+
+            event_key = item["event_key"]
+            if item["action"] == "start" and event_key:
+                if event_key in existing_keys:
+                    counts["duplicates"] += 1
+                    continue
+                existing_keys.add(event_key)
+
+            event = item["event"]
+            pushed.append(event)
+            counts["recorded"] += 1
+            if item["episode_id"]:
+                pushed_by_episode[item["episode_id"]] = event
+            if event_key:
+                pushed_by_key[event_key] = event
+
+        if pushed:
+            _, seq = _reserve_seq({"trip_id": trip_id}, "ai_events", len(pushed), {"$set": base_set})
+            if seq is None:
+                return jsonify({"error": "Trip not found"}), 404
+            try:
+                telemetry["ai_events"].append(trip_id, pushed, seq)
+            except Exception:
+                _release_seq({"trip_id": trip_id}, "ai_events", seq, len(pushed))
+                raise
+        elif base_set is not None:
+            trips_collection.update_one({"trip_id": trip_id}, {"$set": base_set})
+
+        ended_existing = 0
+        if ends and is_bucketed(trip):
+            ops = [telemetry["ai_events"].update_item_op(trip_id, *end) for end in ends]
+            result = telemetry["ai_events"].collection.bulk_write(ops, ordered=True)
+            ended_existing = int(result.modified_count)
+        elif ends:
+            # Unmigrated trip: an episode may still sit in the embedded array.
+            ended_existing = sum(_end_ai_episode(trip, *end) for end in ends)
+        counts["ended"] += ended_existing
+        counts["end_not_found"] = len(ends) - ended_existing
+
+        return jsonify({
+            "message": "AI results recorded",
+            "trip_id": trip_id,
+            "received": len(events),
+            **counts,
         }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1236,7 +1620,7 @@ def add_ai_result(trip_id):
 def add_sos_event(trip_id):
     """Receive SOS event from AI engine or mobile app and store in both trip and emergency feed."""
     try:
-        trip = trips_collection.find_one({"trip_id": trip_id})
+        trip = trips_collection.find_one({"trip_id": trip_id}, TRIP_HEADER_PROJECTION)
         if not trip:
             return jsonify({"error": "Trip not found"}), 404
 
@@ -1318,8 +1702,8 @@ def add_sos_event(trip_id):
 def add_sensor_data(trip_id):
     """Add sensor data to a trip"""
     try:
-        # Find the trip
-        trip = trips_collection.find_one({"trip_id": trip_id})
+        # Find the trip (header only; samples live in the sensor buckets)
+        trip = trips_collection.find_one({"trip_id": trip_id}, TRIP_HEADER_PROJECTION)
         if not trip:
             return jsonify({"error": "Trip not found"}), 404
         
@@ -1346,38 +1730,67 @@ def add_sensor_data(trip_id):
             "received_at": datetime.utcnow()
         }
         
-        # Append sensor data to trip (using $push to append to array)
-        result = trips_collection.update_one(
-            {"trip_id": trip_id},
-            {
-                "$push": {"sensor_data": sensor_record},
-                "$set": {"last_update": datetime.utcnow()}
-            }
-        )
-        
-        if result.matched_count == 0:
+        # Bump the header counter (which numbers the sample), then append it to its bucket
+        update_doc = {"$set": {"last_update": datetime.utcnow()}}
+        if has_stored_stats(trip):
+            update_doc["$max"] = {"max_speed": to_float(sensor_record["speed"])}
+        header, seq = _reserve_seq({"trip_id": trip_id}, "sensor_data", 1, update_doc)
+        if header is None:
             return jsonify({"error": "Trip not found"}), 404
+        try:
+            telemetry["sensor_data"].append(trip_id, [sensor_record], seq)
+        except Exception:
+            _release_seq({"trip_id": trip_id}, "sensor_data", seq, 1)
+            raise
         
         return jsonify({
             "message": "Sensor data added successfully",
             "trip_id": trip_id,
-            "sensor_count": len(trip.get("sensor_data", [])) + 1
+            "sensor_count": seq + 1
         }), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def _location_header_update(trip, trip_query, location_point, *, cas=True):
+    """(query, update) that records one path point on the trip header (last point, aggregates).
+
+    The distance increment is the segment from the header's previous point, so it
+    is only applied under a compare-and-set on path_count. With `cas=False` the
+    point is recorded without it and the distance is flagged stale instead.
+    The path_count increment is added by _reserve_seq.
+    """
+    query = dict(trip_query)
+    update = {
+        "$set": {
+            "last_update": datetime.utcnow(),
+            "last_lat": location_point["lat"],
+            "last_lng": location_point["lng"],
+        },
+    }
+    if has_stored_stats(trip):
+        # $max does not depend on order, so it never needs the compare-and-set.
+        update["$max"] = {"max_speed": to_float(location_point.get("speed"))}
+        if cas:
+            prev = point_lat_lon({"lat": trip.get("last_lat"), "lng": trip.get("last_lng")})
+            update["$inc"] = {"distance_km": segment_distance_km(prev, point_lat_lon(location_point))}
+            query[COUNT_FIELDS["path"]] = trip.get(COUNT_FIELDS["path"])
+        else:
+            update["$set"][DISTANCE_STALE_FIELD] = True
+    return query, update
+
+
 @app.post("/trips/<trip_id>/location")
 def add_location(trip_id):
     """Add a GPS location point to trip path"""
     try:
         # Find the trip (accept either trip_id or Mongo _id)
-        trip = trips_collection.find_one({"trip_id": trip_id})
+        trip = trips_collection.find_one({"trip_id": trip_id}, TRIP_HEADER_PROJECTION)
         trip_query = {"trip_id": trip_id}
         if not trip:
             try:
                 oid = ObjectId(trip_id)
-                trip = trips_collection.find_one({"_id": oid})
+                trip = trips_collection.find_one({"_id": oid}, TRIP_HEADER_PROJECTION)
                 trip_query = {"_id": oid}
             except Exception:
                 trip = None
@@ -1406,21 +1819,36 @@ def add_location(trip_id):
             "timestamp": location_data["timestamp"],
         }
         
-        # Append location to path array using $push (append, never overwrite)
-        result = trips_collection.update_one(
-            trip_query,
-            {
-                "$push": {"path": location_point},
-                "$set": {
-                    "last_update": datetime.utcnow(),
-                    "last_lat": location_data["latitude"],
-                    "last_lng": location_data["longitude"],
-                }
-            }
-        )
-        
-        if result.matched_count == 0:
+        # Update the header aggregates first: the distance increment is the segment
+        # from the previous point (last_lat/last_lng), so it only applies if no other
+        # point landed since the header was read; otherwise re-read and retry. The
+        # last attempt gives up on the increment and flags the distance stale.
+        # The same update numbers the point, so bucket order matches header order.
+        header, seq = None, None
+        for attempt in range(LOCATION_UPDATE_ATTEMPTS):
+            cas = attempt < LOCATION_UPDATE_ATTEMPTS - 1
+            query, update = _location_header_update(trip, trip_query, location_point, cas=cas)
+            header, seq = _reserve_seq(query, "path", 1, update)
+            if header is not None:
+                break
+            trip = trips_collection.find_one(trip_query, TRIP_HEADER_PROJECTION)
+            if not trip:
+                break
+
+        if header is None:
             return jsonify({"error": "Trip not found"}), 404
+
+        # Append to the trip's path bucket under the reserved number (append, never overwrite).
+        # If that fails, roll the header back to the previous point unless another
+        # point has been recorded since (see _release_seq).
+        try:
+            telemetry["path"].append(header.get("trip_id"), [location_point], seq)
+        except Exception:
+            undo = {"$set": {"last_lat": trip.get("last_lat"), "last_lng": trip.get("last_lng")}}
+            if "$inc" in update:
+                undo["$inc"] = {field: -value for field, value in update["$inc"].items()}
+            _release_seq(trip_query, "path", seq, 1, undo)
+            raise
         
         return jsonify({
             "message": "Location added to path",
@@ -1437,11 +1865,11 @@ def add_location(trip_id):
 def get_sensor_data(trip_id):
     """Fetch all sensor data for a trip"""
     try:
-        trip = trips_collection.find_one({"trip_id": trip_id})
+        trip = trips_collection.find_one({"trip_id": trip_id}, {"trip_id": 1, "sensor_data": 1})
         if not trip:
             return jsonify({"error": "Trip not found"}), 404
         
-        sensor_data = trip.get("sensor_data", [])
+        sensor_data = telemetry.load_into(trip, "sensor_data")["sensor_data"]
         
         # Convert timestamps to ISO format
         for record in sensor_data:
@@ -1461,8 +1889,8 @@ def get_sensor_data(trip_id):
 def end_trip(trip_id):
     """End a trip and mark it as COMPLETED"""
     try:
-        # Find the trip
-        trip = trips_collection.find_one({"trip_id": trip_id})
+        # Find the trip (AI events are needed for the emotion summary; path/sensors are not)
+        trip = trips_collection.find_one({"trip_id": trip_id}, {"path": 0, "sensor_data": 0})
         if not trip:
             return jsonify({"error": "Trip not found"}), 404
         
@@ -1470,9 +1898,9 @@ def end_trip(trip_id):
         if trip.get("status") == "COMPLETED":
             return jsonify({"error": "Trip is already completed"}), 400
 
-        path = trip.get("path", []) or []
-        distance_km = compute_trip_distance_km(path)
-        max_speed = compute_max_speed(trip)
+        telemetry.load_into(trip, "ai_events")
+
+        distance_km, max_speed = _trip_stats(trip)
         end_time = datetime.utcnow()
         emotion_summary = compute_emotion_trip_summary(trip, trip_end_time=end_time)
         
@@ -1506,8 +1934,10 @@ def end_trip(trip_id):
         
         if result.matched_count == 0:
             return jsonify({"error": "Trip not found"}), 404
+        _mark_trip_inactive(trip_id)
+        _notify_ai_engine_trip_ended(trip_id)
         
-        sensor_count = len(trip.get("sensor_data", []))
+        sensor_count = _series_count(trip, "sensor_data")
         
         return jsonify({
             "message": "Trip completed successfully",
@@ -1526,38 +1956,17 @@ def end_trip(trip_id):
 
 @app.get("/trips/<trip_id>/distance")
 def get_trip_distance(trip_id):
-    """Calculate and return total distance traveled for a trip."""
+    """Return total distance traveled for a trip (from the header aggregates)."""
     try:
-        trip = trips_collection.find_one({"trip_id": trip_id})
+        trip = trips_collection.find_one({"trip_id": trip_id}, TRIP_HEADER_PROJECTION)
         if not trip:
             return jsonify({"error": "Trip not found"}), 404
-        
-        path = trip.get("path", [])
-        if len(path) < 2:
-            return jsonify({
-                "trip_id": trip_id,
-                "distance_km": 0.0,
-                "points_count": len(path)
-            }), 200
-        
-        total_distance = 0.0
-        for i in range(1, len(path)):
-            prev = path[i - 1]
-            current = path[i]
-            
-            prev_lat = float(prev.get("lat", 0))
-            prev_lon = float(prev.get("lon", 0))
-            curr_lat = float(current.get("lat", 0))
-            curr_lon = float(current.get("lon", 0))
-            
-            if prev_lat and prev_lon and curr_lat and curr_lon:
-                distance = haversine_distance(prev_lat, prev_lon, curr_lat, curr_lon)
-                total_distance += distance
-        
+
+        distance_km, _ = _trip_stats(trip)
         return jsonify({
             "trip_id": trip_id,
-            "distance_km": round(total_distance, 2),
-            "points_count": len(path)
+            "distance_km": distance_km,
+            "points_count": _series_count(trip, "path")
         }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1567,7 +1976,7 @@ def get_trip_distance(trip_id):
 def get_active_trip_distance():
     """Return distance summary for the currently active trip (if any)."""
     try:
-        trip = trips_collection.find_one({"status": "ACTIVE"}, sort=[("start_time", -1)])
+        trip = trips_collection.find_one({"status": "ACTIVE"}, TRIP_HEADER_PROJECTION, sort=[("start_time", -1)])
         if not trip:
             return jsonify({
                 "active_trip": False,
@@ -1576,34 +1985,12 @@ def get_active_trip_distance():
                 "points_count": 0
             }), 200
 
-        trip_id = trip.get("trip_id")
-        path = trip.get("path", [])
-        if len(path) < 2:
-            return jsonify({
-                "active_trip": True,
-                "trip_id": trip_id,
-                "distance_km": 0.0,
-                "points_count": len(path)
-            }), 200
-
-        total_distance = 0.0
-        for i in range(1, len(path)):
-            prev = path[i - 1]
-            current = path[i]
-
-            prev_lat = float(prev.get("lat", 0))
-            prev_lon = float(prev.get("lon", 0))
-            curr_lat = float(current.get("lat", 0))
-            curr_lon = float(current.get("lon", 0))
-
-            if prev_lat and prev_lon and curr_lat and curr_lon:
-                total_distance += haversine_distance(prev_lat, prev_lon, curr_lat, curr_lon)
-
+        distance_km, _ = _trip_stats(trip)
         return jsonify({
             "active_trip": True,
-            "trip_id": trip_id,
-            "distance_km": round(total_distance, 2),
-            "points_count": len(path)
+            "trip_id": trip.get("trip_id"),
+            "distance_km": distance_km,
+            "points_count": _series_count(trip, "path")
         }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1613,7 +2000,11 @@ def get_active_trip_distance():
 def get_active_trip_live_map():
     """Return live map data for the currently active trip."""
     try:
-        trip = trips_collection.find_one({"status": "ACTIVE"}, sort=[("start_time", -1)])
+        trip = trips_collection.find_one(
+            {"status": "ACTIVE"},
+            {"trip_id": 1, "start_time": 1, "path": 1},
+            sort=[("start_time", -1)],
+        )
         if not trip:
             return jsonify(
                 {
@@ -1623,7 +2014,7 @@ def get_active_trip_live_map():
                 }
             ), 200
 
-        path = trip.get("path", []) or []
+        path = telemetry.load_into(trip, "path")["path"]
         current_point = path[-1] if path else {}
 
         lat = current_point.get("lat")
@@ -1654,12 +2045,12 @@ def get_active_trip_live_map():
 def get_trip_live_map(trip_id):
     """Live map payload for a specific trip (same shape as active-trip live_map when trip is ACTIVE)."""
     try:
-        trip = trips_collection.find_one({"trip_id": trip_id})
+        trip = trips_collection.find_one({"trip_id": trip_id}, {"trip_id": 1, "status": 1, "start_time": 1, "path": 1})
         if not trip:
             return jsonify({"error": "Trip not found"}), 404
 
         active = trip.get("status") == "ACTIVE"
-        path = trip.get("path", []) or []
+        path = telemetry.load_into(trip, "path")["path"]
         current_point = path[-1] if path else {}
         lat = current_point.get("lat")
         lng = current_point.get("lng", current_point.get("lon"))
@@ -1728,7 +2119,7 @@ def get_location(trip_id):
         return None
 
     def _extract_from_path(path_points):
-        for point in reversed(path_points or []):
+        for point in path_points:
             lat = _to_float(point.get("lat"))
             lon = _to_float(point.get("lng"))
             if lon is None:
@@ -1744,7 +2135,7 @@ def get_location(trip_id):
         return None, None, None
 
     def _extract_from_sensor_data(sensor_rows):
-        for row in reversed(sensor_rows or []):
+        for row in sensor_rows:
             lat = _to_float(row.get("latitude"))
             lon = _to_float(row.get("longitude"))
             if lon is None:
@@ -1764,18 +2155,20 @@ def get_location(trip_id):
         return None, None, None
 
     try:
-        trip = trips_collection.find_one({"trip_id": trip_id})
+        projection = {"trip_id": 1, "path": 1, "sensor_data": 1}
+        trip = trips_collection.find_one({"trip_id": trip_id}, projection)
         if not trip:
             try:
-                trip = trips_collection.find_one({"_id": ObjectId(trip_id)})
+                trip = trips_collection.find_one({"_id": ObjectId(trip_id)}, projection)
             except Exception:
                 trip = None
         if not trip:
             return jsonify({"status": "NOT_FOUND", "lat": None, "lon": None, "timestamp": None}), 404
 
-        lat, lon, ts = _extract_from_path(trip.get("path", []) or [])
+        # Newest first; only the most recent bucket is read in the common case.
+        lat, lon, ts = _extract_from_path(telemetry.iter_reversed(trip, "path"))
         if lat is None or lon is None:
-            lat, lon, ts = _extract_from_sensor_data(trip.get("sensor_data", []) or [])
+            lat, lon, ts = _extract_from_sensor_data(telemetry.iter_reversed(trip, "sensor_data"))
 
         if lat is None or lon is None:
             return jsonify({"status": "NO_DATA", "lat": None, "lon": None, "timestamp": None}), 200
@@ -1791,11 +2184,11 @@ def sos(trip_id):
     try:
         trip = None
         try:
-            trip = trips_collection.find_one({"_id": ObjectId(trip_id)})
+            trip = trips_collection.find_one({"_id": ObjectId(trip_id)}, TRIP_HEADER_PROJECTION)
         except Exception:
             trip = None
         if not trip:
-            trip = trips_collection.find_one({"trip_id": trip_id})
+            trip = trips_collection.find_one({"trip_id": trip_id}, TRIP_HEADER_PROJECTION)
 
         if not trip:
             return jsonify({"error": "Trip not found"}), 404
@@ -1808,9 +2201,13 @@ def sos(trip_id):
 
 @app.get("/is-active-trip/<trip_id>")
 def is_active_trip(trip_id):
-    """Check if trip is currently active."""
+    """Check if trip is currently active (ACTIVE trips are answered from memory)."""
     try:
-        trip = trips_collection.find_one({"trip_id": trip_id})
+        version, active_drivers = _active_trips_snapshot()
+        if trip_id in active_drivers:
+            return jsonify({"trip_id": trip_id, "is_active": True, "status": "ACTIVE", "version": version}), 200
+
+        trip = trips_collection.find_one({"trip_id": trip_id}, {"status": 1, "_id": 0})
         if not trip:
             return jsonify({"is_active": False, "message": "Trip not found"}), 200
         
@@ -1824,122 +2221,232 @@ def is_active_trip(trip_id):
         return jsonify({"error": str(e)}), 500
 
 
+@app.get("/active-trips")
+def get_active_trips():
+    """Versioned list of ACTIVE trip ids (and their drivers); a matching `If-None-Match` gets a 304.
+
+    The ETag includes the boot id, so versions never collide across restarts.
+    """
+    try:
+        version, active_drivers = _active_trips_snapshot()
+        etag = f"{SERVER_BOOT_ID}:{version}"
+        if request.if_none_match.contains(etag):
+            resp = Response(status=304)
+        else:
+            resp = jsonify({
+                "boot_id": SERVER_BOOT_ID,
+                "version": version,
+                "trip_ids": sorted(active_drivers),
+                "drivers": active_drivers,
+            })
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _prepare_background_event(payload):
+    """Normalize one background (no active trip) event.
+
+    Returns {"skip": message} for anti-flood rejects, an end item with
+    "end_set", or a start/frame item with the events-collection document.
+    """
+    detections = payload.get("detections", {})
+    labels = _extract_detection_labels(detections)
+    event_action = str(payload.get("event_action") or "frame").strip().lower()
+    episode_id = str(payload.get("episode_id") or "").strip() or None
+    event_key = str(payload.get("event_key") or "").strip() or None
+    incoming_type_raw = (payload.get("event_type") or "").strip()
+    is_sos = bool(payload.get("is_sos", False))
+    is_generic_type = (not incoming_type_raw) or (incoming_type_raw in {"DETECTION", "AI Detection", "AI_DETECTION"})
+
+    # Avoid flooding with empty frames - only store if there's actual content
+    risk_lvl = str(payload.get("risk_level") or "").upper()
+    risk_w = payload.get("risk_score_weighted")
+    try:
+        risk_w_f = float(risk_w) if risk_w is not None else 0.0
+    except (TypeError, ValueError):
+        risk_w_f = 0.0
+    meaningful_risk = risk_lvl in {"MODERATE", "HIGH", "CRITICAL"} or risk_w_f >= 21.0
+
+    # Reject generic empty frames regardless of risk-level bucket to avoid
+    # filling DB with synthetic DETECTION rows that have no actual detections.
+    if (not labels) and (not is_sos) and is_generic_type and event_action != "start":
+        return {"skip": "No detections; event skipped"}
+
+    # Additional strict check: if completely empty and not SOS/high-risk, skip it
+    has_meaningful_data = bool(labels) or is_sos or meaningful_risk
+    if not has_meaningful_data and is_generic_type:
+        return {"skip": "No meaningful data; event skipped"}
+
+    incoming_type = incoming_type_raw
+    if is_generic_type:
+        # Prefer a stable primary label; keep full list in event_labels.
+        incoming_type = labels[0] if labels else "DETECTION"
+
+    source = _normalize_ai_source(payload.get("source") or payload.get("sos_source") or "ai_engine")
+
+    item = {"action": event_action, "episode_id": episode_id, "event_key": event_key, "source": source}
+    if event_action == "end":
+        item["end_set"] = {
+            "end_time": payload.get("episode_end_ts") or payload.get("timestamp") or datetime.utcnow().isoformat(),
+            "duration_s": payload.get("duration_s"),
+            "status": "ended",
+            "received_at": datetime.utcnow(),
+        }
+        return item
+
+    item["event"] = {
+        "event_id": str(uuid.uuid4()),
+        "trip_id": payload.get("trip_id"),
+        "timestamp": payload.get("timestamp") or datetime.utcnow().isoformat(),
+        "start_time": payload.get("episode_start_ts") or payload.get("timestamp") or datetime.utcnow().isoformat(),
+        "end_time": None,
+        "status": "active" if event_action == "start" else "frame",
+        "event_action": event_action,
+        "episode_id": episode_id,
+        "event_key": event_key,
+        "event_type": incoming_type,
+        "event_labels": labels,
+        "detections": detections,
+        "risk_score_temporal": payload.get("risk_score_temporal"),
+        "risk_score_weighted": payload.get("risk_score_weighted"),
+        "risk_level": payload.get("risk_level"),
+        "reasons": payload.get("reasons", []),
+        "is_sos": is_sos,
+        "sos_source": payload.get("sos_source"),
+        "driver_emotion": payload.get("driver_emotion"),
+        "passenger_emotions": payload.get("passenger_emotions", []),
+        "source": source,
+        "metadata": payload.get("metadata", {}),
+        "received_at": datetime.utcnow()
+    }
+    return item
+
+
 @app.post("/events")
 def add_event():
     """Store event when no active trip (background monitoring mode)."""
     try:
         payload = request.get_json(silent=True) or {}
-        
-        detections = payload.get("detections", {})
-        labels = _extract_detection_labels(detections)
-        event_action = str(payload.get("event_action") or "frame").strip().lower()
-        episode_id = str(payload.get("episode_id") or "").strip() or None
-        event_key = str(payload.get("event_key") or "").strip() or None
-        incoming_type_raw = (payload.get("event_type") or "").strip()
-        is_sos = bool(payload.get("is_sos", False))
-        is_generic_type = (not incoming_type_raw) or (incoming_type_raw in {"DETECTION", "AI Detection", "AI_DETECTION"})
-
-        # Avoid flooding with empty frames - only store if there's actual content
-        risk_lvl = str(payload.get("risk_level") or "").upper()
-        risk_w = payload.get("risk_score_weighted")
-        try:
-            risk_w_f = float(risk_w) if risk_w is not None else 0.0
-        except (TypeError, ValueError):
-            risk_w_f = 0.0
-        meaningful_risk = risk_lvl in {"MODERATE", "HIGH", "CRITICAL"} or risk_w_f >= 21.0
-
-        # Reject generic empty frames regardless of risk-level bucket to avoid
-        # filling DB with synthetic DETECTION rows that have no actual detections.
-        if (not labels) and (not is_sos) and is_generic_type and event_action != "start":
-            return jsonify({"message": "No detections; event skipped"}), 200
-        
-        # Additional strict check: if completely empty and not SOS/high-risk, skip it
-        has_meaningful_data = bool(labels) or is_sos or meaningful_risk
-        if not has_meaningful_data and is_generic_type:
-            return jsonify({"message": "No meaningful data; event skipped"}), 200
-
-        incoming_type = incoming_type_raw
-        if is_generic_type:
-            # Prefer a stable primary label; keep full list in event_labels.
-            incoming_type = labels[0] if labels else "DETECTION"
-
-        source_raw = str(payload.get("source") or payload.get("sos_source") or "ai_engine").strip().lower()
-        if "mobile" in source_raw:
-            source = "mobile_app"
-        elif "ai" in source_raw:
-            source = "ai_engine"
-        else:
-            source = source_raw or "ai_engine"
+        item = _prepare_background_event(payload)
+        if "skip" in item:
+            return jsonify({"message": item["skip"]}), 200
 
-        if event_action == "end":
-            end_ts = payload.get("episode_end_ts") or payload.get("timestamp") or datetime.utcnow().isoformat()
-            duration_s = payload.get("duration_s")
+        if item["action"] == "end":
             query = {}
-            if episode_id:
-                query["episode_id"] = episode_id
-            elif event_key:
-                query["event_key"] = event_key
+            if item["episode_id"]:
+                query["episode_id"] = item["episode_id"]
+            elif item["event_key"]:
+                query["event_key"] = item["event_key"]
             else:
                 return jsonify({"message": "episode end ignored: missing episode_id/event_key"}), 200
 
-            result = events_collection.update_one(
-                query,
-                {
-                    "$set": {
-                        "end_time": end_ts,
-                        "duration_s": duration_s,
-                        "status": "ended",
-                        "received_at": datetime.utcnow(),
-                    }
-                },
-            )
+            result = events_collection.update_one(query, {"$set": item["end_set"]})
             if result.modified_count > 0:
                 return jsonify({"message": "Event episode ended"}), 200
             return jsonify({"message": "Episode end skipped (not found)"}), 200
 
-        if event_action == "start" and event_key:
-            exists = events_collection.find_one({"event_key": event_key}, {"_id": 1})
+        if item["action"] == "start" and item["event_key"]:
+            exists = events_collection.find_one({"event_key": item["event_key"]}, {"_id": 1})
             if exists:
                 return jsonify({"message": "Duplicate episode ignored"}), 200
 
-        event = {
-            "event_id": str(uuid.uuid4()),
-            "trip_id": payload.get("trip_id"),
-            "timestamp": payload.get("timestamp") or datetime.utcnow().isoformat(),
-            "start_time": payload.get("episode_start_ts") or payload.get("timestamp") or datetime.utcnow().isoformat(),
-            "end_time": None,
-            "status": "active" if event_action == "start" else "frame",
-            "event_action": event_action,
-            "episode_id": episode_id,
-            "event_key": event_key,
-            "event_type": incoming_type,
-            "event_labels": labels,
-            "detections": detections,
-            "risk_score_temporal": payload.get("risk_score_temporal"),
-            "risk_score_weighted": payload.get("risk_score_weighted"),
-            "risk_level": payload.get("risk_level"),
-            "reasons": payload.get("reasons", []),
-            "is_sos": is_sos,
-            "sos_source": payload.get("sos_source"),
-            "driver_emotion": payload.get("driver_emotion"),
-            "passenger_emotions": payload.get("passenger_emotions", []),
-            "source": source,
-            "metadata": payload.get("metadata", {}),
-            "received_at": datetime.utcnow()
-        }
-        
+        event = item["event"]
         result = events_collection.insert_one(event)
         
         return jsonify({
             "message": "Event recorded",
             "event_id": event["event_id"],
             "risk_level": event.get("risk_level"),
-            "source": source,
+            "source": item["source"],
         }), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.post("/events/batch")
+def add_events_batch():
+    """Store a batch of background events in one bulk_write.
+
+    Same per-item rules as POST /events. Start events are de-duplicated with
+    one `event_key` lookup plus in-memory tracking; an end whose episode starts
+    in the same batch is folded into the inserted document.
+    """
+    try:
+        events = _batch_events_from_request()
+        if events is None:
+            return jsonify({"error": "expected a JSON list under 'events'"}), 400
+        if len(events) > AI_RESULTS_BATCH_MAX:
+            return jsonify({"error": f"batch too large (max {AI_RESULTS_BATCH_MAX})"}), 413
+
+        items = [_prepare_background_event(p) for p in events]
+        start_keys = list({it["event_key"] for it in items if it.get("action") == "start" and it.get("event_key")})
+        existing_keys = set()
+        if start_keys:
+            existing_keys = {
+                doc.get("event_key")
+                for doc in events_collection.find({"event_key": {"$in": start_keys}}, {"event_key": 1, "_id": 0})
+            }
+
+        inserts = []
+        inserted_by_episode = {}
+        inserted_by_key = {}
+        end_ops = []
+        counts = {"recorded": 0, "ended": 0, "duplicates": 0, "skipped": 0, "ignored": 0}
+
+        for item in items:
+            if "skip" in item:
+                counts["skipped"] += 1
+                continue
+
+            if item["action"] == "end":
+                episode_id, event_key = item["episode_id"], item["event_key"]
+                if not (episode_id or event_key):
+                    counts["ignored"] += 1
+                    continue
+                started = inserted_by_episode.get(episode_id) if episode_id else inserted_by_key.get(event_key)
+                if started is not None:
+                    started.update(item["end_set"])
+                    counts["ended"] += 1
+                    continue
+                query = {"episode_id": episode_id} if episode_id else {"event_key": event_key}
+                end_ops.append(UpdateOne(query, {"$set": item["end_set"]}))
+                continue
+
+            event_key = item["event_key"]
+            if item["action"] == "start" and event_key:
+                if event_key in existing_keys:
+                    counts["duplicates"] += 1
+                    continue
+                existing_keys.add(event_key)
+
+            event = item["event"]
+            inserts.append(InsertOne(event))
+            counts["recorded"] += 1
+            if item["episode_id"]:
+                inserted_by_episode[item["episode_id"]] = event
+            if event_key:
+                inserted_by_key[event_key] = event
+
+        ops = inserts + end_ops
+        ended_existing = 0
+        if ops:
+            result = events_collection.bulk_write(ops, ordered=True)
+            ended_existing = int(result.modified_count)
+        counts["ended"] += ended_existing
+        counts["end_not_found"] = len(end_ops) - ended_existing
+
+        return jsonify({
+            "message": "Events recorded",
+            "received": len(events),
+            **counts,
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.get("/events")
 def get_events():
     """Fetch all events (background detections when no active trip)."""
@@ -1955,40 +2462,14 @@ def get_events():
         # Clients can request include_empty=0 to show only meaningful detections.
         include_empty = str(request.args.get("include_empty", "1")).lower() in {"1", "true", "yes"}
 
-        query = {}
-        if risk_level:
-            query["risk_level"] = risk_level
-        if event_type:
-            query["$or"] = [
-                {"event_type": event_type},
-                {"event_labels": event_type},
-                {"detections.type": event_type},
-                {"detections": event_type},
-            ]
-
-        # By default, suppress empty background frames (no detections) so the list shows actual events.
-        if not include_empty:
-            non_empty_clause = {
-                "$or": [
-                    {"detections.0": {"$exists": True}},
-                    {"is_sos": True},
-                    {"event_type": {"$nin": ["DETECTION", "AI Detection", "AI_DETECTION"]}},
-                ]
-            }
-            if "$and" in query:
-                query["$and"].append(non_empty_clause)
-            else:
-                query["$and"] = [non_empty_clause]
-
-        start_dt = _parse_iso_to_utc_naive(start)
-        end_dt = _parse_iso_to_utc_naive(end)
-        if start_dt or end_dt:
-            ra = {}
-            if start_dt:
-                ra["$gte"] = start_dt
-            if end_dt:
-                ra["$lt"] = end_dt
-            query["received_at"] = ra
+        # Shared with db_indexes' explain() checks.
+        query = events_query(
+            risk_level=risk_level,
+            event_type=event_type,
+            include_empty=include_empty,
+            start=_parse_iso_to_utc_naive(start),
+            end=_parse_iso_to_utc_naive(end),
+        )
 
         # Sort by server-side receipt time (datetime) to avoid mixed-type timestamp sorting issues
         # (some older docs may have timestamp stored as string vs datetime).
@@ -2038,7 +2519,8 @@ def get_emergency_events():
         skip = request.args.get("skip", 0, type=int)
         
         # Query trips that have sos_triggered set to True
-        sos_trips = list(trips_collection.find({"sos_triggered": True})
+        # Embedded ai_events are only loaded up to the first entry (unmigrated trips).
+        sos_trips = list(trips_collection.find({"sos_triggered": True}, {"path": 0, "sensor_data": 0, "ai_events": {"$slice": 1}})
                         .sort("sos_timestamp", -1)
                         .skip(skip)
                         .limit(limit))
@@ -2050,6 +2532,7 @@ def get_emergency_events():
             
             # Get SOS event details from the trip's sos_events array (latest one)
             sos_event_detail = trip.get("sos_events", [])[0] if trip.get("sos_events") else {}
+            first_ai_event = (trip.get("ai_events") or [None])[0] or telemetry["ai_events"].first(trip.get("trip_id"))
             
             event_obj = {
                 "event_id": trip.get("trip_id"),
@@ -2065,7 +2548,7 @@ def get_emergency_events():
                 "start_time": to_ist_display(trip.get("start_time")),
                 "end_time": to_ist_display(trip.get("end_time")),
                 "location": sos_event_detail.get("metadata", {}).get("location", {}),
-                "detections": trip.get("ai_events", [])[0].get("detections", []) if trip.get("ai_events") else [],
+                "detections": (first_ai_event or {}).get("detections", []),
                 "risk_level": trip.get("risk_level"),
                 "max_speed": trip.get("max_speed"),
                 "distance_km": trip.get("distance_km")
@@ -2111,18 +2594,28 @@ def get_driver_calibration_status(driver_id):
 
 @app.get("/drivers/<driver_id>/thresholds")
 def get_driver_thresholds(driver_id):
-    """Get personalized thresholds for a driver."""
+    """Get personalized thresholds for a driver.
+
+    The ETag is a hash of the thresholds, so a client revalidating with
+    `If-None-Match` gets a 304 while they are unchanged.
+    """
     try:
-        # Ensure calibration exists
-        if not get_driver_calibration(driver_id):
+        # One projected read; the calibration doc is only created when missing.
+        cal = calibration_collection.find_one({"driver_id": driver_id}, {"thresholds": 1, "is_calibrated": 1})
+        if not cal:
             create_driver_calibration(driver_id)
         
-        thresholds = get_personalized_thresholds(driver_id)
-        
-        return jsonify({
-            "driver_id": driver_id,
-            "thresholds": thresholds
-        }), 200
+        thresholds = thresholds_from_calibration(cal)
+        etag = hashlib.sha1(json.dumps(thresholds, sort_keys=True).encode("utf-8")).hexdigest()
+        if request.if_none_match.contains(etag):
+            resp = Response(status=304)
+        else:
+            resp = jsonify({
+                "driver_id": driver_id,
+                "thresholds": thresholds
+            })
+        resp.set_etag(etag)
+        return resp
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -2264,6 +2757,16 @@ def reset_driver_calibration(driver_id):
 
 
 if __name__ == "__main__":
+    if MONGO_ENSURE_INDEXES:
+        try:
+            for row in ensure_indexes(db):
+                if row["status"] == "created":
+                    print(f"✓ Created index {row['collection']}.{row['index']}")
+                elif row["status"] == "error":
+                    print(f"⚠ Index {row['collection']}.{row['index']} not created: {row['error']}")
+        except Exception as e:
+            print(f"⚠ Index bootstrap failed: {e}")
+
     # Register service on network via mDNS
     try:
         hostname = socket.gethostname()
@@ -74,8 +74,15 @@ def get_personalized_thresholds(driver_id: str) -> dict:
     Get personalized thresholds for a driver.
     Returns default thresholds if not yet calibrated.
     """
-    cal = calibration_collection.find_one({"driver_id": driver_id})
-    
+    cal = calibration_collection.find_one({"driver_id": driver_id}, {"thresholds": 1, "is_calibrated": 1})
+    return thresholds_from_calibration(cal)
+
+
+def thresholds_from_calibration(cal) -> dict:
+    """
+    Personalized thresholds from a calibration document (only `thresholds` and
+    `is_calibrated` are read). Returns defaults if missing or not yet calibrated.
+    """
     defaults = {
         "ear_drowsiness": 0.20,
         "mar_yawning": 0.08,
@@ -0,0 +1,200 @@
+"""
+Backend Model: MongoDB Index Bootstrap
+
+Declares the indexes behind every query pattern of backend/app.py and creates
+them idempotently (at backend startup and via tools/ensure_indexes.py).
+`create_index` with an existing name and key is a no-op on the server, so
+running this repeatedly is cheap.
+
+`explain_checks` runs the same query shapes through `explain()` and reports
+the ones still answered by a collection scan (or an in-memory sort), which is
+how a missing or unused index shows up.
+"""
+import os
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from event_filters import events_query
+from telemetry_store import BUCKET_COLLECTIONS
+
+# Set to 0 to skip index creation at backend startup (e.g. when a DBA manages them).
+MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "1").strip().lower() not in {"0", "false", "no", "off"}
+
+_PATH_BUCKETS = BUCKET_COLLECTIONS["path"]
+_SENSOR_BUCKETS = BUCKET_COLLECTIONS["sensor_data"]
+_AI_EVENT_BUCKETS = BUCKET_COLLECTIONS["ai_events"]
+
+
+def _bucket_indexes():
+    # Append upserts on (trip_id, bucket_no) and ordered reads of one trip; unique so
+    # two concurrent appends can never open the same bucket twice.
+    return [
+        ("trip_id_bucket_no", [("trip_id", ASCENDING), ("bucket_no", ASCENDING)], {"unique": True}),
+    ]
+
+
+# collection -> [(index name, keys, create_index options)]
+INDEX_SPECS = {
+    "trips": [
+        # Every per-trip endpoint; also guarantees trip ids never collide.
+        ("trip_id_unique", [("trip_id", ASCENDING)], {"unique": True}),
+        # Active-trip lookups (newest ACTIVE trip, registry resync, auto-complete on create)
+        # and GET /trips?status=...; the trailing _id matches the list's keyset order.
+        ("status_start_time_id", [("status", ASCENDING), ("start_time", DESCENDING), ("_id", DESCENDING)], {}),
+        # GET /trips pages: newest first, optionally per driver or risk level.
+        ("start_time_id", [("start_time", DESCENDING), ("_id", DESCENDING)], {}),
+        ("driver_id_start_time_id", [("driver_id", ASCENDING), ("start_time", DESCENDING), ("_id", DESCENDING)], {}),
+        ("risk_level_start_time_id", [("risk_level", ASCENDING), ("start_time", DESCENDING), ("_id", DESCENDING)], {}),
+        # Emergency feed: sos_triggered trips, newest SOS first.
+        ("sos_triggered_sos_timestamp", [("sos_triggered", ASCENDING), ("sos_timestamp", DESCENDING)], {}),
+    ],
+    _PATH_BUCKETS: _bucket_indexes(),
+    _SENSOR_BUCKETS: _bucket_indexes(),
+    # AI events are deduped by event_key and ended by episode_id/event_key inside
+    # the trip's buckets (these replace ai_events.event_key / ai_events.episode_id
+    # on trips, which only unmigrated trips still carry).
+    _AI_EVENT_BUCKETS: _bucket_indexes() + [
+        ("trip_id_items_event_key", [("trip_id", ASCENDING), ("items.event_key", ASCENDING)], {}),
+        ("trip_id_items_episode_id", [("trip_id", ASCENDING), ("items.episode_id", ASCENDING)], {}),
+    ],
+    "events": [
+        # Background episode dedupe (start) and episode end.
+        ("event_key", [("event_key", ASCENDING)], {}),
+        ("episode_id", [("episode_id", ASCENDING)], {}),
+        # GET /events: newest first, optional received_at range.
+        ("received_at_timestamp", [("received_at", DESCENDING), ("timestamp", DESCENDING)], {}),
+        # GET /events?risk_level=..., newest first.
+        ("risk_level_received_at", [("risk_level", ASCENDING), ("received_at", DESCENDING), ("timestamp", DESCENDING)], {}),
+        # GET /events?event_type=...: one index per branch of its $or (event_filters.event_type_clause),
+        # each ending in the list order so the branches are merged without an in-memory sort.
+        ("event_type_received_at", [("event_type", ASCENDING), ("received_at", DESCENDING), ("timestamp", DESCENDING)], {}),
+        ("event_labels_received_at", [("event_labels", ASCENDING), ("received_at", DESCENDING), ("timestamp", DESCENDING)], {}),
+        ("detections_type_received_at", [("detections.type", ASCENDING), ("received_at", DESCENDING), ("timestamp", DESCENDING)], {}),
+        ("detections_received_at", [("detections", ASCENDING), ("received_at", DESCENDING), ("timestamp", DESCENDING)], {}),
+    ],
+    "driver_calibrations": [
+        ("driver_id", [("driver_id", ASCENDING)], {}),
+    ],
+}
+
+# Server error codes for "an index with this key/name already exists but differs".
+_CONFLICT_CODES = {85, 86}
+
+
+def ensure_indexes(db, collections=None, dry_run: bool = False) -> list:
+    """Create the declared indexes that are missing; returns one report row per index."""
+    report = []
+    for coll_name, specs in INDEX_SPECS.items():
+        if collections is not None and coll_name not in collections:
+            continue
+        collection = db[coll_name]
+        try:
+            existing = collection.index_information()
+        except OperationFailure:
+            existing = {}
+        for name, keys, options in specs:
+            row = {"collection": coll_name, "index": name, "keys": keys}
+            if name in existing:
+                row["status"] = "exists"
+            elif dry_run:
+                row["status"] = "missing"
+            else:
+                try:
+                    collection.create_index(keys, name=name, **options)
+                    row["status"] = "created"
+                except OperationFailure as e:
+                    row["status"] = "error"
+                    if e.code in _CONFLICT_CODES:
+                        row["error"] = f"conflicts with an existing index on the same keys: {e}"
+                    elif e.code == 11000:
+                        row["error"] = f"duplicate values prevent a unique index: {e}"
+                    else:
+                        row["error"] = str(e)
+            report.append(row)
+    return report
+
+
+def _sample(db, coll_name: str, field: str, default):
+    doc = db[coll_name].find_one({field: {"$exists": True, "$ne": None}}, {field: 1})
+    value = doc
+    for part in field.split("."):
+        if isinstance(value, list):
+            value = value[0] if value else None
+        value = value.get(part) if isinstance(value, dict) else None
+    return value if value is not None else default
+
+
+def _query_checks(db) -> list:
+    """(check name, collection, filter, sort, limit) for the query shapes used by backend/app.py."""
+    trip_id = _sample(db, "trips", "trip_id", "00000000-0000-0000-0000-000000000000")
+    event_key = _sample(db, _AI_EVENT_BUCKETS, "items.event_key", "unknown|key")
+    episode_id = _sample(db, "events", "episode_id", "unknown-episode")
+    since = datetime.utcnow() - timedelta(days=1)
+    newest = [("received_at", DESCENDING), ("timestamp", DESCENDING)]
+    trip_pages = [("start_time", DESCENDING), ("_id", DESCENDING)]
+    return [
+        ("trip by trip_id", "trips", {"trip_id": trip_id}, None, 1),
+        ("newest ACTIVE trip", "trips", {"status": "ACTIVE"}, [("start_time", DESCENDING)], 1),
+        ("SOS feed", "trips", {"sos_triggered": True}, [("sos_timestamp", DESCENDING)], 100),
+        ("trip list page", "trips", {}, trip_pages, 51),
+        ("trip list by driver", "trips", {"driver_id": "unknown_driver"}, trip_pages, 51),
+        ("trip list by status", "trips", {"status": "COMPLETED"}, trip_pages, 51),
+        ("trip list by risk level", "trips", {"risk_level": "HIGH"}, trip_pages, 51),
+        ("path bucket by number", _PATH_BUCKETS, {"trip_id": trip_id, "bucket_no": 0}, None, 1),
+        ("path buckets of a trip", _PATH_BUCKETS, {"trip_id": trip_id}, [("bucket_no", ASCENDING)], 0),
+        ("sensor buckets of a trip", _SENSOR_BUCKETS, {"trip_id": trip_id}, [("bucket_no", ASCENDING)], 0),
+        ("trip AI event by event_key", _AI_EVENT_BUCKETS, {"trip_id": trip_id, "items.event_key": event_key}, None, 1),
+        ("trip AI event by episode_id", _AI_EVENT_BUCKETS, {"trip_id": trip_id, "items.episode_id": episode_id}, None, 1),
+        ("event by event_key", "events", {"event_key": event_key}, None, 1),
+        ("event by episode_id", "events", {"episode_id": episode_id}, None, 1),
+        # GET /events filters, built exactly as the endpoint builds them.
+        ("recent events", "events", events_query(), newest, 50),
+        ("events in time range", "events", events_query(start=since), newest, 50),
+        ("events by risk level", "events", events_query(risk_level="HIGH"), newest, 50),
+        ("events by event_type", "events", events_query(event_type="drowsiness"), newest, 50),
+        ("calibration by driver_id", "driver_calibrations", {"driver_id": "unknown_driver"}, None, 1),
+    ]
+
+
+def _plan_stages(plan) -> list:
+    stages = []
+    while isinstance(plan, dict):
+        if plan.get("stage"):
+            stages.append(plan["stage"])
+        for child in plan.get("inputStages") or []:
+            stages.extend(_plan_stages(child))
+        plan = plan.get("inputStage") or plan.get("queryPlan")
+    return stages
+
+
+def explain_checks(db) -> list:
+    """explain() each query shape; rows with `collscan` or `in_memory_sort` need an index."""
+    report = []
+    for name, coll_name, query, sort, limit in _query_checks(db):
+        cursor = db[coll_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        row = {"check": name, "collection": coll_name}
+        try:
+            plan = cursor.explain()
+        except OperationFailure as e:
+            row["error"] = str(e)
+            report.append(row)
+            continue
+        winning = (plan.get("queryPlanner") or {}).get("winningPlan") or {}
+        stats = plan.get("executionStats") or {}
+        stages = _plan_stages(winning)
+        row.update({
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+            "in_memory_sort": "SORT" in stages,
+            "docs_examined": stats.get("totalDocsExamined"),
+            "keys_examined": stats.get("totalKeysExamined"),
+            "returned": stats.get("nReturned"),
+            "millis": stats.get("executionTimeMillis"),
+        })
+        report.append(row)
+    return report
@@ -0,0 +1,57 @@
+"""
+Backend Model: Event List Filters
+
+Builds the MongoDB filter of `GET /events` from its query parameters. It lives
+outside app.py so db_indexes can explain() exactly the query the endpoint
+issues.
+"""
+
+# Stored event_type values of plain detection frames (no specific label).
+GENERIC_EVENT_TYPES = ["DETECTION", "AI Detection", "AI_DETECTION"]
+
+
+def event_type_clause(event_type):
+    """Match an event label wherever events store it.
+
+    Newer events carry `event_labels`; older ones only have `event_type` or a
+    `detections` list of labels or {type: ...} objects. Every branch has its own
+    index (see db_indexes), so the $or is answered by merged index scans.
+    """
+    return {
+        "$or": [
+            {"event_type": event_type},
+            {"event_labels": event_type},
+            {"detections.type": event_type},
+            {"detections": event_type},
+        ]
+    }
+
+
+def events_query(*, risk_level=None, event_type=None, include_empty=True, start=None, end=None):
+    """Filter for GET /events; `start` / `end` are naive-UTC datetimes bounding received_at."""
+    query = {}
+    if risk_level:
+        query["risk_level"] = risk_level
+    if event_type:
+        query.update(event_type_clause(event_type))
+
+    # Without include_empty, suppress empty background frames (no detections).
+    if not include_empty:
+        query["$and"] = [
+            {
+                "$or": [
+                    {"detections.0": {"$exists": True}},
+                    {"is_sos": True},
+                    {"event_type": {"$nin": GENERIC_EVENT_TYPES}},
+                ]
+            }
+        ]
+
+    if start or end:
+        ra = {}
+        if start:
+            ra["$gte"] = start
+        if end:
+            ra["$lt"] = end
+        query["received_at"] = ra
+    return query
@@ -0,0 +1,139 @@
+"""
+Backend Model: Path Geometry
+
+Vectorized (NumPy) geodesic helpers for trip paths. A path is converted to
+coordinate arrays once (`coord_arrays` / `path_arrays`); segment distances,
+cumulative distance, speeds from timestamps, the bounding box and the Web
+Mercator projection used for route images are then array operations instead of
+per-point Python loops.
+
+Conventions match trip_stats.segment_distance_km: a point whose lat or lon is
+missing, unparsable or 0 has no position, and a segment touching such a point
+counts as 0 km.
+"""
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Web Mercator is undefined at the poles; route images clamp latitudes to this.
+MERCATOR_MAX_LAT = 85.0511
+
+
+class PathArrays(NamedTuple):
+    lat: np.ndarray  # degrees, NaN when missing/unparsable
+    lon: np.ndarray  # degrees, NaN when missing/unparsable
+    ts: np.ndarray   # epoch seconds, NaN when missing/unparsable
+
+
+def _to_float(value) -> float:
+    if value is None or value == "":
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_epoch_seconds(value) -> float:
+    """Epoch seconds of an ISO string, datetime or epoch number (seconds or milliseconds)."""
+    if value is None or value == "":
+        return np.nan
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, (int, float)):
+        # Clients send either seconds or milliseconds since the epoch.
+        return float(value) / 1000.0 if abs(value) > 1e11 else float(value)
+    else:
+        try:
+            dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return np.nan
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def coord_arrays(path: list) -> tuple[np.ndarray, np.ndarray]:
+    """(lat, lon) arrays of path points (or sensor samples); NaN where missing/unparsable."""
+    path = path or []
+    n = len(path)
+    lat = np.fromiter((_to_float(p.get("lat", p.get("latitude"))) for p in path), dtype=float, count=n)
+    lon = np.fromiter(
+        (_to_float(p.get("lng", p.get("lon", p.get("longitude")))) for p in path), dtype=float, count=n
+    )
+    return lat, lon
+
+
+def path_arrays(path: list) -> PathArrays:
+    """Coordinate and timestamp arrays of path points, one entry per point."""
+    path = path or []
+    lat, lon = coord_arrays(path)
+    ts = np.fromiter((_to_epoch_seconds(p.get("timestamp")) for p in path), dtype=float, count=len(path))
+    return PathArrays(lat, lon, ts)
+
+
+def valid_points(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Mask of points with a usable position (finite and non-zero lat and lon)."""
+    return np.isfinite(lat) & np.isfinite(lon) & (lat != 0) & (lon != 0)
+
+
+def segment_distances_km(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Haversine km of each consecutive segment (len n-1); 0 where either end has no position."""
+    if lat.size < 2:
+        return np.zeros(0)
+    valid = valid_points(lat, lon)
+    lat_rad = np.radians(np.where(valid, lat, 0.0))
+    lon_rad = np.radians(np.where(valid, lon, 0.0))
+    dlat = np.diff(lat_rad)
+    dlon = np.diff(lon_rad)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat_rad[:-1]) * np.cos(lat_rad[1:]) * np.sin(dlon / 2) ** 2
+    dist = 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return np.where(valid[:-1] & valid[1:], dist, 0.0)
+
+
+def cumulative_distance_km(segments: np.ndarray) -> np.ndarray:
+    """Distance travelled up to each point (len n, starting at 0)."""
+    return np.concatenate(([0.0], np.cumsum(segments)))
+
+
+def segment_speeds_kmh(segments: np.ndarray, ts: np.ndarray) -> np.ndarray:
+    """km/h of each segment from the point timestamps; NaN where the time step is missing or not positive."""
+    if ts.size < 2:
+        return np.zeros(0)
+    hours = np.diff(ts) / 3600.0
+    ok = np.isfinite(hours) & (hours > 0)
+    return np.divide(segments, hours, out=np.full(segments.shape, np.nan), where=ok)
+
+
+def path_distance_km(path: list) -> float:
+    """Total haversine distance of a path in km (unrounded)."""
+    lat, lon = coord_arrays(path)
+    return float(segment_distances_km(lat, lon).sum())
+
+
+def bounding_box(lat: np.ndarray, lon: np.ndarray):
+    """(min_lat, min_lon, max_lat, max_lon) over finite points, or None when there are none."""
+    mask = np.isfinite(lat) & np.isfinite(lon)
+    if not mask.any():
+        return None
+    lat, lon = lat[mask], lon[mask]
+    return float(lat.min()), float(lon.min()), float(lat.max()), float(lon.max())
+
+
+def route_coords(path: list) -> tuple[np.ndarray, np.ndarray]:
+    """(lon, lat) arrays of the drawable points of a path, latitudes clamped for Web Mercator."""
+    lat, lon = coord_arrays(path)
+    mask = np.isfinite(lat) & np.isfinite(lon)
+    return lon[mask], np.clip(lat[mask], -MERCATOR_MAX_LAT, MERCATOR_MAX_LAT)
+
+
+def mercator_px(lon, lat, zoom, tile_size: int = 256):
+    """Global Web Mercator pixel (x, y) of lon/lat at a zoom level; broadcasts over arrays."""
+    scale = np.power(2.0, zoom) * tile_size
+    x = (np.asarray(lon, dtype=float) + 180.0) / 360.0 * scale
+    lat_rad = np.radians(np.asarray(lat, dtype=float))
+    y = (1.0 - (np.log(np.tan(lat_rad) + (1.0 / np.cos(lat_rad))) / np.pi)) / 2.0 * scale
+    return x, y
@@ -0,0 +1,211 @@
+"""
+Backend Model: Trip Telemetry Buckets
+
+GPS path points, sensor samples and AI events are stored outside the trip
+document, one collection per series. A bucket document holds up to
+TELEMETRY_BUCKET_SIZE items of a single trip:
+
+    {"trip_id": "...", "bucket_no": 3, "count": 37, "first_at": <datetime>,
+     "last_at": <datetime>, "items": [{..., "seq": 637}, ...]}
+
+Every item has a sequence number taken from the trip header counter of its
+series (path_count / sensor_count / ai_event_count): the writer `$inc`s the
+counter and uses the returned value, so concurrent writers never share a
+number. An item lives in bucket `seq // TELEMETRY_BUCKET_SIZE`, and appending
+is one upsert on the unique (trip_id, bucket_no) pair that `$push`es the item
+sorted by seq. A trip therefore never has two buckets with the same number,
+a bucket never holds more than TELEMETRY_BUCKET_SIZE items, and reads (sorted
+by bucket_no) return items in counter order. The trip document stays a compact
+header (driver, status, risk summary, SOS flags and the counters) no matter
+how long the trip runs. Indexes are declared in db_indexes.py.
+
+Trips created before buckets existed still carry embedded `path`,
+`sensor_data` and `ai_events` arrays until tools/migrate_telemetry_buckets.py
+moves them (into negative bucket numbers, ahead of anything appended since);
+`TripTelemetry.load_into` merges both so either layout reads the same. Trips
+stored in buckets are marked with `telemetry_buckets: true`.
+"""
+import os
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+TELEMETRY_BUCKET_SIZE = int(os.getenv("TELEMETRY_BUCKET_SIZE", "200"))
+
+# Trip document field -> bucket collection.
+BUCKET_COLLECTIONS = {
+    "path": "trip_path_buckets",
+    "sensor_data": "trip_sensor_buckets",
+    "ai_events": "trip_ai_event_buckets",
+}
+
+# Trip document field -> header counter kept next to the buckets.
+COUNT_FIELDS = {
+    "path": "path_count",
+    "sensor_data": "sensor_count",
+    "ai_events": "ai_event_count",
+}
+
+TELEMETRY_FIELDS = tuple(BUCKET_COLLECTIONS)
+
+# Projection for reads that only need the trip header (never the embedded arrays
+# of trips that have not been migrated yet).
+TRIP_HEADER_PROJECTION = {field: 0 for field in TELEMETRY_FIELDS}
+
+# Marker stored on trip documents whose telemetry lives in buckets.
+BUCKETED_FLAG = "telemetry_buckets"
+
+# Per-item sequence number (position in the series); stripped on read.
+SEQ_FIELD = "seq"
+
+
+def is_bucketed(trip: dict) -> bool:
+    """True when the trip was created (or migrated) with bucketed telemetry."""
+    return bool((trip or {}).get(BUCKETED_FLAG))
+
+
+class TelemetrySeries:
+    """One bucketed telemetry series (path, sensor_data or ai_events) of all trips."""
+
+    def __init__(self, collection, bucket_size: int = TELEMETRY_BUCKET_SIZE):
+        self.collection = collection
+        self.bucket_size = max(1, int(bucket_size))
+
+    def _bucket_chunks(self, items: list, start_seq: int):
+        """(bucket_no, items) groups of consecutive items, each item tagged with its seq."""
+        chunk, bucket_no = [], None
+        for offset, item in enumerate(items):
+            seq = start_seq + offset
+            if chunk and seq // self.bucket_size != bucket_no:
+                yield bucket_no, chunk
+                chunk = []
+            bucket_no = seq // self.bucket_size
+            chunk.append({**item, SEQ_FIELD: seq})
+        if chunk:
+            yield bucket_no, chunk
+
+    def append(self, trip_id: str, items: list, start_seq: int, now: datetime | None = None) -> int:
+        """Append items numbered start_seq, start_seq + 1, ... (reserved from the trip header counter)."""
+        now = now or datetime.utcnow()
+        items = list(items or [])
+        for bucket_no, chunk in self._bucket_chunks(items, int(start_seq)):
+            query = {"trip_id": trip_id, "bucket_no": bucket_no}
+            update = {
+                # Concurrent appends to one bucket may arrive out of order; $sort keeps it by seq.
+                "$push": {"items": {"$each": chunk, "$sort": {SEQ_FIELD: ASCENDING}}},
+                "$inc": {"count": len(chunk)},
+                "$min": {"first_at": now},
+                "$max": {"last_at": now},
+            }
+            try:
+                self.collection.update_one(query, update, upsert=True)
+            except DuplicateKeyError:
+                # Two upserts created the bucket at the same time; the loser now
+                # matches the winner's document.
+                self.collection.update_one(query, update, upsert=True)
+        return len(items)
+
+    def insert_buckets(self, trip_id: str, items: list, start_seq: int = 0, now: datetime | None = None) -> list:
+        """Write items as new buckets (used by the migration tool); returns the new _ids."""
+        now = now or datetime.utcnow()
+        docs = [
+            {"trip_id": trip_id, "bucket_no": bucket_no, "count": len(chunk), "first_at": now, "last_at": now, "items": chunk}
+            for bucket_no, chunk in self._bucket_chunks(list(items or []), int(start_seq))
+        ]
+        if not docs:
+            return []
+        return list(self.collection.insert_many(docs, ordered=True).inserted_ids)
+
+    @staticmethod
+    def _items(bucket: dict) -> list:
+        items = bucket.get("items") or []
+        for item in items:
+            item.pop(SEQ_FIELD, None)
+        return items
+
+    def load(self, trip_id: str, fields: tuple | list | None = None) -> list:
+        """All items of a trip in sequence order; `fields` limits the item keys fetched."""
+        projection = {f"items.{f}": 1 for f in fields} if fields else {"items": 1}
+        projection["_id"] = 0
+        items = []
+        for bucket in self.collection.find({"trip_id": trip_id}, projection).sort("bucket_no", ASCENDING):
+            items.extend(self._items(bucket))
+        return items
+
+    def iter_reversed(self, trip_id: str):
+        """Items newest first, one bucket at a time (stops fetching once the caller stops)."""
+        cursor = self.collection.find({"trip_id": trip_id}, {"items": 1, "_id": 0}).sort("bucket_no", DESCENDING)
+        for bucket in cursor:
+            yield from reversed(self._items(bucket))
+
+    def first(self, trip_id: str) -> dict | None:
+        bucket = self.collection.find_one(
+            {"trip_id": trip_id},
+            {"items": {"$slice": 1}, "_id": 0},
+            sort=[("bucket_no", ASCENDING)],
+        )
+        items = self._items(bucket or {})
+        return items[0] if items else None
+
+    def count(self, trip_id: str, bucket_query: dict | None = None) -> int:
+        query = {"trip_id": trip_id, **(bucket_query or {})}
+        return sum(int(b.get("count") or 0) for b in self.collection.find(query, {"count": 1, "_id": 0}))
+
+    def contains(self, trip_id: str, key: str, value) -> bool:
+        return self.collection.find_one({"trip_id": trip_id, f"items.{key}": value}, {"_id": 1}) is not None
+
+    def values(self, trip_id: str, key: str) -> set:
+        """Distinct non-empty values of one item key across the trip (e.g. stored event keys)."""
+        found = set()
+        for bucket in self.collection.find({"trip_id": trip_id}, {f"items.{key}": 1, "_id": 0}):
+            for item in bucket.get("items") or []:
+                value = item.get(key)
+                if value:
+                    found.add(value)
+        return found
+
+    def _item_update(self, trip_id: str, key: str, value, set_fields: dict) -> tuple:
+        return (
+            {"trip_id": trip_id, f"items.{key}": value},
+            {"$set": {f"items.$.{k}": v for k, v in set_fields.items()}},
+        )
+
+    def update_item_op(self, trip_id: str, key: str, value, set_fields: dict) -> UpdateOne:
+        """Positional update of the first item whose `key` equals `value` (for bulk_write)."""
+        return UpdateOne(*self._item_update(trip_id, key, value, set_fields))
+
+    def update_item(self, trip_id: str, key: str, value, set_fields: dict) -> int:
+        result = self.collection.update_one(*self._item_update(trip_id, key, value, set_fields))
+        return int(result.modified_count)
+
+    def delete_trip(self, trip_id: str, bucket_query: dict | None = None) -> int:
+        """Delete the trip's buckets (only those matching `bucket_query`, e.g. {"bucket_no": {"$lt": 0}})."""
+        return int(self.collection.delete_many({"trip_id": trip_id, **(bucket_query or {})}).deleted_count)
+
+
+class TripTelemetry:
+    """The three telemetry series of a database, addressed by trip document field name."""
+
+    def __init__(self, db, bucket_size: int = TELEMETRY_BUCKET_SIZE):
+        self.series = {
+            field: TelemetrySeries(db[name], bucket_size=bucket_size)
+            for field, name in BUCKET_COLLECTIONS.items()
+        }
+
+    def __getitem__(self, field: str) -> TelemetrySeries:
+        return self.series[field]
+
+    def load_into(self, trip: dict, *fields: str, item_fields: dict | None = None) -> dict:
+        """Fill trip[field] for each requested series: embedded (legacy) items, then bucket items."""
+        trip_id = trip.get("trip_id")
+        for field in fields or TELEMETRY_FIELDS:
+            embedded = list(trip.get(field) or [])
+            stored = self.series[field].load(trip_id, (item_fields or {}).get(field)) if trip_id else []
+            trip[field] = embedded + stored
+        return trip
+
+    def iter_reversed(self, trip: dict, field: str):
+        """Newest-first items of one series, including embedded (legacy) items last."""
+        if trip.get("trip_id"):
+            yield from self.series[field].iter_reversed(trip["trip_id"])
+        yield from reversed(trip.get(field) or [])
@@ -8,7 +8,7 @@ Usage:
 It prints:
 - whether a trip document exists
 - its status
-- ai_events count
+- ai_events count (embedded in the trip document + telemetry buckets)
 - events collection count filtered by trip_id
 
 This script is read-only.
@@ -17,9 +17,15 @@ This script is read-only.
 from __future__ import annotations
 
 import argparse
+import os
+import sys
 
 from pymongo import MongoClient
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telemetry_store import TripTelemetry  # noqa: E402
+
 
 def main() -> int:
     parser = argparse.ArgumentParser()
@@ -43,8 +49,9 @@ def main() -> int:
         print(f"trip: NOT FOUND (trip_id={trip_id})")
     else:
         status = trip.get("status")
-        ai_events = trip.get("ai_events", []) or []
-        print(f"trip: FOUND status={status} ai_events={len(ai_events)}")
+        embedded = len(trip.get("ai_events", []) or [])
+        bucketed = TripTelemetry(db)["ai_events"].count(trip_id)
+        print(f"trip: FOUND status={status} ai_events={embedded + bucketed} (embedded={embedded} buckets={bucketed})")
 
     ev_count = events.count_documents({"trip_id": trip_id})
     print(f"events: count(trip_id={trip_id}) = {ev_count}")
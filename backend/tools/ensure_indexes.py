@@ -0,0 +1,71 @@
+"""backend.tools.ensure_indexes
+
+Create the MongoDB indexes the backend queries rely on (see backend/db_indexes.py)
+and optionally check the query plans.
+
+Usage:
+  python backend/tools/ensure_indexes.py
+  python backend/tools/ensure_indexes.py --dry-run
+  python backend/tools/ensure_indexes.py --check
+
+--dry-run only lists missing indexes. --check runs every backend query shape
+through explain() and reports the ones answered by a collection scan
+(COLLSCAN) or an in-memory SORT; the exit code is 1 if any are found.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_indexes import ensure_indexes, explain_checks  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default="mongodb://localhost:27017/")
+    parser.add_argument("--db", default="ivs_db")
+    parser.add_argument("--dry-run", action="store_true", help="Only report missing indexes")
+    parser.add_argument("--check", action="store_true", help="explain() the backend queries after ensuring indexes")
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON")
+    args = parser.parse_args()
+
+    client = MongoClient(str(args.mongo))
+    db = client[str(args.db)]
+
+    indexes = ensure_indexes(db, dry_run=args.dry_run)
+    checks = explain_checks(db) if args.check else []
+
+    if args.json:
+        print(json.dumps({"indexes": indexes, "checks": checks}, indent=2, default=str))
+    else:
+        for row in indexes:
+            line = f"{row['status']:8} {row['collection']}.{row['index']}"
+            if row.get("error"):
+                line += f"  ({row['error']})"
+            print(line)
+        for row in checks:
+            if row.get("error"):
+                print(f"ERROR    {row['check']}: {row['error']}")
+                continue
+            flags = [f for f in ("collscan", "in_memory_sort") if row.get(f)]
+            print(
+                f"{'SLOW' if flags else 'ok':8} {row['check']} [{row['collection']}] "
+                f"stages={'>'.join(row['stages'])} docs={row['docs_examined']} keys={row['keys_examined']} "
+                f"returned={row['returned']} ms={row['millis']}"
+                + (f"  <- {', '.join(flags)}" if flags else "")
+            )
+
+    failed = any(row["status"] == "error" for row in indexes)
+    slow = any(row.get("collscan") or row.get("in_memory_sort") for row in checks)
+    return 1 if failed or slow else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
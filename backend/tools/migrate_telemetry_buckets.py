@@ -0,0 +1,132 @@
+"""backend.tools.migrate_telemetry_buckets
+
+Move embedded trip telemetry (`path`, `sensor_data`, `ai_events` arrays inside
+trip documents) into the bucket collections used by the backend
+(see backend/telemetry_store.py), leaving each trip as a compact header.
+
+Usage:
+  python backend/tools/migrate_telemetry_buckets.py --dry-run
+  python backend/tools/migrate_telemetry_buckets.py
+  python backend/tools/migrate_telemetry_buckets.py --trip-id <uuid> --include-active
+
+Per trip, the embedded items are written as buckets numbered below zero
+(sequence numbers -n .. -1), so they read before any item already appended to
+buckets (a trip that was active while the new backend started), which are left
+in place. The arrays are then `$unset`, the path_count/sensor_count/ai_event_count
+counters are `$inc`-ed by the number of moved items and `telemetry_buckets: true`
+is set, in one update. Trips without the distance_km/max_speed header
+aggregates (e.g. trips auto-completed by a new trip) get them computed from all
+of their items. A trip that fails half-way keeps its embedded arrays; a re-run
+deletes its negative buckets and writes them again.
+
+ACTIVE trips are skipped unless --include-active is given (points appended
+while their aggregates are computed would be missed); run it again after they
+complete.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_indexes import ensure_indexes  # noqa: E402
+from trip_stats import compute_max_speed, compute_trip_distance_km, has_stored_stats  # noqa: E402
+from telemetry_store import (  # noqa: E402
+    BUCKET_COLLECTIONS,
+    BUCKETED_FLAG,
+    COUNT_FIELDS,
+    TELEMETRY_BUCKET_SIZE,
+    TELEMETRY_FIELDS,
+    TripTelemetry,
+)
+
+
+def migrate_trip(trips, telemetry: TripTelemetry, trip: dict, *, dry_run: bool) -> dict:
+    trip_id = trip["trip_id"]
+    moved = {}
+    counts = {}
+    all_items = {}
+    for field in TELEMETRY_FIELDS:
+        series = telemetry[field]
+        embedded = list(trip.get(field) or [])
+        if not dry_run:
+            # Leftovers of an interrupted run; the embedded arrays are still the source.
+            series.delete_trip(trip_id, {"bucket_no": {"$lt": 0}})
+        appended = series.count(trip_id, {"bucket_no": {"$gte": 0}})
+        moved[field] = len(embedded)
+        counts[field] = len(embedded) + appended
+        if field in ("path", "sensor_data") and not has_stored_stats(trip):
+            all_items[field] = embedded + (series.load(trip_id) if appended else [])
+        if dry_run or not embedded:
+            continue
+        series.insert_buckets(trip_id, embedded, start_seq=-len(embedded))
+
+    header = {BUCKETED_FLAG: True}
+    if not has_stored_stats(trip):
+        header["distance_km"] = compute_trip_distance_km(all_items["path"])
+        header["max_speed"] = compute_max_speed(all_items)
+
+    if not dry_run:
+        trips.update_one(
+            {"_id": trip["_id"]},
+            {
+                "$unset": {field: "" for field in TELEMETRY_FIELDS},
+                "$set": header,
+                "$inc": {COUNT_FIELDS[field]: n for field, n in moved.items()},
+            },
+        )
+    return counts
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default="mongodb://localhost:27017/")
+    parser.add_argument("--db", default="ivs_db")
+    parser.add_argument("--trip-id", default=None, help="Migrate one trip only")
+    parser.add_argument("--bucket-size", type=int, default=TELEMETRY_BUCKET_SIZE)
+    parser.add_argument("--include-active", action="store_true", help="Also migrate ACTIVE trips")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be moved")
+    args = parser.parse_args()
+
+    client = MongoClient(str(args.mongo))
+    db = client[str(args.db)]
+    trips = db["trips"]
+    telemetry = TripTelemetry(db, bucket_size=args.bucket_size)
+    if not args.dry_run:
+        ensure_indexes(db, collections=set(BUCKET_COLLECTIONS.values()))
+
+    query = {BUCKETED_FLAG: {"$ne": True}}
+    if args.trip_id:
+        query["trip_id"] = str(args.trip_id).strip()
+    if not args.include_active:
+        query["status"] = {"$ne": "ACTIVE"}
+
+    migrated = 0
+    failed = 0
+    # Trip ids first, then one trip document at a time: the documents may be large.
+    trip_ids = [d["_id"] for d in trips.find(query, {"_id": 1})]
+    for oid in trip_ids:
+        trip = trips.find_one({"_id": oid})
+        if not trip or not trip.get("trip_id"):
+            continue
+        try:
+            counts = migrate_trip(trips, telemetry, trip, dry_run=args.dry_run)
+        except Exception as e:
+            failed += 1
+            print(f"trip {trip.get('trip_id')}: FAILED {e}")
+            continue
+        migrated += 1
+        summary = " ".join(f"{field}={n}" for field, n in counts.items())
+        print(f"trip {trip['trip_id']}: {'would move' if args.dry_run else 'moved'} {summary}")
+
+    print(f"{'dry run: ' if args.dry_run else ''}{migrated} trip(s) migrated, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
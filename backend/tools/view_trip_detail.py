@@ -1,9 +1,15 @@
+import os
+import sys
 from pymongo import MongoClient
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from telemetry_store import TripTelemetry
+
 # Connect to MongoDB
 client = MongoClient("mongodb://localhost:27017/")
-trips = list(client['ivs_db']['trips'].find().sort("_id", -1).limit(1))
+db = client['ivs_db']
+trips = list(db['trips'].find().sort("_id", -1).limit(1))
 
 if trips:
     trip = trips[0]
@@ -15,7 +21,7 @@ if trips:
     print(f"End Time: {trip.get('end_time', 'N/A')}")
     print(f"{'='*60}")
     
-    sensor_data = trip.get('sensor_data', [])
+    sensor_data = TripTelemetry(db).load_into(trip, 'sensor_data')['sensor_data']
     print(f"\nSensor Records: {len(sensor_data)}")
     print(f"{'-'*60}")
     
@@ -0,0 +1,97 @@
+"""
+Backend Model: Trip Summary Statistics
+
+Distance and speed summaries of a trip. They are maintained incrementally on
+the trip header while telemetry arrives (see add_location / add_sensor_data in
+app.py):
+
+- `distance_km`: running haversine distance, `$inc`-ed by the segment from the
+  previous point (`last_lat` / `last_lng`) to the new one
+- `max_speed`: `$max` of the speeds of path points and sensor samples
+- `path_count` / `sensor_count`: point counts
+- `distance_stale`: set instead of the distance increment when a location write
+  keeps losing the compare-and-set on the previous point to concurrent writes;
+  the next read recomputes `distance_km` from the path and clears it
+
+so list, detail, distance and report endpoints read them in O(1). The
+full-recompute helpers below remain for trips created before the header
+aggregates existed (and for the migration tool); the path distance is computed
+over NumPy arrays by geo.py.
+"""
+from math import radians, sin, cos, sqrt, atan2
+
+from geo import path_distance_km
+
+# Header fields that hold the incrementally maintained aggregates.
+STATS_FIELDS = ("distance_km", "max_speed")
+
+# Header flag: distance_km missed increments and must be recomputed from the path.
+DISTANCE_STALE_FIELD = "distance_stale"
+
+
+def has_stored_stats(trip: dict) -> bool:
+    """True when the trip header carries maintained aggregates."""
+    return all(field in (trip or {}) for field in STATS_FIELDS)
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """Calculate distance in kilometers between two lat/lon points using Haversine formula."""
+    R = 6371  # Earth's radius in km
+
+    lat1_rad = radians(lat1)
+    lat2_rad = radians(lat2)
+    delta_lat = radians(lat2 - lat1)
+    delta_lon = radians(lon2 - lon1)
+
+    a = sin(delta_lat / 2) ** 2 + cos(lat1_rad) * cos(lat2_rad) * sin(delta_lon / 2) ** 2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    distance = R * c
+    return distance
+
+
+def to_float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def point_lat_lon(point: dict):
+    """(lat, lon) of a path point or sensor sample; 0.0 for missing values, None if unparsable."""
+    try:
+        lat = float(point.get("lat", point.get("latitude", 0)) or 0)
+        lon = float(point.get("lng", point.get("lon", point.get("longitude", 0))) or 0)
+    except (TypeError, ValueError):
+        return None
+    return lat, lon
+
+
+def segment_distance_km(prev, curr) -> float:
+    """Haversine km between two (lat, lon) pairs; 0.0 when either end is missing or 0/0."""
+    if not prev or not curr:
+        return 0.0
+    prev_lat, prev_lon = prev
+    curr_lat, curr_lon = curr
+    if prev_lat and prev_lon and curr_lat and curr_lon:
+        return haversine_distance(prev_lat, prev_lon, curr_lat, curr_lon)
+    return 0.0
+
+
+def compute_max_speed(trip):
+    max_speed = 0.0
+
+    sensor_data = trip.get("sensor_data", []) or []
+    for point in sensor_data:
+        max_speed = max(max_speed, to_float(point.get("speed", 0)))
+
+    path = trip.get("path", []) or []
+    for point in path:
+        max_speed = max(max_speed, to_float(point.get("speed", 0)))
+
+    return round(max_speed, 2)
+
+
+def compute_trip_distance_km(path):
+    if not path or len(path) < 2:
+        return 0.0
+    return round(path_distance_km(path), 2)
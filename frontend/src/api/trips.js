@@ -18,14 +18,21 @@ function mapTrip(trip){
   }
 }
 
-export async function getTrips(){
-  const res = await fetch(`${API_BASE}/trips`)
+// One page of trips, newest first. `params`: limit, cursor (previous nextCursor),
+// driver_id, status, risk_level, start_from, start_to.
+export async function getTrips(params = {}){
+  const query = new URLSearchParams()
+  Object.entries(params).forEach(([key, value]) => {
+    if(value !== undefined && value !== null && value !== '') query.set(key, value)
+  })
+  const qs = query.toString()
+  const res = await fetch(`${API_BASE}/trips${qs ? `?${qs}` : ''}`)
   if(!res.ok) throw new Error('Failed to fetch trips')
   const data = await res.json()
   const trips = Array.isArray(data.trips) ? data.trips : []
   
-  // Backend already computes distance_km in /trips endpoint
-  return trips.map(mapTrip)
+  // Backend serves distance_km / max_speed from the stored trip aggregates
+  return { trips: trips.map(mapTrip), nextCursor: data.next_cursor || null }
 }
 
 export async function getTrip(id){
@@ -6,12 +6,40 @@ export default function Trips(){
   const [query, setQuery] = useState('')
   const [selectedDate, setSelectedDate] = useState('')
   const [trips, setTrips] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
+
+  // The date filter is applied server-side (IST calendar day); search stays client-side.
+  const dateRange = (date) => {
+    if(!date) return {}
+    const next = new Date(`${date}T00:00:00Z`)
+    next.setUTCDate(next.getUTCDate() + 1)
+    return {
+      start_from: `${date}T00:00:00+05:30`,
+      start_to: `${next.toISOString().slice(0, 10)}T00:00:00+05:30`,
+    }
+  }
 
   useEffect(()=>{
     let mounted = true
-    getTrips().then(data=>{ if(mounted) setTrips(data) })
+    getTrips(dateRange(selectedDate)).then(data=>{
+      if(!mounted) return
+      setTrips(data.trips)
+      setNextCursor(data.nextCursor)
+    })
     return ()=> { mounted = false }
-  },[])
+  },[selectedDate])
+
+  const loadMore = () => {
+    if(!nextCursor || loadingMore) return
+    setLoadingMore(true)
+    getTrips({ ...dateRange(selectedDate), cursor: nextCursor })
+      .then(data=>{
+        setTrips(prev => prev.concat(data.trips))
+        setNextCursor(data.nextCursor)
+      })
+      .finally(()=> setLoadingMore(false))
+  }
 
   const getDateKey = (value) => {
     if(!value) return ''
@@ -83,6 +111,11 @@ export default function Trips(){
           ))}
         </tbody>
       </table>
+      {nextCursor && (
+        <button className="view-btn" onClick={loadMore} disabled={loadingMore}>
+          {loadingMore ? 'Loading…' : 'Load more'}
+        </button>
+      )}
     </div>
   )
 }